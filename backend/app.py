@@ -428,23 +428,12 @@ def create_app() -> Flask:
 
 
 def _pdf_draw_wrapped(c: Any, x: float, y: float, max_width: float, text: str) -> float:
-    from reportlab.pdfbase.pdfmetrics import stringWidth
-
-    words = text.replace("\n", " ").split(" ")
-    line = ""
-    c.setFont(c._fontname, c._fontsize)
-    for w in words:
-        proposed = (line + " " + w).strip()
-        if stringWidth(proposed, c._fontname, c._fontsize) <= max_width:
-            line = proposed
-            continue
-        c.drawString(x, y, line)
-        y -= 12
-        line = w
-    if line:
-        c.drawString(x, y, line)
-        y -= 12
-    return y
+    from reportlab.lib.units import mm
+
+    from mindbot_vr.layout import draw_wrapped
+
+    margin = 18 * mm
+    return draw_wrapped(c, x, y, max_width, text, leading=12, bottom=margin, top=c._pagesize[1] - margin)
 
 
 app = create_app()
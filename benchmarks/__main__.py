@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+from io import BytesIO
+from typing import Any, Callable
+
+from mindbot_vr.geo import nearest_hospital
+from mindbot_vr.security import sanitize_user_text
+from mindbot_vr.triage import extract_symptoms, score_risk, triage_assess
+
+from .corpus import build_corpus
+from .harness import compare, load_baseline, measure, save_baseline
+
+
+def _vitals_inputs(rng: random.Random, n: int = 256) -> list[dict[str, float]]:
+    return [
+        {
+            "pulse_bpm": rng.uniform(55, 145),
+            "temperature_c": rng.uniform(36.0, 40.0),
+            "oxygen_percent": rng.uniform(88, 100),
+            "air_quality_ppm": rng.uniform(400, 1000),
+        }
+        for _ in range(n)
+    ]
+
+
+def _draw_wrapped_bench() -> Callable[[str], Any] | None:
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        return None
+    from mindbot_vr.reporting import _draw_wrapped
+
+    width, height = A4
+    state: dict[str, Any] = {}
+
+    def run(text: str) -> float:
+        c = state.get("c")
+        if c is None or state["n"] >= 200:
+            c = canvas.Canvas(BytesIO(), pagesize=A4)
+            c.setFont("Helvetica", 10)
+            state["c"] = c
+            state["n"] = 0
+        state["n"] += 1
+        return _draw_wrapped(c, 51.0, height - 51.0, width - 102.0, text)
+
+    return run
+
+
+def _cases(corpus: dict[str, list[str]], seed: int) -> list[tuple[str, Callable[[Any], Any], list[Any]]]:
+    rng = random.Random(seed)
+    vitals = _vitals_inputs(rng)
+    symptom_sets = [extract_symptoms(m) for m in corpus["short"][:64]]
+    risk_inputs = [(vitals[i % len(vitals)], symptom_sets[i % len(symptom_sets)]) for i in range(256)]
+    coords = [(rng.uniform(28.8, 29.4), rng.uniform(30.8, 31.4)) for _ in range(256)]
+
+    cases: list[tuple[str, Callable[[Any], Any], list[Any]]] = []
+    for kind, messages in corpus.items():
+        cases.append((f"extract_symptoms[{kind}]", extract_symptoms, messages))
+        cases.append((f"sanitize_user_text[{kind}]", sanitize_user_text, messages))
+        pairs = [(m, vitals[i % len(vitals)]) for i, m in enumerate(messages)]
+        cases.append((f"triage_assess[{kind}]", lambda p: triage_assess(p[0], p[1]), pairs))
+    cases.append(("score_risk", lambda p: score_risk(p[0], p[1]), risk_inputs))
+    cases.append(("nearest_hospital", lambda p: nearest_hospital(p[0], p[1]), coords))
+
+    draw = _draw_wrapped_bench()
+    if draw is not None:
+        for kind in ("short", "long"):
+            cases.append((f"_draw_wrapped[{kind}]", draw, corpus[kind]))
+    return cases
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="MindBot VR micro-benchmarks.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--db", help="seed the corpus from symptom_events.raw_message in this SQLite file")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this substring")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent per case")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(seed=args.seed, db_path=args.db)
+    results: dict[str, dict[str, float]] = {}
+    print(f"{'case':<36} {'ops/sec':>12} {'p50 us':>10} {'p99 us':>10}")
+    for name, fn, inputs in _cases(corpus, args.seed):
+        if args.filter and args.filter not in name:
+            continue
+        r = measure(fn, inputs, min_time_s=args.min_time)
+        results[name] = r
+        print(f"{name:<36} {r['ops_per_sec']:>12.1f} {r['p50_us']:>10.2f} {r['p99_us']:>10.2f}")
+
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"baseline written to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), threshold=args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r['name']:<36} {r['metric']:<12} {r['baseline']:>10} -> {r['current']:<10} (+{r['change']:.0%})")
+            return 1
+        print(f"\nno regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
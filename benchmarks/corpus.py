@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import random
+import sqlite3
+from pathlib import Path
+
+
+_SYMPTOM_WORDS = [
+    "fever", "cough", "tired", "headache", "migraine", "wheezing", "chest", "pain", "tightness",
+    "shortness", "of", "breath", "chills", "exhausted", "hot", "temperature", "high",
+]
+_FILLER_WORDS = [
+    "i", "have", "had", "since", "yesterday", "for", "two", "days", "and", "my", "mother", "says",
+    "it", "is", "getting", "worse", "at", "night", "after", "work", "please", "help", "the", "a",
+]
+_ARABIC_SHORT = [
+    "عندي حمى وكحة من يومين",
+    "صداع شديد وتعبان",
+    "عندي ضيق في التنفس وألم في الصدر",
+    "درجة الحرارة ٣٩ والسخونة عالية",
+]
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    words = [rng.choice(_SYMPTOM_WORDS if rng.random() < 0.3 else _FILLER_WORDS) for _ in range(n_words)]
+    return " ".join(words).capitalize() + rng.choice([".", "!", "?", "..."])
+
+
+def short_messages(rng: random.Random, n: int) -> list[str]:
+    out = [_sentence(rng, rng.randint(2, 10)) for _ in range(n)]
+    out += _ARABIC_SHORT
+    return out
+
+
+def long_messages(rng: random.Random, n: int) -> list[str]:
+    return [" ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(10, 25))) for _ in range(n)]
+
+
+def adversarial_messages(rng: random.Random, n: int) -> list[str]:
+    out: list[str] = []
+    for i in range(n):
+        kind = i % 5
+        if kind == 0:
+            # One enormous token: worst case for fuzzy matching against every variant.
+            out.append("f" + "e" * 1999)
+        elif kind == 1:
+            # Many distinct near-miss tokens, each of which is fuzzy-compared.
+            out.append(" ".join(f"fevr{j} coughh{j} hedache{j}" for j in range(120)))
+        elif kind == 2:
+            out.append("!@#$%^&*()" * 200)
+        elif kind == 3:
+            out.append("\x00\x01\x02 chest\x07pain \x1f" * 150)
+        else:
+            out.append(("حُمّى ـــ كحّة ٣٩ " + "fever ") * 120)
+    return out
+
+
+def seed_from_db(db_path: str | Path, limit: int = 500) -> list[str]:
+    conn = sqlite3.connect(str(db_path))
+    try:
+        rows = conn.execute(
+            "SELECT raw_message FROM symptom_events ORDER BY id DESC LIMIT ?",
+            (int(limit),),
+        ).fetchall()
+    except sqlite3.Error:
+        return []
+    finally:
+        conn.close()
+    return [str(r[0]) for r in rows if r[0]]
+
+
+def build_corpus(seed: int = 1234, db_path: str | Path | None = None) -> dict[str, list[str]]:
+    rng = random.Random(seed)
+    corpus = {
+        "short": short_messages(rng, 200),
+        "long": long_messages(rng, 40),
+        "adversarial": adversarial_messages(rng, 10),
+    }
+    if db_path is not None:
+        recorded = seed_from_db(db_path)
+        if recorded:
+            corpus["recorded"] = recorded
+    return corpus
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import platform
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+
+def measure(fn: Callable[[Any], Any], inputs: Iterable[Any], min_time_s: float = 0.5, max_ops: int = 200_000) -> dict[str, float]:
+    items = list(inputs)
+    if not items:
+        raise ValueError("measure() needs at least one input")
+    for item in items[: min(len(items), 20)]:
+        fn(item)
+
+    samples: list[int] = []
+    clock = time.perf_counter_ns
+    deadline = clock() + int(min_time_s * 1e9)
+    i = 0
+    while len(samples) < max_ops:
+        item = items[i % len(items)]
+        t0 = clock()
+        fn(item)
+        samples.append(clock() - t0)
+        i += 1
+        if i % len(items) == 0 and clock() >= deadline:
+            break
+
+    samples.sort()
+    total_ns = sum(samples)
+    return {
+        "ops": len(samples),
+        "ops_per_sec": round(len(samples) / (total_ns / 1e9), 1) if total_ns else 0.0,
+        "p50_us": round(_percentile(samples, 50) / 1e3, 3),
+        "p99_us": round(_percentile(samples, 99) / 1e3, 3),
+    }
+
+
+def _percentile(sorted_samples: list[int], pct: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * (pct / 100.0)
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def save_baseline(results: dict[str, dict[str, float]], path: str | Path) -> None:
+    doc = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    Path(path).write_text(json.dumps(doc, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def load_baseline(path: str | Path) -> dict[str, dict[str, float]]:
+    doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    return dict(doc.get("results") or {})
+
+
+def compare(
+    current: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float = 0.15,
+) -> list[dict[str, Any]]:
+    regressions: list[dict[str, Any]] = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric, worse_if_higher in (("p50_us", True), ("p99_us", True), ("ops_per_sec", False)):
+            b = float(base.get(metric) or 0.0)
+            c = float(cur.get(metric) or 0.0)
+            if b <= 0:
+                continue
+            change = (c - b) / b if worse_if_higher else (b - c) / b
+            if change > threshold:
+                regressions.append({"name": name, "metric": metric, "baseline": b, "current": c, "change": round(change, 3)})
+    return regressions
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Callable
+
+from mindbot_vr.layout import wrap_lines
+
+
+_WORDS = (
+    "patient reports intermittent fever cough fatigue shortness of breath chest tightness "
+    "recommend hydration rest monitoring oxygen saturation seek emergency care if symptoms worsen "
+    "antipyretic dosage according to local protocol reassess vitals within thirty minutes"
+).split()
+
+
+def synthetic_message(size: int, seed: int = 5) -> str:
+    # Multi-paragraph LLM-style reply of roughly ``size`` characters.
+    rng = random.Random(seed)
+    paragraphs: list[str] = []
+    total = 0
+    while total < size:
+        para = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 120)))
+        paragraphs.append(para)
+        total += len(para) + 2
+    return "\n\n".join(paragraphs)[:size]
+
+
+def legacy_wrap(text: str, fontname: str, size: float, max_width: float) -> list[str]:
+    # The previous _draw_wrapped loop: re-measures the whole growing line after every word.
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    words = str(text).replace("\n", " ").split(" ")
+    lines: list[str] = []
+    line = ""
+    for w in words:
+        proposed = (line + " " + w).strip()
+        if stringWidth(proposed, fontname, size) <= max_width:
+            line = proposed
+            continue
+        lines.append(line)
+        line = w
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _time(fn: Callable[[], object], min_time_s: float) -> float:
+    runs = 0
+    t0 = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time_s:
+            return elapsed / runs
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Report text layout: incremental vs legacy wrapping.")
+    parser.add_argument("--size", type=int, default=10_000, help="message size in characters")
+    parser.add_argument("--width", type=float, default=493.2, help="line width in points (A4 minus 18 mm margins)")
+    parser.add_argument("--min-time", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    text = synthetic_message(args.size)
+    font, size = "Helvetica", 10.0
+
+    single = text.replace("\n\n", " ")
+    if wrap_lines(single, font, size, args.width) != legacy_wrap(single, font, size, args.width):
+        print("incremental layout disagrees with the legacy wrapper on a single paragraph")
+        return 1
+
+    legacy_s = _time(lambda: legacy_wrap(text, font, size, args.width), args.min_time)
+    new_s = _time(lambda: wrap_lines(text, font, size, args.width), args.min_time)
+    lines = wrap_lines(text, font, size, args.width)
+    print(f"message         : {len(text)} chars, {text.count(chr(10) * 2) + 1} paragraphs, {len(lines)} lines")
+    print(f"legacy wrap     : {legacy_s * 1e3:8.2f} ms")
+    print(f"layout engine   : {new_s * 1e3:8.2f} ms  ({legacy_s / new_s:.1f}x faster)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
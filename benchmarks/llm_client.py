@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from mindbot_vr.http_pool import ProviderClient
+
+
+class StubProvider(ThreadingHTTPServer):
+    # Minimal Ollama-shaped /api/chat endpoint that counts accepted TCP connections.
+    daemon_threads = True
+
+    def __init__(self, drop_every: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.connections = 0
+        self.requests = 0
+        self.drop_every = drop_every
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubProvider":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle plus the
+    # client's delayed ACK adds ~40 ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    server: StubProvider
+
+    def setup(self) -> None:
+        with self.server._lock:
+            self.server.connections += 1
+        super().setup()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with self.server._lock:
+            self.server.requests += 1
+            n = self.server.requests
+        body = json.dumps({"message": {"role": "assistant", "content": "Rest and hydrate."}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.server.drop_every and n % self.server.drop_every == 0:
+            # Close without "Connection: close" so the client's idle socket goes stale.
+            self.close_connection = True
+
+
+def _payload() -> bytes:
+    return json.dumps({"model": "stub", "messages": [{"role": "user", "content": "fever"}], "stream": False}).encode()
+
+
+def _run_pooled(base_url: str, n: int) -> float:
+    client = ProviderClient(base_url)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        status, _ = client.request("POST", "/api/chat", _payload(), {"Content-Type": "application/json"})
+        assert status == 200
+    elapsed = time.perf_counter() - t0
+    client.close()
+    return elapsed
+
+
+def _run_pooled_concurrent(base_url: str, n: int, threads: int, pool_size: int) -> float:
+    client = ProviderClient(base_url, max_in_flight=pool_size)
+    errors: list[BaseException] = []
+
+    def worker(count: int) -> None:
+        try:
+            for _ in range(count):
+                status, _ = client.request("POST", "/api/chat", _payload(), {"Content-Type": "application/json"})
+                assert status == 200
+        except BaseException as exc:
+            errors.append(exc)
+
+    per_thread = max(1, n // threads)
+    workers = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    client.close()
+    if errors:
+        raise errors[0]
+    return elapsed
+
+
+def _run_urllib(base_url: str, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        req = urllib.request.Request(
+            f"{base_url}/api/chat", data=_payload(), headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=12) as resp:
+            resp.read()
+    return time.perf_counter() - t0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Connection reuse of the pooled LLM provider client.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--drop-every", type=int, default=50, help="stub closes the socket after every Nth response")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    # The repo has no test suite; these checks are the pool's regression test. Each run
+    # reports its connection count and fails if the pool did not hold it down.
+    failures: list[str] = []
+    runs = (
+        ("urllib (one connection per call)", lambda url: _run_urllib(url, args.requests), args.drop_every, None),
+        # Every Nth socket goes stale while idle; the next request on it must be retried
+        # on a fresh connection, so one connection per drop is expected, and no more.
+        (
+            "pooled keep-alive",
+            lambda url: _run_pooled(url, args.requests),
+            args.drop_every,
+            1 + (args.requests - 1) // args.drop_every if args.drop_every else 1,
+        ),
+        (
+            f"pooled, {args.threads} threads",
+            lambda url: _run_pooled_concurrent(url, args.requests, args.threads, args.pool_size),
+            0,
+            args.pool_size,
+        ),
+    )
+    for label, runner, drop_every, max_connections in runs:
+        stub = StubProvider(drop_every=drop_every).start()
+        try:
+            elapsed = runner(stub.base_url)
+        except Exception as exc:
+            failures.append(f"{label}: {exc!r}")
+            continue
+        finally:
+            stub.shutdown()
+            stub.server_close()
+        print(
+            f"{label:<34} {stub.requests} requests, {stub.connections:>4} connections, "
+            f"{elapsed / max(1, stub.requests) * 1e6:8.1f} us/request"
+        )
+        if max_connections is not None and stub.connections > max_connections:
+            failures.append(f"{label}: {stub.connections} connections, expected at most {max_connections}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
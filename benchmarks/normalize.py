@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import argparse
+import re
+import timeit
+
+from mindbot_vr.triage import SYMPTOM_SYNONYMS, _contains_phrase, _fuzzy_any, _normalize_text, extract_symptoms
+
+
+ENGLISH_SAMPLES = [
+    "fever",
+    "I have had a fever, cough and fatigue for 2 days.",
+    "Shortness-of-breath at night!! and chest tightness when climbing stairs; pulse feels fast (120?)",
+    "headache " * 40,
+]
+# No synonym matches exactly, so every variant goes through the fuzzy matcher.
+ADVERSARIAL_SAMPLE = " ".join(f"symptomatic{i} unwell{i} breathe{i}" for i in range(30))
+ARABIC_SAMPLES = [
+    "عندي حُمّى وكحة من يومين",
+    "عندي ضيق في التنفس وألم في الصدر ودرجة الحرارة ٣٩",
+]
+
+
+def _legacy_normalize(text: str) -> str:
+    text = (text or "").lower()
+    text = re.sub(r"[^a-z0-9\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+# Same iteration order as extract_symptoms, so any() short-circuits at the same variant.
+_LEGACY_SYNONYMS = {k: [v for v in vs if v.isascii()] for k, vs in SYMPTOM_SYNONYMS.items()}
+
+
+def _legacy_extract(message: str) -> set[str]:
+    # extract_symptoms before Arabic support: ASCII tokens, English synonyms and phrases.
+    n = _legacy_normalize(message)
+    tokens = set(n.split()) if n else set()
+    matched: set[str] = set()
+    for canonical, variants in _LEGACY_SYNONYMS.items():
+        if any(v in tokens for v in variants) or any(_fuzzy_any(tokens, v) for v in variants):
+            matched.add(canonical)
+    if _contains_phrase(tokens, "shortness of breath") or _contains_phrase(tokens, "trouble breathing"):
+        matched.add("breathing_difficulty")
+    if _contains_phrase(tokens, "chest pain") or _contains_phrase(tokens, "chest tightness"):
+        matched.add("chest_pain")
+    if "fever" not in matched and ("fever" in tokens or ("high" in tokens and "temperature" in tokens)):
+        matched.add("fever")
+    return matched
+
+
+def _time_per_call(fn, samples: list[str], number: int) -> float:
+    best = min(timeit.repeat(lambda: [fn(s) for s in samples], number=number, repeat=5))
+    return best / (number * len(samples))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark triage text normalization and symptom extraction.")
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--extract-number", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed extract_symptoms slowdown vs legacy")
+    args = parser.parse_args(argv)
+
+    legacy = _time_per_call(_legacy_normalize, ENGLISH_SAMPLES, args.number)
+    current = _time_per_call(_normalize_text, ENGLISH_SAMPLES, args.number)
+    arabic = _time_per_call(_normalize_text, ARABIC_SAMPLES, args.number)
+
+    print(f"english  legacy two-regex : {legacy * 1e6:8.3f} us/call")
+    print(f"english  translate+tokens : {current * 1e6:8.3f} us/call  ({legacy / current:.2f}x)")
+    print(f"arabic   translate+tokens : {arabic * 1e6:8.3f} us/call")
+
+    # Normalization is only part of the hot path: extraction runs the fuzzy matcher over
+    # every synonym and phrase, so that is what English traffic actually pays for.
+    extract_samples = [*ENGLISH_SAMPLES, ADVERSARIAL_SAMPLE]
+    legacy_x = _time_per_call(_legacy_extract, extract_samples, args.extract_number)
+    current_x = _time_per_call(extract_symptoms, extract_samples, args.extract_number)
+    arabic_x = _time_per_call(extract_symptoms, ARABIC_SAMPLES, args.extract_number)
+    print(f"english  legacy extract   : {legacy_x * 1e6:8.3f} us/call")
+    print(f"english  extract_symptoms : {current_x * 1e6:8.3f} us/call  ({legacy_x / current_x:.2f}x)")
+    print(f"arabic   extract_symptoms : {arabic_x * 1e6:8.3f} us/call")
+
+    mismatches = [s for s in ENGLISH_SAMPLES if _legacy_normalize(s) != _normalize_text(s)]
+    mismatches += [s for s in extract_samples if _legacy_extract(s) != extract_symptoms(s)]
+    if mismatches:
+        print(f"output differs from legacy on {len(mismatches)} English sample(s)")
+        return 1
+    return 0 if current <= legacy and current_x <= legacy_x * (1 + args.tolerance) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
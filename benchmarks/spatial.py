@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any
+
+from mindbot_vr.geo import HospitalIndex, estimate_travel_minutes, haversine_km
+
+
+# Rough bounding box of Egypt's populated area.
+_LAT_RANGE = (22.0, 31.6)
+_LNG_RANGE = (25.0, 35.0)
+
+
+def synthetic_facilities(n: int, seed: int = 7) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    out: list[dict[str, Any]] = []
+    for i in range(n):
+        # Cluster most facilities along the Nile valley like the real dataset.
+        if rng.random() < 0.7:
+            lat = rng.uniform(24.0, 31.3)
+            lng = 31.0 + rng.gauss(0, 0.35)
+        else:
+            lat = rng.uniform(*_LAT_RANGE)
+            lng = rng.uniform(*_LNG_RANGE)
+        out.append({"id": f"f{i}", "name": f"Facility {i}", "phone": "", "lat": lat, "lng": lng, "address": ""})
+    return out
+
+
+def linear_nearest(hospitals: list[dict[str, Any]], lat: float, lng: float) -> dict[str, Any]:
+    best: dict[str, Any] | None = None
+    best_dist = 10**9
+    for h in hospitals:
+        d = haversine_km(lat, lng, float(h["lat"]), float(h["lng"]))
+        if d < best_dist:
+            best_dist = d
+            best = dict(h)
+            best["distance_km"] = round(d, 2)
+            best["eta_minutes"] = estimate_travel_minutes(float(best["distance_km"]))
+    return best or {}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="k-d tree vs linear scan for nearest_hospital.")
+    parser.add_argument("--facilities", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args(argv)
+
+    hospitals = synthetic_facilities(args.facilities)
+    t0 = time.perf_counter()
+    index = HospitalIndex(hospitals)
+    build_s = time.perf_counter() - t0
+
+    rng = random.Random(99)
+    queries = [(rng.uniform(*_LAT_RANGE), rng.uniform(*_LNG_RANGE)) for _ in range(args.queries)]
+
+    t0 = time.perf_counter()
+    indexed = [index.nearest(lat, lng, k=1)[0][1]["id"] for lat, lng in queries]
+    index_s = time.perf_counter() - t0
+
+    n_linear = min(len(queries), 200)
+    t0 = time.perf_counter()
+    linear = [linear_nearest(hospitals, lat, lng)["id"] for lat, lng in queries[:n_linear]]
+    linear_s = time.perf_counter() - t0
+
+    per_index = index_s / len(queries)
+    per_linear = linear_s / n_linear
+    print(f"facilities      : {len(hospitals)}")
+    print(f"index build     : {build_s * 1e3:.1f} ms")
+    print(f"k-d tree lookup : {per_index * 1e6:.1f} us/query")
+    print(f"linear scan     : {per_linear * 1e6:.1f} us/query  ({per_linear / per_index:.0f}x slower)")
+    mismatches = sum(1 for a, b in zip(indexed, linear) if a != b)
+    if mismatches:
+        print(f"{mismatches} result(s) differ from the linear scan")
+        return 1
+    return 0 if per_index < 1e-3 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,16 +2,27 @@ from __future__ import annotations
 
 import csv
 import os
+import threading
+from datetime import datetime, timedelta, timezone
 from io import StringIO
 from typing import Any
 
 from flask import Blueprint, Response, jsonify, request
 
+from . import metrics
+from .analytics import RISK_LEVELS, analytics_snapshot, list_sessions, parse_session_cursor
+from .bulk_reports import iter_report_zip, prefetch_payloads, select_sessions
 from .db import get_db
+from .downsample import parse_instant
+from .events import BUS, TooManySubscribers, stream_events
+from .search import match_query, parse_cursor, search
 
 
 admin_bp = Blueprint("admin", __name__)
 
+# One bulk export at a time; each already fans out over every core.
+_BULK_SLOT = threading.BoundedSemaphore(1)
+
 
 def _require_admin() -> bool:
     token = os.environ.get("ADMIN_TOKEN", "").strip()
@@ -40,6 +51,99 @@ def stats() -> Any:
     )
 
 
+@admin_bp.get("/api/admin/metrics")
+def metrics_snapshot() -> Any:
+    if not _require_admin():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(metrics.snapshot())
+
+
+@admin_bp.get("/api/admin/stream")
+def stream() -> Any:
+    if not _require_admin():
+        return jsonify({"error": "unauthorized"}), 401
+
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", "").strip() or -1)
+    except ValueError:
+        last_event_id = -1
+    try:
+        sub = BUS.subscribe(last_event_id if last_event_id >= 0 else None)
+    except TooManySubscribers:
+        resp = jsonify({"error": "busy"})
+        resp.status_code = 429
+        resp.headers["Retry-After"] = "30"
+        return resp
+
+    resp = Response(
+        stream_events(sub),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Also covers a client that disconnects before the first chunk is pulled.
+    resp.call_on_close(lambda: BUS.unsubscribe(sub))
+    return resp
+
+
+@admin_bp.get("/api/admin/analytics")
+def analytics() -> Any:
+    if not _require_admin():
+        return jsonify({"error": "unauthorized"}), 401
+
+    try:
+        until = parse_instant(request.args.get("until")) or datetime.now(timezone.utc).isoformat()
+        since = parse_instant(request.args.get("since"))
+        top = int(request.args.get("top", "10"))
+    except (ValueError, OverflowError, OSError) as exc:
+        return jsonify({"error": "bad_request", "detail": str(exc)}), 400
+    if since is None:
+        since = (datetime.fromisoformat(until) - timedelta(days=30)).isoformat()
+    top = max(1, min(top, 100))
+    return jsonify(analytics_snapshot(get_db(), since, until, top))
+
+
+@admin_bp.get("/api/admin/sessions")
+def sessions() -> Any:
+    if not _require_admin():
+        return jsonify({"error": "unauthorized"}), 401
+
+    args = request.args
+    has_sos_raw = args.get("has_sos", "").strip().lower()
+    try:
+        since = parse_instant(args.get("since"))
+        until = parse_instant(args.get("until"))
+        max_risk = parse_risk_levels(args.get("max_risk"))
+        cursor = parse_session_cursor(args.get("cursor"))
+        limit = int(args.get("limit", "50"))
+        if has_sos_raw not in {"", "1", "true", "yes", "0", "false", "no"}:
+            raise ValueError("has_sos must be true or false")
+    except (ValueError, OverflowError, OSError) as exc:
+        return jsonify({"error": "bad_request", "detail": str(exc)}), 400
+    has_sos = None if not has_sos_raw else has_sos_raw in {"1", "true", "yes"}
+    limit = max(1, min(limit, 200))
+    return jsonify(list_sessions(get_db(), since, until, max_risk, has_sos, cursor, limit))
+
+
+@admin_bp.get("/api/admin/search")
+def search_text() -> Any:
+    if not _require_admin():
+        return jsonify({"error": "unauthorized"}), 401
+
+    query = match_query(request.args.get("q", ""))
+    if query is None:
+        return jsonify({"error": "bad_request", "detail": "q must contain at least one word"}), 400
+    sources = [s.strip() for s in request.args.get("source", "").split(",") if s.strip()] or None
+    try:
+        limit = int(request.args.get("limit", "20"))
+        cursor = parse_cursor(request.args.get("cursor"))
+        if sources and not set(sources) <= {"message", "symptom_event"}:
+            raise ValueError("source must be message, symptom_event or both")
+    except ValueError as exc:
+        return jsonify({"error": "bad_request", "detail": str(exc)}), 400
+    limit = max(1, min(limit, 100))
+    return jsonify({"query": query, **search(get_db(), query, limit, cursor, sources)})
+
+
 @admin_bp.get("/api/admin/export")
 def export_data() -> Any:
     if not _require_admin():
@@ -89,3 +193,64 @@ def export_data() -> Any:
         headers={"Content-Disposition": "attachment; filename=mindbot_vr_export.csv"},
     )
 
+
+def parse_risk_levels(raw: str | None) -> list[str] | None:
+    if not raw:
+        return None
+    wanted = {part.strip().lower() for part in raw.split(",") if part.strip()}
+    levels = [level for level in RISK_LEVELS if level.lower() in wanted]
+    if len(levels) != len(wanted):
+        raise ValueError(f"risk must be a comma-separated subset of {', '.join(RISK_LEVELS)}")
+    return levels
+
+
+@admin_bp.get("/api/admin/reports/bulk")
+def bulk_reports() -> Any:
+    if not _require_admin():
+        return jsonify({"error": "unauthorized"}), 401
+
+    try:
+        risk_levels = parse_risk_levels(request.args.get("risk"))
+        limit = int(request.args.get("limit", "500"))
+    except ValueError as exc:
+        return jsonify({"error": "bad_request", "detail": str(exc)}), 400
+    limit = max(1, min(limit, 5000))
+
+    if not _BULK_SLOT.acquire(blocking=False):
+        resp = jsonify({"error": "busy"})
+        resp.status_code = 429
+        resp.headers["Retry-After"] = "30"
+        return resp
+    released = False
+
+    def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            _BULK_SLOT.release()
+
+    try:
+        db = get_db()
+        sessions = select_sessions(
+            db,
+            since=request.args.get("since") or None,
+            until=request.args.get("until") or None,
+            risk_levels=risk_levels,
+            limit=limit,
+        )
+        items = prefetch_payloads(db, [s["session_id"] for s in sessions])
+    except Exception:
+        release()
+        raise
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M")
+    resp = Response(
+        iter_report_zip(sessions, items),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=mindbot_vr_reports_{stamp}.zip",
+            "X-Report-Count": str(len(items)),
+        },
+    )
+    resp.call_on_close(release)
+    return resp
@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Sequence
+
+
+# Rollups are keyed by prefixes of the UTC ISO timestamps rows are stamped with,
+# so "2026-10-18T09" is an hour bucket and "2026-10-18" a day bucket. Comparing a
+# bucket key against a full ISO bound selects buckets that *start* in the range.
+_HOUR = 13
+_DAY = 10
+
+# Order of severity; session_summary keeps the highest level a session reached as its rank.
+RISK_LEVELS = ("Low", "Medium", "Critical")
+_RISK_RANK_SQL = "CASE {col} WHEN 'Critical' THEN 2 WHEN 'Medium' THEN 1 ELSE 0 END"
+
+# Bump when a rollup's definition changes; the next start rebuilds them all.
+ROLLUPS_VERSION = 1
+
+# Time to emergency is rolled up as a histogram: 1 s resolution for the first ten
+# minutes, 10 s up to an hour, then 1 min. The median is read off the histogram.
+_SECONDS_BUCKET_SQL = """
+CASE
+  WHEN seconds_to_emergency < 600 THEN MAX(0, CAST(seconds_to_emergency AS INTEGER))
+  WHEN seconds_to_emergency < 3600 THEN CAST(seconds_to_emergency / 10 AS INTEGER) * 10
+  ELSE CAST(seconds_to_emergency / 60 AS INTEGER) * 60
+END
+"""
+
+
+def record_session(db: sqlite3.Connection, session_id: str, created_at: str) -> None:
+    db.execute(
+        "INSERT OR IGNORE INTO session_summary (session_id, created_at) VALUES (?, ?)",
+        (session_id, created_at),
+    )
+
+
+def record_message(db: sqlite3.Connection, session_id: str, created_at: str) -> None:
+    db.execute(
+        "INSERT OR IGNORE INTO session_timeline (session_id, first_message_at) VALUES (?, ?)",
+        (session_id, created_at),
+    )
+    db.execute("UPDATE session_summary SET message_count = message_count + 1 WHERE session_id = ?", (session_id,))
+
+
+def record_vitals(db: sqlite3.Connection, session_id: str, vitals: dict[str, float], created_at: str) -> None:
+    db.execute(
+        """
+        UPDATE session_summary
+        SET pulse_bpm = ?, temperature_c = ?, oxygen_percent = ?, air_quality_ppm = ?, vitals_at = ?
+        WHERE session_id = ?
+        """,
+        (
+            vitals["pulse_bpm"],
+            vitals["temperature_c"],
+            vitals["oxygen_percent"],
+            vitals["air_quality_ppm"],
+            created_at,
+            session_id,
+        ),
+    )
+
+
+def record_symptom_event(
+    db: sqlite3.Connection,
+    session_id: str,
+    matched_symptoms: Sequence[str],
+    risk_level: str,
+    risk_score: int,
+    emergency_mode: bool,
+    created_at: str,
+) -> None:
+    day = created_at[:_DAY]
+    db.execute(
+        f"""
+        UPDATE session_summary
+        SET risk_level = ?, risk_score = ?, risk_at = ?, max_risk_rank = MAX(max_risk_rank, {_RISK_RANK_SQL.format(col="?")})
+        WHERE session_id = ?
+        """,
+        (risk_level, int(risk_score), created_at, risk_level, session_id),
+    )
+    db.execute(
+        """
+        INSERT INTO rollup_risk_daily (day, risk_level, events) VALUES (?, ?, 1)
+        ON CONFLICT(day, risk_level) DO UPDATE SET events = events + 1
+        """,
+        (day, risk_level),
+    )
+    db.executemany(
+        """
+        INSERT INTO rollup_symptoms_daily (day, symptom, events) VALUES (?, ?, 1)
+        ON CONFLICT(day, symptom) DO UPDATE SET events = events + 1
+        """,
+        [(day, s) for s in matched_symptoms],
+    )
+    if emergency_mode:
+        # Only the first emergency of a session counts; later ones leave the row alone.
+        cur = db.execute(
+            """
+            UPDATE session_timeline
+            SET emergency_at = ?, seconds_to_emergency = (julianday(?) - julianday(first_message_at)) * 86400.0
+            WHERE session_id = ? AND emergency_at IS NULL
+            """,
+            (created_at, created_at, session_id),
+        )
+        if cur.rowcount:
+            db.execute(
+                f"""
+                INSERT INTO rollup_emergency_daily (day, seconds_bucket, sessions)
+                SELECT substr(emergency_at, 1, {_DAY}), {_SECONDS_BUCKET_SQL}, 1
+                FROM session_timeline WHERE session_id = ?
+                ON CONFLICT(day, seconds_bucket) DO UPDATE SET sessions = sessions + 1
+                """,
+                (session_id,),
+            )
+
+
+def record_sos_event(db: sqlite3.Connection, session_id: str, created_at: str) -> None:
+    db.execute("UPDATE session_summary SET sos_count = sos_count + 1 WHERE session_id = ?", (session_id,))
+    db.execute(
+        """
+        INSERT INTO rollup_sos_hourly (hour, events) VALUES (?, 1)
+        ON CONFLICT(hour) DO UPDATE SET events = events + 1
+        """,
+        (created_at[:_HOUR],),
+    )
+
+
+def ensure_rollups(db: sqlite3.Connection) -> bool:
+    # The record_* writers only maintain rollups from the moment they exist. The first
+    # start against a database whose rollups predate ROLLUPS_VERSION (an upgrade, or a
+    # change to how they are computed) rebuilds them from the event tables. IMMEDIATE
+    # holds the write lock across check and rebuild: writes made before it are recounted
+    # from their events, writes after it land on the rebuilt rows, and a second worker
+    # starting alongside waits here and then finds the version already stamped.
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        row = db.execute("SELECT version FROM rollup_state WHERE name = 'rollups'").fetchone()
+        if row is not None and int(row[0]) >= ROLLUPS_VERSION:
+            db.rollback()
+            return False
+        _rebuild(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return True
+
+
+def rebuild_rollups(db: sqlite3.Connection) -> dict[str, int]:
+    # Recompute every rollup from the event tables in one transaction; readers see
+    # either the old or the new rollups, never a half-built one.
+    with db:
+        _rebuild(db)
+    return {
+        table: int(db.execute(f"SELECT COUNT(*) AS c FROM {table}").fetchone()["c"])
+        for table in (
+            "rollup_sos_hourly",
+            "rollup_risk_daily",
+            "rollup_symptoms_daily",
+            "rollup_emergency_daily",
+            "session_timeline",
+            "session_summary",
+        )
+    }
+
+
+def _rebuild(db: sqlite3.Connection) -> None:
+    db.execute("DELETE FROM rollup_sos_hourly")
+    db.execute("DELETE FROM rollup_risk_daily")
+    db.execute("DELETE FROM rollup_symptoms_daily")
+    db.execute("DELETE FROM session_timeline")
+    db.execute("DELETE FROM rollup_emergency_daily")
+    db.execute("DELETE FROM session_summary")
+    db.execute(
+        f"""
+        INSERT INTO rollup_sos_hourly (hour, events)
+        SELECT substr(created_at, 1, {_HOUR}), COUNT(*) FROM sos_events GROUP BY 1
+        """
+    )
+    db.execute(
+        f"""
+        INSERT INTO rollup_risk_daily (day, risk_level, events)
+        SELECT substr(created_at, 1, {_DAY}), risk_level, COUNT(*) FROM symptom_events GROUP BY 1, 2
+        """
+    )
+    db.execute(
+        f"""
+        INSERT INTO rollup_symptoms_daily (day, symptom, events)
+        SELECT substr(e.created_at, 1, {_DAY}), j.value, COUNT(*)
+        FROM symptom_events AS e, json_each(e.matched_symptoms_json) AS j
+        GROUP BY 1, 2
+        """
+    )
+    db.execute(
+        """
+        INSERT INTO session_timeline (session_id, first_message_at)
+        SELECT session_id, MIN(created_at) FROM messages GROUP BY session_id
+        """
+    )
+    db.execute(
+        """
+        UPDATE session_timeline
+        SET emergency_at = (
+          SELECT MIN(e.created_at) FROM symptom_events AS e
+          WHERE e.session_id = session_timeline.session_id
+            AND e.emergency_mode = 1
+            AND e.created_at >= session_timeline.first_message_at
+        )
+        """
+    )
+    db.execute(
+        """
+        UPDATE session_timeline
+        SET seconds_to_emergency = (julianday(emergency_at) - julianday(first_message_at)) * 86400.0
+        WHERE emergency_at IS NOT NULL
+        """
+    )
+    db.execute(
+        f"""
+        INSERT INTO rollup_emergency_daily (day, seconds_bucket, sessions)
+        SELECT substr(emergency_at, 1, {_DAY}), {_SECONDS_BUCKET_SQL}, COUNT(*)
+        FROM session_timeline WHERE emergency_at IS NOT NULL
+        GROUP BY 1, 2
+        """
+    )
+    _rebuild_session_summary(db)
+    db.execute(
+        """
+        INSERT INTO rollup_state (name, version) VALUES ('rollups', ?)
+        ON CONFLICT(name) DO UPDATE SET version = excluded.version
+        """,
+        (ROLLUPS_VERSION,),
+    )
+
+
+def _rebuild_session_summary(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        INSERT INTO session_summary (session_id, created_at, message_count, sos_count)
+        SELECT s.id, s.created_at, COALESCE(m.n, 0), COALESCE(o.n, 0)
+        FROM sessions AS s
+        LEFT JOIN (SELECT session_id, COUNT(*) AS n FROM messages GROUP BY session_id) AS m ON m.session_id = s.id
+        LEFT JOIN (SELECT session_id, COUNT(*) AS n FROM sos_events GROUP BY session_id) AS o ON o.session_id = s.id
+        """
+    )
+    db.execute(
+        """
+        UPDATE session_summary
+        SET pulse_bpm = v.pulse_bpm, temperature_c = v.temperature_c, oxygen_percent = v.oxygen_percent,
+            air_quality_ppm = v.air_quality_ppm, vitals_at = v.created_at
+        FROM (
+          SELECT session_id, pulse_bpm, temperature_c, oxygen_percent, air_quality_ppm, created_at,
+                 ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id DESC) AS rn
+          FROM vitals
+        ) AS v
+        WHERE v.session_id = session_summary.session_id AND v.rn = 1
+        """
+    )
+    db.execute(
+        f"""
+        UPDATE session_summary
+        SET risk_level = e.risk_level, risk_score = e.risk_score, risk_at = e.created_at, max_risk_rank = e.max_rank
+        FROM (
+          SELECT session_id, risk_level, risk_score, created_at,
+                 ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id DESC) AS rn,
+                 MAX({_RISK_RANK_SQL.format(col="risk_level")}) OVER (PARTITION BY session_id) AS max_rank
+          FROM symptom_events
+        ) AS e
+        WHERE e.session_id = session_summary.session_id AND e.rn = 1
+        """
+    )
+
+
+def parse_session_cursor(raw: str | None) -> tuple[str, str] | None:
+    if not raw:
+        return None
+    created_at, sep, session_id = raw.rpartition("|")
+    if not sep or not created_at or not session_id:
+        raise ValueError("malformed cursor")
+    return created_at, session_id
+
+
+def list_sessions(
+    db: sqlite3.Connection,
+    since: str | None = None,
+    until: str | None = None,
+    max_risk: Sequence[str] | None = None,
+    has_sos: bool | None = None,
+    cursor: tuple[str, str] | None = None,
+    limit: int = 50,
+) -> dict[str, Any]:
+    # Newest first. The keyset seek on (created_at, session_id) makes page 1000 cost
+    # the same as page 1; every column comes from the one summary row.
+    clauses: list[str] = []
+    params: list[Any] = []
+    if since is not None:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(until)
+    if has_sos is not None:
+        clauses.append("sos_count > 0" if has_sos else "sos_count = 0")
+    if cursor is not None:
+        clauses.append("(created_at, session_id) < (?, ?)")
+        params.extend(cursor)
+    sql = "SELECT * FROM session_summary {where} ORDER BY created_at DESC, session_id DESC LIMIT ?"
+    if not max_risk:
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = db.execute(sql.format(where=where), (*params, int(limit) + 1)).fetchall()
+    else:
+        # One seek per risk level on (max_risk_rank, created_at, session_id), merged
+        # here; an IN list over the index would have to sort every matching row. A session
+        # never triaged also has rank 0 but no risk level, so it matches no filter.
+        where = f"WHERE {' AND '.join(['max_risk_rank = ?', 'risk_level IS NOT NULL', *clauses])}"
+        rows = []
+        for level in max_risk:
+            rows += db.execute(sql.format(where=where), (RISK_LEVELS.index(level), *params, int(limit) + 1)).fetchall()
+        rows.sort(key=lambda r: (r["created_at"], r["session_id"]), reverse=True)
+
+    page = rows[:limit]
+    sessions = [
+        {
+            "session_id": r["session_id"],
+            "created_at": r["created_at"],
+            "message_count": int(r["message_count"]),
+            "sos_count": int(r["sos_count"]),
+            "max_risk_level": RISK_LEVELS[int(r["max_risk_rank"])] if r["risk_level"] is not None else None,
+            "last_risk": (
+                {"risk_level": r["risk_level"], "risk_score": r["risk_score"], "at": r["risk_at"]}
+                if r["risk_level"] is not None
+                else None
+            ),
+            "last_vitals": (
+                {
+                    "pulse_bpm": r["pulse_bpm"],
+                    "temperature_c": r["temperature_c"],
+                    "oxygen_percent": r["oxygen_percent"],
+                    "air_quality_ppm": r["air_quality_ppm"],
+                    "at": r["vitals_at"],
+                }
+                if r["vitals_at"] is not None
+                else None
+            ),
+        }
+        for r in page
+    ]
+    last = page[-1] if page else None
+    more = len(rows) > limit and last is not None
+    return {
+        "sessions": sessions,
+        "next_cursor": f"{last['created_at']}|{last['session_id']}" if more else None,
+    }
+
+
+def _median_seconds_to_emergency(db: sqlite3.Connection, since: str, until: str) -> dict[str, Any]:
+    hist = db.execute(
+        """
+        SELECT seconds_bucket, SUM(sessions) AS sessions FROM rollup_emergency_daily
+        WHERE day >= ? AND day < ?
+        GROUP BY seconds_bucket
+        ORDER BY seconds_bucket
+        """,
+        (since, until),
+    ).fetchall()
+    n = sum(int(r["sessions"]) for r in hist)
+    if not n:
+        return {"sessions": 0, "median_s": None}
+    # Values at ranks (n - 1) // 2 and n // 2; they are the same bucket when n is odd.
+    ranks = ((n - 1) // 2, n // 2)
+    picked: list[float] = []
+    seen = 0
+    for r in hist:
+        seen += int(r["sessions"])
+        while len(picked) < 2 and ranks[len(picked)] < seen:
+            picked.append(float(r["seconds_bucket"]))
+        if len(picked) == 2:
+            break
+    return {"sessions": n, "median_s": round(sum(picked) / 2, 1)}
+
+
+def analytics_snapshot(db: sqlite3.Connection, since: str, until: str, top: int = 10) -> dict[str, Any]:
+    sos = db.execute(
+        "SELECT hour, events FROM rollup_sos_hourly WHERE hour >= ? AND hour < ? ORDER BY hour",
+        (since, until),
+    ).fetchall()
+
+    risk_days: dict[str, dict[str, Any]] = {}
+    for r in db.execute(
+        "SELECT day, risk_level, events FROM rollup_risk_daily WHERE day >= ? AND day < ? ORDER BY day",
+        (since, until),
+    ):
+        risk_days.setdefault(r["day"], {"day": r["day"]})[r["risk_level"]] = int(r["events"])
+
+    symptoms = db.execute(
+        """
+        SELECT symptom, SUM(events) AS events FROM rollup_symptoms_daily
+        WHERE day >= ? AND day < ?
+        GROUP BY symptom
+        ORDER BY events DESC, symptom
+        LIMIT ?
+        """,
+        (since, until, int(top)),
+    ).fetchall()
+
+    return {
+        "range": {"since": since, "until": until},
+        "sos_per_hour": [{"hour": r["hour"], "count": int(r["events"])} for r in sos],
+        "risk_per_day": list(risk_days.values()),
+        "top_symptoms": [{"symptom": r["symptom"], "count": int(r["events"])} for r in symptoms],
+        "time_to_emergency": _median_seconds_to_emergency(db, since, until),
+    }
@@ -3,25 +3,72 @@ from __future__ import annotations
 import json
 import os
 import random
+import threading
 import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timezone
 from io import BytesIO
-from typing import Any
+from typing import Any, Iterator
 
+import click
 from flask import Flask, Response, jsonify, render_template, request, send_file
 
-from .admin import admin_bp
-from .db import close_db, get_db, init_db
-from .geo import BENI_SUEF_CENTER, nearest_hospital
-from .hospitals import HOSPITALS_BENI_SUEF
-from .llm import try_llm_guidance
-from .reporting import render_pdf_report
+from . import metrics
+from .admin import admin_bp, parse_risk_levels
+from .analytics import (
+    rebuild_rollups,
+    record_message,
+    record_session,
+    record_sos_event,
+    record_symptom_event,
+    record_vitals,
+)
+from .bulk_reports import iter_report_zip, prefetch_payloads, select_sessions
+from .db import close_db, connect, get_db, init_db
+from .downsample import VITAL_CHANNELS, parse_instant, vitals_series
+from .events import publish_risk, publish_session, publish_sos
+from .export import FORMATS, export_filename, iter_session_export
+from .geo import (
+    BENI_SUEF_CENTER,
+    get_hospital_index,
+    load_hospital_index,
+    load_routing_engine,
+    nearby_hospitals,
+    nearest_hospital,
+    valid_coordinates,
+)
+from .guidance import get_guidance_job, guidance_slot, store_guidance_message, submit_guidance
+from .idempotency import idempotent
+from .llm import llm_enabled, stream_llm_guidance
+from .reporting import (
+    build_report_payload,
+    cached_report,
+    report_cache_key,
+    report_filename,
+    report_vitals_pins,
+    render_pdf_report,
+    store_report,
+)
+from .report_jobs import ReportQueueFull, finished_job, get_report_job, submit_report
+from .routing import build_from_csv
+from .search import backfill_pending, backfill_search, start_search_backfill
 from .security import apply_security_headers, sanitize_user_text
 from .triage import round_vitals, smooth_step, triage_assess, vitals_alerts
+from .vitals_stats import VitalsAnalytics
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, str(default)).strip() or default))
+    except ValueError:
+        return default
+
+
+_VITALS_STATS_SESSIONS = _env_int("VITALS_STATS_SESSIONS", 10_000)
 _SESSION_VITALS_STATE: dict[str, dict[str, float]] = {}
+_VITALS_STATS_LOCK = threading.Lock()
+_SESSION_VITALS_STATS: OrderedDict[str, VitalsAnalytics] = OrderedDict()
 
 
 def _now_iso() -> str:
@@ -36,23 +83,29 @@ def _ensure_session(session_id: str | None) -> str:
     db = get_db()
     row = db.execute("SELECT id FROM sessions WHERE id = ?", (sid,)).fetchone()
     if row is None:
-        db.execute("INSERT INTO sessions (id, created_at) VALUES (?, ?)", (sid, _now_iso()))
+        now = _now_iso()
+        db.execute("INSERT INTO sessions (id, created_at) VALUES (?, ?)", (sid, now))
+        record_session(db, sid, now)
         db.commit()
+        publish_session(sid, now)
     return sid
 
 
 def _insert_message(session_id: str, role: str, content: str) -> int:
     db = get_db()
+    now = _now_iso()
     cur = db.execute(
         "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
-        (session_id, role, content, _now_iso()),
+        (session_id, role, content, now),
     )
+    record_message(db, session_id, now)
     db.commit()
     return int(cur.lastrowid)
 
 
 def _insert_vitals(session_id: str, vitals: dict[str, float]) -> None:
     db = get_db()
+    now = _now_iso()
     db.execute(
         """
         INSERT INTO vitals (session_id, pulse_bpm, temperature_c, oxygen_percent, air_quality_ppm, created_at)
@@ -64,9 +117,10 @@ def _insert_vitals(session_id: str, vitals: dict[str, float]) -> None:
             vitals["temperature_c"],
             vitals["oxygen_percent"],
             vitals["air_quality_ppm"],
-            _now_iso(),
+            now,
         ),
     )
+    record_vitals(db, session_id, vitals, now)
     db.commit()
 
 
@@ -81,6 +135,7 @@ def _insert_symptom_event(
     emergency_mode: bool,
 ) -> None:
     db = get_db()
+    now = _now_iso()
     db.execute(
         """
         INSERT INTO symptom_events
@@ -96,10 +151,12 @@ def _insert_symptom_event(
             recommendation,
             1 if hospital_needed else 0,
             1 if emergency_mode else 0,
-            _now_iso(),
+            now,
         ),
     )
+    record_symptom_event(db, session_id, matched_symptoms, risk_level, risk_score, emergency_mode, now)
     db.commit()
+    publish_risk(session_id, risk_level, risk_score, now)
 
 
 def _insert_sos_event(
@@ -110,6 +167,7 @@ def _insert_sos_event(
     hospital: dict[str, Any],
 ) -> None:
     db = get_db()
+    now = _now_iso()
     db.execute(
         """
         INSERT INTO sos_events
@@ -126,10 +184,12 @@ def _insert_sos_event(
             str(hospital.get("phone", "")),
             float(hospital.get("distance_km", 0.0)),
             int(hospital.get("eta_minutes", 1)),
-            _now_iso(),
+            now,
         ),
     )
+    record_sos_event(db, session_id, now)
     db.commit()
+    publish_sos(session_id, trigger, hospital, now)
 
 
 def _generate_vitals(session_id: str) -> dict[str, float]:
@@ -157,11 +217,118 @@ def _generate_vitals(session_id: str) -> dict[str, float]:
 
     vitals = round_vitals(state)
     _insert_vitals(session_id, vitals)
+    with _VITALS_STATS_LOCK:
+        stats = _SESSION_VITALS_STATS.pop(session_id, None) or VitalsAnalytics()
+        _SESSION_VITALS_STATS[session_id] = stats
+        while len(_SESSION_VITALS_STATS) > _VITALS_STATS_SESSIONS:
+            _SESSION_VITALS_STATS.popitem(last=False)
+        stats.update(vitals)
     return vitals
 
 
+def _session_trends(session_id: str) -> dict[str, Any] | None:
+    with _VITALS_STATS_LOCK:
+        stats = _SESSION_VITALS_STATS.get(session_id)
+        return stats.snapshot() if stats is not None else None
+
+
+def _chat_turn(payload: dict[str, Any]) -> tuple[dict[str, Any], str]:
+    message = sanitize_user_text(str(payload.get("message", "")))
+    session_id = _ensure_session(payload.get("session_id"))
+
+    lat = payload.get("lat")
+    lng = payload.get("lng")
+    try:
+        lat_f = float(lat) if lat is not None else float(BENI_SUEF_CENTER["lat"])
+        lng_f = float(lng) if lng is not None else float(BENI_SUEF_CENTER["lng"])
+    except (TypeError, ValueError):
+        lat_f = float(BENI_SUEF_CENTER["lat"])
+        lng_f = float(BENI_SUEF_CENTER["lng"])
+    if not valid_coordinates(lat_f, lng_f):
+        lat_f = float(BENI_SUEF_CENTER["lat"])
+        lng_f = float(BENI_SUEF_CENTER["lng"])
+
+    if not message:
+        vitals = _generate_vitals(session_id)
+        triage = triage_assess("", vitals, _session_trends(session_id))
+        return (
+            {
+                "session_id": session_id,
+                "reply": "Describe symptoms (example: fever + cough + fatigue) and duration.",
+                "risk": {
+                    "risk_level": triage.risk_level,
+                    "risk_score": triage.risk_score,
+                    "recommendation": triage.recommendation,
+                    "hospital_needed": triage.hospital_needed,
+                    "emergency_mode": triage.emergency_mode,
+                },
+            },
+            "",
+        )
+
+    _insert_message(session_id, "user", message)
+    vitals = _generate_vitals(session_id)
+    triage = triage_assess(message, vitals, _session_trends(session_id))
+
+    _insert_symptom_event(
+        session_id=session_id,
+        raw_message=message,
+        matched_symptoms=sorted(triage.matched_symptoms),
+        risk_score=triage.risk_score,
+        risk_level=triage.risk_level,
+        recommendation=triage.recommendation,
+        hospital_needed=triage.hospital_needed,
+        emergency_mode=triage.emergency_mode,
+    )
+
+    lines: list[str] = []
+    lines.append(f"Risk level: {triage.risk_level} (score {triage.risk_score})")
+    if triage.matched_symptoms:
+        lines.append(f"Detected symptoms: {', '.join(sorted(triage.matched_symptoms))}")
+    if triage.red_flags:
+        lines.append("Clinical red flags:")
+        lines.extend([f"- {rf}" for rf in triage.red_flags])
+    lines.append(triage.recommendation)
+    lines.append("")
+    lines.append("Medical disclaimer: This is triage guidance, not a diagnosis. Follow local protocols.")
+
+    nearest = None
+    if triage.emergency_mode:
+        nearest = nearest_hospital(lat_f, lng_f)
+        _insert_sos_event(session_id=session_id, trigger="auto", lat=lat_f, lng=lng_f, hospital=nearest)
+
+    reply = "\n".join(lines)
+    _insert_message(session_id, "assistant", reply)
+
+    return (
+        {
+            "session_id": session_id,
+            "reply": reply,
+            "vitals": vitals,
+            "alerts": vitals_alerts(vitals["pulse_bpm"], vitals["temperature_c"]),
+            "risk": {
+                "risk_level": triage.risk_level,
+                "risk_score": triage.risk_score,
+                "recommendation": triage.recommendation,
+                "hospital_needed": triage.hospital_needed,
+                "emergency_mode": triage.emergency_mode,
+            },
+            "triage": triage.to_public_dict(),
+            "auto_emergency": {"enabled": triage.emergency_mode, "nearest_hospital": nearest},
+        },
+        message,
+    )
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 def create_app() -> Flask:
     init_db()
+    load_hospital_index()
+    load_routing_engine()
+    start_search_backfill()
     app = Flask(__name__, static_folder="../static", template_folder="../templates")
     app.teardown_appcontext(close_db)
     app.register_blueprint(admin_bp)
@@ -188,18 +355,56 @@ def create_app() -> Flask:
 
     @app.get("/api/hospitals")
     def api_hospitals() -> Any:
-        return jsonify({"hospitals": HOSPITALS_BENI_SUEF})
+        return jsonify({"hospitals": get_hospital_index().hospitals})
+
+    @app.get("/api/hospitals/nearby")
+    def api_hospitals_nearby() -> Any:
+        args = request.args
+        try:
+            lat = float(args.get("lat", BENI_SUEF_CENTER["lat"]))
+            lng = float(args.get("lng", BENI_SUEF_CENTER["lng"]))
+        except (TypeError, ValueError):
+            lat = float(BENI_SUEF_CENTER["lat"])
+            lng = float(BENI_SUEF_CENTER["lng"])
+        try:
+            k = int(args.get("k", 5))
+        except (TypeError, ValueError):
+            k = 5
+        k = max(1, min(k, 50))
+        specialty = str(args.get("specialty", "")).strip()
+        er = args.get("er", "").strip().lower() in {"1", "true", "yes"}
+        icu = args.get("icu", "").strip().lower() in {"1", "true", "yes"}
+        # Without facility data the filters cannot be evaluated; answer unfiltered and say so
+        # rather than returning an empty list that looks like "no hospital nearby".
+        filters_applied = get_hospital_index().filterable
+        try:
+            if filters_applied:
+                hospitals = nearby_hospitals(lat, lng, k=k, er=er, icu=icu, specialty=specialty)
+            else:
+                hospitals = nearby_hospitals(lat, lng, k=k)
+        except ValueError as exc:
+            return jsonify({"error": "bad_request", "detail": str(exc)}), 400
+        return jsonify(
+            {
+                "hospitals": hospitals,
+                "input_location": {"lat": lat, "lng": lng},
+                "filters": {"k": k, "specialty": specialty.lower(), "er": er, "icu": icu},
+                "filters_applied": filters_applied,
+            }
+        )
 
     @app.get("/api/vitals")
     def api_vitals() -> Any:
         session_id = _ensure_session(request.args.get("session_id"))
         vitals = _generate_vitals(session_id)
         alerts = vitals_alerts(vitals["pulse_bpm"], vitals["temperature_c"])
-        triage = triage_assess("", vitals)
+        trends = _session_trends(session_id)
+        triage = triage_assess("", vitals, trends)
         return jsonify(
             {
                 "session_id": session_id,
                 "vitals": vitals,
+                "trends": trends,
                 "alerts": alerts,
                 "risk": {
                     "risk_level": triage.risk_level,
@@ -212,101 +417,101 @@ def create_app() -> Flask:
             }
         )
 
-    @app.post("/api/ask_ai")
-    def api_ask_ai() -> Any:
-        payload = request.get_json(silent=True) or {}
-        message = sanitize_user_text(str(payload.get("message", "")))
-        session_id = _ensure_session(payload.get("session_id"))
-
-        lat = payload.get("lat")
-        lng = payload.get("lng")
+    @app.get("/api/sessions/<session_id>/vitals/series")
+    def api_vitals_series(session_id: str) -> Any:
+        db = get_db()
+        if db.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is None:
+            return jsonify({"error": "not_found"}), 404
+        args = request.args
         try:
-            lat_f = float(lat) if lat is not None else float(BENI_SUEF_CENTER["lat"])
-            lng_f = float(lng) if lng is not None else float(BENI_SUEF_CENTER["lng"])
-        except (TypeError, ValueError):
-            lat_f = float(BENI_SUEF_CENTER["lat"])
-            lng_f = float(BENI_SUEF_CENTER["lng"])
-
-        if not message:
-            vitals = _generate_vitals(session_id)
-            triage = triage_assess("", vitals)
-            return jsonify(
-                {
-                    "session_id": session_id,
-                    "reply": "Describe symptoms (example: fever + cough + fatigue) and duration.",
-                    "risk": {
-                        "risk_level": triage.risk_level,
-                        "risk_score": triage.risk_score,
-                        "recommendation": triage.recommendation,
-                        "hospital_needed": triage.hospital_needed,
-                        "emergency_mode": triage.emergency_mode,
-                    },
-                }
-            )
-
-        _insert_message(session_id, "user", message)
-        vitals = _generate_vitals(session_id)
-        triage = triage_assess(message, vitals)
-
-        _insert_symptom_event(
-            session_id=session_id,
-            raw_message=message,
-            matched_symptoms=sorted(triage.matched_symptoms),
-            risk_score=triage.risk_score,
-            risk_level=triage.risk_level,
-            recommendation=triage.recommendation,
-            hospital_needed=triage.hospital_needed,
-            emergency_mode=triage.emergency_mode,
+            points = int(args.get("points", "120"))
+            start = parse_instant(args.get("from"))
+            end = parse_instant(args.get("to"))
+        except (TypeError, ValueError, OverflowError, OSError) as exc:
+            return jsonify({"error": "bad_request", "detail": str(exc)}), 400
+        # LTTB keeps both endpoints, so fewer than 3 points would mean "no downsampling".
+        points = max(3, min(points, 2000))
+        wanted = {c.strip() for c in args.get("channels", "").split(",") if c.strip()}
+        if wanted - set(VITAL_CHANNELS):
+            detail = f"channels must be a subset of {', '.join(VITAL_CHANNELS)}"
+            return jsonify({"error": "bad_request", "detail": detail}), 400
+        channels = [c for c in VITAL_CHANNELS if c in wanted] if wanted else list(VITAL_CHANNELS)
+
+        out = vitals_series(db, session_id, points, start, end, channels)
+        resp = jsonify({"session_id": session_id, **out})
+        # A closed range never changes, so the browser may keep it too.
+        resp.headers["Cache-Control"] = "private, max-age=86400, immutable" if out["closed"] else "no-cache"
+        return resp
+
+    @app.get("/api/sessions/<session_id>/export")
+    def api_session_export(session_id: str) -> Any:
+        row = get_db().execute("SELECT id, created_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return jsonify({"error": "not_found"}), 404
+        fmt = request.args.get("format", "ndjson").strip().lower()
+        if fmt not in FORMATS:
+            return jsonify({"error": "bad_request", "detail": f"format must be one of {', '.join(FORMATS)}"}), 400
+        compress = request.args.get("gzip", "").strip().lower() in {"1", "true", "yes"}
+        mimetype = "application/gzip" if compress else FORMATS[fmt][1]
+        session = {"session_id": row["id"], "created_at": row["created_at"]}
+        resp = Response(
+            iter_session_export(session, fmt, compress), mimetype=mimetype, headers={"Cache-Control": "no-store"}
         )
+        resp.headers.set("Content-Disposition", "attachment", filename=export_filename(session_id, fmt, compress))
+        return resp
 
-        lines: list[str] = []
-        lines.append(f"Risk level: {triage.risk_level} (score {triage.risk_score})")
-        if triage.matched_symptoms:
-            lines.append(f"Detected symptoms: {', '.join(sorted(triage.matched_symptoms))}")
-        if triage.red_flags:
-            lines.append("Clinical red flags:")
-            lines.extend([f"- {rf}" for rf in triage.red_flags])
-        lines.append(triage.recommendation)
-        lines.append("")
-        lines.append("Medical disclaimer: This is triage guidance, not a diagnosis. Follow local protocols.")
-
-        llm_extra = try_llm_guidance(message)
-        if llm_extra:
-            lines.append("")
-            lines.append("Additional AI guidance:")
-            lines.append(llm_extra)
-
-        nearest = None
-        if triage.emergency_mode:
-            nearest = nearest_hospital(lat_f, lng_f)
-            _insert_sos_event(session_id=session_id, trigger="auto", lat=lat_f, lng=lng_f, hospital=nearest)
-
-        reply = "\n".join(lines)
-        _insert_message(session_id, "assistant", reply)
-
-        return jsonify(
-            {
-                "session_id": session_id,
-                "reply": reply,
-                "vitals": vitals,
-                "alerts": vitals_alerts(vitals["pulse_bpm"], vitals["temperature_c"]),
-                "risk": {
-                    "risk_level": triage.risk_level,
-                    "risk_score": triage.risk_score,
-                    "recommendation": triage.recommendation,
-                    "hospital_needed": triage.hospital_needed,
-                    "emergency_mode": triage.emergency_mode,
-                },
-                "triage": triage.to_public_dict(),
-                "auto_emergency": {"enabled": triage.emergency_mode, "nearest_hospital": nearest},
-            }
+    @app.post("/api/ask_ai")
+    @idempotent
+    def api_ask_ai() -> Any:
+        body, message = _chat_turn(request.get_json(silent=True) or {})
+        if message:
+            body["guidance_job"] = submit_guidance(body["session_id"], message)
+        return jsonify(body)
+
+    @app.post("/api/ask_ai/stream")
+    @idempotent
+    def api_ask_ai_stream() -> Any:
+        body, message = _chat_turn(request.get_json(silent=True) or {})
+        session_id = body["session_id"]
+
+        def events() -> Iterator[str]:
+            yield _sse("triage", body)
+            if not message or not llm_enabled():
+                yield _sse("done", {"guidance": None})
+                return
+            parts: list[str] = []
+            with guidance_slot() as admitted:
+                if not admitted:
+                    metrics.incr("llm.stream_shed")
+                    yield _sse("done", {"guidance": None})
+                    return
+                for chunk in stream_llm_guidance(message):
+                    parts.append(chunk)
+                    yield _sse("token", {"text": chunk})
+            text = "".join(parts).strip()
+            if text:
+                store_guidance_message(session_id, text)
+            yield _sse("done", {"guidance": text or None})
+
+        return Response(
+            events(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
+    @app.get("/api/ask_ai/<job_id>")
+    def api_ask_ai_guidance(job_id: str) -> Any:
+        job = get_guidance_job(job_id)
+        if job is None:
+            return jsonify({"error": "not_found"}), 404
+        return jsonify(job)
+
     @app.post("/ask_ai")
     def ask_ai() -> Any:
         return api_ask_ai()
 
     @app.post("/api/sos")
+    @idempotent
     def api_sos() -> Any:
         payload = request.get_json(silent=True) or {}
         session_id = _ensure_session(payload.get("session_id"))
@@ -316,6 +521,9 @@ def create_app() -> Flask:
         except (TypeError, ValueError):
             lat = float(BENI_SUEF_CENTER["lat"])
             lng = float(BENI_SUEF_CENTER["lng"])
+        if not valid_coordinates(lat, lng):
+            lat = float(BENI_SUEF_CENTER["lat"])
+            lng = float(BENI_SUEF_CENTER["lng"])
         hospital = nearest_hospital(lat, lng)
         _insert_sos_event(session_id=session_id, trigger="manual", lat=lat, lng=lng, hospital=hospital)
         return jsonify({"session_id": session_id, "nearest_hospital": hospital, "input_location": {"lat": lat, "lng": lng}})
@@ -328,80 +536,125 @@ def create_app() -> Flask:
     def api_report() -> Any:
         session_id = _ensure_session(request.args.get("session_id"))
         db = get_db()
-        vitals_rows = db.execute(
-            """
-            SELECT pulse_bpm, temperature_c, oxygen_percent, air_quality_ppm, created_at
-            FROM vitals
-            WHERE session_id = ?
-            ORDER BY id DESC
-            LIMIT 20
-            """,
-            (session_id,),
-        ).fetchall()
-        symptom_rows = db.execute(
-            """
-            SELECT matched_symptoms_json, risk_score, risk_level, created_at
-            FROM symptom_events
-            WHERE session_id = ?
-            ORDER BY id DESC
-            LIMIT 20
-            """,
-            (session_id,),
-        ).fetchall()
-        sos_rows = db.execute(
-            """
-            SELECT trigger, hospital_name, distance_km, eta_minutes, created_at
-            FROM sos_events
-            WHERE session_id = ?
-            ORDER BY id DESC
-            LIMIT 20
-            """,
-            (session_id,),
-        ).fetchall()
-        analysis_rows = db.execute(
-            """
-            SELECT content, created_at
-            FROM messages
-            WHERE session_id = ? AND role = 'assistant'
-            ORDER BY id DESC
-            LIMIT 10
-            """,
-            (session_id,),
-        ).fetchall()
-        last_symptom = db.execute(
-            """
-            SELECT risk_score, risk_level, recommendation
-            FROM symptom_events
-            WHERE session_id = ?
-            ORDER BY id DESC
-            LIMIT 1
-            """,
-            (session_id,),
-        ).fetchone()
-        risk = {
-            "risk_score": int(last_symptom["risk_score"]) if last_symptom else 0,
-            "risk_level": str(last_symptom["risk_level"]) if last_symptom else "Low",
-            "recommendation": str(last_symptom["recommendation"]) if last_symptom else "",
-        }
+        pin = report_vitals_pins(db, [session_id]).get(session_id)
+        key = report_cache_key(db, session_id, pin)
+        if key in request.if_none_match:
+            metrics.incr("reports.not_modified")
+            return Response(status=304, headers={"ETag": f'"{key}"'})
+
+        filename = report_filename(session_id)
+        path = cached_report(key)
+        if path is not None:
+            metrics.incr("reports.cache_hits")
+            return send_file(
+                path, mimetype="application/pdf", as_attachment=True, download_name=filename, etag=key, conditional=True
+            )
 
-        payload = {
-            "session_id": session_id,
-            "risk": risk,
-            "vitals": [dict(r) for r in vitals_rows],
-            "symptoms": [
-                {
-                    "matched_symptoms": (json.loads(r["matched_symptoms_json"]) if r["matched_symptoms_json"] else []),
-                    "risk_score": int(r["risk_score"]),
-                    "risk_level": str(r["risk_level"]),
-                    "created_at": str(r["created_at"]),
-                }
-                for r in symptom_rows
-            ],
-            "sos_events": [dict(r) for r in sos_rows],
-            "analysis": [dict(r) for r in analysis_rows],
-        }
+        metrics.incr("reports.cache_misses")
+        pdf_bytes, filename = render_pdf_report(build_report_payload(db, session_id, pin))
+        store_report(key, pdf_bytes)
+        return send_file(
+            BytesIO(pdf_bytes), mimetype="application/pdf", as_attachment=True, download_name=filename, etag=key
+        )
+
+    @app.post("/api/reports")
+    def api_reports_submit() -> Any:
+        payload = request.get_json(silent=True) or {}
+        session_id = _ensure_session(payload.get("session_id") or request.args.get("session_id"))
+        db = get_db()
+        pin = report_vitals_pins(db, [session_id]).get(session_id)
+        key = report_cache_key(db, session_id, pin)
+        if cached_report(key) is not None:
+            job_id = finished_job(session_id, key)
+        else:
+            try:
+                job_id = submit_report(session_id, key, build_report_payload(db, session_id, pin))
+            except ReportQueueFull:
+                # Admission control: shed report bursts instead of letting them queue behind each other.
+                resp = jsonify({"error": "busy", "session_id": session_id})
+                resp.status_code = 429
+                resp.headers["Retry-After"] = "5"
+                return resp
+        status = (get_report_job(job_id) or {}).get("status", "pending")
+        resp = jsonify({"job_id": job_id, "session_id": session_id, "status": status})
+        resp.status_code = 200 if status == "done" else 202
+        resp.headers["Location"] = f"/api/reports/{job_id}"
+        return resp
+
+    @app.get("/api/reports/<job_id>")
+    def api_reports_status(job_id: str) -> Any:
+        job = get_report_job(job_id)
+        if job is None:
+            return jsonify({"error": "not_found"}), 404
+        status = {"job_id": job_id, "session_id": job["session_id"], "status": job["status"]}
+        if job["status"] == "pending":
+            return jsonify(status), 202
+        if job["status"] == "failed":
+            return jsonify(status), 500
+        path = cached_report(job["key"])
+        if path is None:
+            # Evicted since it was rendered; the client can submit again.
+            return jsonify({**status, "status": "expired"}), 410
+        return send_file(
+            path,
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=report_filename(job["session_id"]),
+            etag=job["key"],
+            conditional=True,
+        )
 
-        pdf_bytes, filename = render_pdf_report(payload)
-        return send_file(BytesIO(pdf_bytes), mimetype="application/pdf", as_attachment=True, download_name=filename)
+    @app.cli.command("bulk-report")
+    @click.argument("out_path", type=click.Path(dir_okay=False))
+    @click.option("--since", help="sessions created at or after this ISO timestamp/date")
+    @click.option("--until", help="sessions created before this ISO timestamp/date")
+    @click.option("--risk", help="comma-separated risk levels, e.g. Medium,Critical")
+    @click.option("--limit", type=int, default=500, show_default=True)
+    def bulk_report_command(out_path: str, since: str | None, until: str | None, risk: str | None, limit: int) -> None:
+        try:
+            risk_levels = parse_risk_levels(risk)
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), param_hint="--risk")
+        conn = connect()
+        try:
+            sessions = select_sessions(conn, since=since, until=until, risk_levels=risk_levels, limit=limit)
+            items = prefetch_payloads(conn, [s["session_id"] for s in sessions])
+        finally:
+            conn.close()
+        t0 = time.perf_counter()
+        with open(out_path, "wb") as f:
+            for chunk in iter_report_zip(sessions, items):
+                f.write(chunk)
+        click.echo(f"wrote {out_path}: {len(items)} reports in {time.perf_counter() - t0:.1f}s")
+
+    @app.cli.command("rebuild-rollups")
+    def rebuild_rollups_command() -> None:
+        t0 = time.perf_counter()
+        conn = connect()
+        try:
+            counts = rebuild_rollups(conn)
+        finally:
+            conn.close()
+        summary = ", ".join(f"{table}={n}" for table, n in counts.items())
+        click.echo(f"rebuilt rollups in {time.perf_counter() - t0:.1f}s: {summary}")
+
+    @app.cli.command("backfill-search")
+    @click.option("--batch", type=int, default=5000, show_default=True)
+    def backfill_search_command(batch: int) -> None:
+        t0 = time.perf_counter()
+        conn = connect()
+        try:
+            n = backfill_search(conn, batch=max(1, batch))
+            left = sum(backfill_pending(conn).values())
+        finally:
+            conn.close()
+        click.echo(f"indexed {n} rows in {time.perf_counter() - t0:.1f}s, {left} pending")
+
+    @app.cli.command("build-road-graph")
+    @click.argument("edges_csv", type=click.Path(exists=True, dir_okay=False))
+    @click.argument("out_path", type=click.Path(dir_okay=False))
+    def build_road_graph_command(edges_csv: str, out_path: str) -> None:
+        n, m = build_from_csv(edges_csv, out_path)
+        click.echo(f"wrote {out_path}: {n} nodes, {m} edges")
 
     return app
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import csv
+import json
+import multiprocessing
+import os
+import sqlite3
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from typing import Any, Iterable, Iterator, Sequence
+
+from . import metrics
+from .downsample import vitals_summaries
+from .reporting import (
+    assemble_report_payload,
+    cached_report,
+    filename_token,
+    render_pdf_report,
+    report_digest,
+    report_filename,
+    report_vitals_pins,
+    store_report,
+)
+
+
+# Per-session row caps, matching the single-session report.
+_VITALS_CAP = 20
+_PREFETCH: dict[str, tuple[str, int]] = {
+    "symptoms": (
+        "SELECT id, session_id, matched_symptoms_json, risk_score, risk_level, recommendation, created_at "
+        "FROM symptom_events",
+        20,
+    ),
+    "sos": (
+        "SELECT id, session_id, trigger, hospital_name, distance_km, eta_minutes, created_at FROM sos_events",
+        20,
+    ),
+    "analysis": (
+        "SELECT id, session_id, content, created_at FROM messages WHERE role = 'assistant'",
+        10,
+    ),
+}
+
+
+def select_sessions(
+    db: sqlite3.Connection,
+    since: str | None = None,
+    until: str | None = None,
+    risk_levels: Sequence[str] | None = None,
+    limit: int = 500,
+) -> list[sqlite3.Row]:
+    # A session's risk is its latest triage result, as on its own report.
+    levels = json.dumps(list(risk_levels)) if risk_levels else None
+    return db.execute(
+        """
+        WITH sel AS (
+          SELECT id, created_at
+          FROM sessions
+          WHERE (:since IS NULL OR created_at >= :since) AND (:until IS NULL OR created_at < :until)
+        ),
+        latest AS (
+          SELECT session_id, risk_level,
+                 ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id DESC) AS rn
+          FROM symptom_events
+          WHERE session_id IN (SELECT id FROM sel)
+        )
+        SELECT sel.id AS session_id, sel.created_at, COALESCE(latest.risk_level, 'Low') AS risk_level
+        FROM sel
+        LEFT JOIN latest ON latest.session_id = sel.id AND latest.rn = 1
+        WHERE :levels IS NULL OR COALESCE(latest.risk_level, 'Low') IN (SELECT value FROM json_each(:levels))
+        ORDER BY sel.created_at, sel.id
+        LIMIT :limit
+        """,
+        {"since": since, "until": until, "levels": levels, "limit": int(limit)},
+    ).fetchall()
+
+
+def prefetch_payloads(db: sqlite3.Connection, session_ids: Sequence[str]) -> list[tuple[str, str, dict[str, Any]]]:
+    # One windowed query per table for the whole batch instead of five queries per session.
+    ids = json.dumps(list(session_ids))
+    grouped: dict[str, dict[str, list[sqlite3.Row]]] = {name: defaultdict(list) for name in (*_PREFETCH, "vitals")}
+    for name, (select, cap) in _PREFETCH.items():
+        joiner = "AND" if " WHERE " in select else "WHERE"
+        rows = db.execute(
+            f"""
+            SELECT * FROM (
+              SELECT t.*, ROW_NUMBER() OVER (PARTITION BY t.session_id ORDER BY t.id DESC) AS rn
+              FROM ({select} {joiner} session_id IN (SELECT value FROM json_each(?))) AS t
+            )
+            WHERE rn <= ?
+            ORDER BY session_id, rn
+            """,
+            (ids, cap),
+        ).fetchall()
+        for r in rows:
+            grouped[name][r["session_id"]].append(r)
+
+    # Vitals stop at each session's report pin, as in the single-session report.
+    pins = report_vitals_pins(db, session_ids)
+    for r in db.execute(
+        """
+        SELECT * FROM (
+          SELECT v.id, v.session_id, v.pulse_bpm, v.temperature_c, v.oxygen_percent, v.air_quality_ppm, v.created_at,
+                 ROW_NUMBER() OVER (PARTITION BY v.session_id ORDER BY v.id DESC) AS rn
+          FROM json_each(?) AS p JOIN vitals AS v ON v.session_id = p.key AND v.id <= p.value
+        )
+        WHERE rn <= ?
+        ORDER BY session_id, rn
+        """,
+        (json.dumps(pins), _VITALS_CAP),
+    ):
+        grouped["vitals"][r["session_id"]].append(r)
+
+    summaries = vitals_summaries(db, pins)
+    out: list[tuple[str, str, dict[str, Any]]] = []
+    for sid in session_ids:
+        vitals = grouped["vitals"].get(sid, [])
+        symptoms = grouped["symptoms"].get(sid, [])
+        sos = grouped["sos"].get(sid, [])
+        analysis = grouped["analysis"].get(sid, [])
+        # Newest row of each table comes first, which is exactly what the cache key pins.
+        key = report_digest(sid, (pins.get(sid), *(rows[0]["id"] if rows else None for rows in (symptoms, sos, analysis))))
+        payload = assemble_report_payload(
+            sid, vitals, symptoms, sos, analysis, symptoms[0] if symptoms else None, summaries.get(sid)
+        )
+        out.append((sid, key, payload))
+    return out
+
+
+class _ZipSink:
+    # Write-only, unseekable target: zipfile falls back to data descriptors and we
+    # hand each finished member to the client as soon as it is written.
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _workers(n_jobs: int) -> int:
+    try:
+        configured = int(os.environ.get("REPORT_BULK_WORKERS", "0").strip() or 0)
+    except ValueError:
+        configured = 0
+    return max(1, min(configured or (os.cpu_count() or 2), n_jobs))
+
+
+def _entry_name(session_id: str) -> str:
+    # index.csv keeps the real id next to the file it ended up in.
+    return report_filename(filename_token(session_id))
+
+
+def iter_report_zip(
+    sessions: Iterable[sqlite3.Row], items: Sequence[tuple[str, str, dict[str, Any]]]
+) -> Iterator[bytes]:
+    sink = _ZipSink()
+    index = StringIO()
+    w = csv.writer(index)
+    w.writerow(["session_id", "created_at", "risk_level", "file"])
+    for s in sessions:
+        w.writerow([s["session_id"], s["created_at"], s["risk_level"], _entry_name(s["session_id"])])
+
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        pending: list[tuple[str, str, dict[str, Any]]] = []
+        for sid, key, payload in items:
+            path = cached_report(key)
+            if path is None:
+                pending.append((sid, key, payload))
+                continue
+            metrics.incr("reports.bulk_cached")
+            zf.writestr(_entry_name(sid), path.read_bytes())
+            yield sink.drain()
+
+        if pending:
+            pool = ProcessPoolExecutor(
+                max_workers=_workers(len(pending)), mp_context=multiprocessing.get_context("spawn")
+            )
+            try:
+                futures = {pool.submit(render_pdf_report, payload): (sid, key) for sid, key, payload in pending}
+                for future in as_completed(futures):
+                    sid, key = futures[future]
+                    pdf_bytes, _ = future.result()
+                    store_report(key, pdf_bytes)
+                    metrics.incr("reports.bulk_rendered")
+                    zf.writestr(_entry_name(sid), pdf_bytes)
+                    yield sink.drain()
+            finally:
+                # Client gone or a render failed: don't keep rendering for nobody.
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        zf.writestr("index.csv", index.getvalue())
+    yield sink.drain()
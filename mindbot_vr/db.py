@@ -4,6 +4,8 @@ from typing import Any
 
 from flask import g
 
+from .analytics import ensure_rollups
+
 
 def _base_dir() -> Path:
     return Path(__file__).resolve().parent.parent
@@ -15,12 +17,16 @@ def _db_path() -> Path:
     return database_dir / "mindbot_vr.sqlite3"
 
 
+def connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(_db_path(), detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
 def get_db() -> sqlite3.Connection:
     if "db" not in g:
-        conn = sqlite3.connect(_db_path(), detect_types=sqlite3.PARSE_DECLTYPES)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON;")
-        g.db = conn
+        g.db = connect()
     return g.db
 
 
@@ -89,9 +95,165 @@ def init_db() -> None:
               created_at TEXT NOT NULL,
               FOREIGN KEY(session_id) REFERENCES sessions(id) ON DELETE CASCADE
             );
+
+            CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+            CREATE INDEX IF NOT EXISTS idx_vitals_session ON vitals(session_id, id);
+            CREATE INDEX IF NOT EXISTS idx_vitals_session_time ON vitals(session_id, created_at);
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+            CREATE INDEX IF NOT EXISTS idx_symptom_events_session ON symptom_events(session_id, id);
+            CREATE INDEX IF NOT EXISTS idx_sos_events_session ON sos_events(session_id, id);
+
+            CREATE TABLE IF NOT EXISTS llm_cache (
+              key TEXT PRIMARY KEY,
+              response TEXT NOT NULL,
+              created_at REAL NOT NULL,
+              used_at REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_used_at ON llm_cache(used_at);
+
+            CREATE TABLE IF NOT EXISTS background_jobs (
+              id TEXT PRIMARY KEY,
+              kind TEXT NOT NULL,
+              session_id TEXT NOT NULL,
+              cache_key TEXT,
+              status TEXT NOT NULL,
+              result TEXT,
+              created_at REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_background_jobs_created ON background_jobs(kind, created_at);
+            CREATE INDEX IF NOT EXISTS idx_background_jobs_key ON background_jobs(kind, cache_key) WHERE status = 'pending';
+
+            CREATE TABLE IF NOT EXISTS rollup_sos_hourly (
+              hour TEXT PRIMARY KEY,
+              events INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS rollup_risk_daily (
+              day TEXT NOT NULL,
+              risk_level TEXT NOT NULL,
+              events INTEGER NOT NULL,
+              PRIMARY KEY (day, risk_level)
+            );
+
+            CREATE TABLE IF NOT EXISTS rollup_symptoms_daily (
+              day TEXT NOT NULL,
+              symptom TEXT NOT NULL,
+              events INTEGER NOT NULL,
+              PRIMARY KEY (day, symptom)
+            );
+
+            CREATE TABLE IF NOT EXISTS session_timeline (
+              session_id TEXT PRIMARY KEY,
+              first_message_at TEXT NOT NULL,
+              emergency_at TEXT,
+              seconds_to_emergency REAL
+            );
+
+            CREATE TABLE IF NOT EXISTS rollup_emergency_daily (
+              day TEXT NOT NULL,
+              seconds_bucket INTEGER NOT NULL,
+              sessions INTEGER NOT NULL,
+              PRIMARY KEY (day, seconds_bucket)
+            );
+
+            CREATE TABLE IF NOT EXISTS session_summary (
+              session_id TEXT PRIMARY KEY,
+              created_at TEXT NOT NULL,
+              message_count INTEGER NOT NULL DEFAULT 0,
+              sos_count INTEGER NOT NULL DEFAULT 0,
+              risk_level TEXT,
+              risk_score INTEGER,
+              risk_at TEXT,
+              max_risk_rank INTEGER NOT NULL DEFAULT 0,
+              pulse_bpm REAL,
+              temperature_c REAL,
+              oxygen_percent REAL,
+              air_quality_ppm REAL,
+              vitals_at TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS rollup_state (
+              name TEXT PRIMARY KEY,
+              version INTEGER NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_session_summary_created ON session_summary(created_at, session_id);
+            CREATE INDEX IF NOT EXISTS idx_session_summary_risk ON session_summary(max_risk_rank, created_at, session_id);
+            CREATE INDEX IF NOT EXISTS idx_session_summary_sos
+              ON session_summary(created_at, session_id) WHERE sos_count > 0;
+            CREATE INDEX IF NOT EXISTS idx_session_summary_risk_sos
+              ON session_summary(max_risk_rank, created_at, session_id) WHERE sos_count > 0;
             """
         )
         conn.commit()
+        ensure_rollups(conn)
+        # Full-text search over chat and symptom text. The FTS tables, their sync
+        # triggers and the backfill high-water mark are created in one transaction,
+        # so every row is indexed exactly once: by a trigger (id > upto) or by the
+        # batched backfill (id <= upto). Deletes and edits only touch the index for
+        # rows already in it; the backfill picks up the current text of the rest.
+        conn.executescript(
+            """
+            BEGIN IMMEDIATE;
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+              content, content='messages', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS symptom_events_fts USING fts5(
+              raw_message, content='symptom_events', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+            );
+
+            CREATE TABLE IF NOT EXISTS search_backfill (
+              source TEXT PRIMARY KEY,
+              next_id INTEGER NOT NULL,
+              upto INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO search_backfill (source, next_id, upto)
+              SELECT 'messages', 1, COALESCE(MAX(id), 0) FROM messages;
+            INSERT OR IGNORE INTO search_backfill (source, next_id, upto)
+              SELECT 'symptom_events', 1, COALESCE(MAX(id), 0) FROM symptom_events;
+
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+              INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages
+              WHEN old.id > (SELECT upto FROM search_backfill WHERE source = 'messages')
+                OR old.id < (SELECT next_id FROM search_backfill WHERE source = 'messages')
+            BEGIN
+              INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages
+              WHEN old.id > (SELECT upto FROM search_backfill WHERE source = 'messages')
+                OR old.id < (SELECT next_id FROM search_backfill WHERE source = 'messages')
+            BEGIN
+              INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+              INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS symptom_events_fts_ai AFTER INSERT ON symptom_events BEGIN
+              INSERT INTO symptom_events_fts (rowid, raw_message) VALUES (new.id, new.raw_message);
+            END;
+            CREATE TRIGGER IF NOT EXISTS symptom_events_fts_ad AFTER DELETE ON symptom_events
+              WHEN old.id > (SELECT upto FROM search_backfill WHERE source = 'symptom_events')
+                OR old.id < (SELECT next_id FROM search_backfill WHERE source = 'symptom_events')
+            BEGIN
+              INSERT INTO symptom_events_fts (symptom_events_fts, rowid, raw_message)
+              VALUES ('delete', old.id, old.raw_message);
+            END;
+            CREATE TRIGGER IF NOT EXISTS symptom_events_fts_au AFTER UPDATE OF raw_message ON symptom_events
+              WHEN old.id > (SELECT upto FROM search_backfill WHERE source = 'symptom_events')
+                OR old.id < (SELECT next_id FROM search_backfill WHERE source = 'symptom_events')
+            BEGIN
+              INSERT INTO symptom_events_fts (symptom_events_fts, rowid, raw_message)
+              VALUES ('delete', old.id, old.raw_message);
+              INSERT INTO symptom_events_fts (rowid, raw_message) VALUES (new.id, new.raw_message);
+            END;
+
+            COMMIT;
+            """
+        )
     finally:
         conn.close()
 
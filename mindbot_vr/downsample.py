@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Iterable, Sequence
+
+from . import metrics
+
+
+VITAL_CHANNELS = ("pulse_bpm", "temperature_c", "oxygen_percent", "air_quality_ppm")
+
+
+def _area(a: tuple[float, float], b: tuple[float, float], c: tuple[float, float]) -> float:
+    return abs((a[0] - c[0]) * (b[1] - a[1]) - (a[0] - b[0]) * (c[1] - a[1]))
+
+
+class StreamingLTTB:
+    # Largest-Triangle-Three-Buckets over a stream of known length: only the current
+    # and the next bucket are held, so memory is O(n / threshold) whatever n is.
+    __slots__ = ("n", "buckets", "out", "_i", "_cur", "_nxt", "_cur_j", "_cur_end", "_nxt_end", "_last")
+
+    def __init__(self, n: int, threshold: int) -> None:
+        self.n = n
+        self.buckets = threshold - 2 if 3 <= threshold < n else 0
+        self.out: list[tuple[float, float]] = []
+        self._i = 0
+        self._cur: list[tuple[float, float]] = []
+        self._nxt: list[tuple[float, float]] = []
+        self._cur_j = 0
+        self._cur_end = self._start(1) if self.buckets else 0
+        self._nxt_end = self._start(2) if self.buckets else 0
+        self._last: tuple[float, float] | None = None
+
+    def _start(self, j: int) -> int:
+        # Bucket j covers [start(j), start(j + 1)) of the interior points 1 .. n - 2.
+        return 1 + min(j, self.buckets) * (self.n - 2) // self.buckets
+
+    def _pick(self, bucket: list[tuple[float, float]], target: tuple[float, float]) -> None:
+        a = self.out[-1]
+        self.out.append(max(bucket, key=lambda p: _area(a, p, target)))
+
+    def push(self, x: float, y: float) -> None:
+        i = self._i
+        self._i += 1
+        p = (x, y)
+        if not self.buckets or i == 0:
+            self.out.append(p)
+            return
+        if i >= self.n - 1:
+            self._last = p
+            return
+        if i < self._cur_end:
+            self._cur.append(p)
+        elif i < self._nxt_end:
+            self._nxt.append(p)
+        else:
+            self._pick(self._cur, _mean(self._nxt))
+            self._cur, self._nxt = self._nxt, [p]
+            self._cur_j += 1
+            self._cur_end, self._nxt_end = self._nxt_end, self._start(self._cur_j + 2)
+
+    def finish(self) -> list[tuple[float, float]]:
+        if self.buckets and self._last is not None:
+            if self._cur:
+                self._pick(self._cur, _mean(self._nxt) if self._nxt else self._last)
+            if self._nxt:
+                self._pick(self._nxt, self._last)
+            self.out.append(self._last)
+            self._cur, self._nxt, self._last = [], [], None
+        return self.out
+
+
+def _mean(points: list[tuple[float, float]]) -> tuple[float, float]:
+    n = len(points)
+    return sum(p[0] for p in points) / n, sum(p[1] for p in points) / n
+
+
+def lttb(points: Sequence[tuple[float, float]], threshold: int) -> list[tuple[float, float]]:
+    s = StreamingLTTB(len(points), threshold)
+    for x, y in points:
+        s.push(x, y)
+    return s.finish()
+
+
+def epoch_s(iso: str) -> float:
+    return datetime.fromisoformat(iso).timestamp()
+
+
+def _bucket_row(r: sqlite3.Row) -> dict[str, Any]:
+    out: dict[str, Any] = {"n": int(r["n"]), "start": r["t0"], "end": r["t1"]}
+    for ch in VITAL_CHANNELS:
+        out[ch] = {
+            "min": round(float(r[f"{ch}_min"]), 2),
+            "max": round(float(r[f"{ch}_max"]), 2),
+            "mean": round(float(r[f"{ch}_mean"]), 2),
+        }
+    return out
+
+
+_CHANNEL_AGGREGATES = ",\n".join(
+    f"MIN({ch}) AS {ch}_min, MAX({ch}) AS {ch}_max, AVG({ch}) AS {ch}_mean" for ch in VITAL_CHANNELS
+)
+
+
+def vitals_buckets(db: sqlite3.Connection, pins: dict[str, int], buckets: int) -> dict[str, list[dict[str, Any]]]:
+    # pins: session id -> newest vitals id to include. NTILE splits each session's samples
+    # into equal-count buckets in one pass over the (session_id, id) index; only the
+    # per-bucket aggregates leave SQLite.
+    rows = db.execute(
+        f"""
+        SELECT session_id, bucket, COUNT(*) AS n, MIN(created_at) AS t0, MAX(created_at) AS t1,
+               {_CHANNEL_AGGREGATES}
+        FROM (
+          SELECT v.session_id, v.created_at, {", ".join("v." + ch for ch in VITAL_CHANNELS)},
+                 NTILE(?) OVER (PARTITION BY v.session_id ORDER BY v.id) AS bucket
+          FROM json_each(?) AS p JOIN vitals AS v ON v.session_id = p.key AND v.id <= p.value
+        )
+        GROUP BY session_id, bucket
+        ORDER BY session_id, bucket
+        """,
+        (int(buckets), json.dumps(pins)),
+    ).fetchall()
+    out: dict[str, list[dict[str, Any]]] = {}
+    for r in rows:
+        out.setdefault(r["session_id"], []).append(_bucket_row(r))
+    return out
+
+
+# created_at as epoch seconds, computed by SQLite rather than parsed per row in Python.
+EPOCH_SQL = "(julianday(created_at) - 2440587.5) * 86400.0"
+
+
+def lttb_channels(
+    rows: Iterable[Sequence[Any]], n: int, points: int, channels: Sequence[str] = VITAL_CHANNELS
+) -> dict[str, list[list[float]]]:
+    # rows: (epoch seconds, *channel values) in time order.
+    streams = [StreamingLTTB(n, points) for _ in channels]
+    pushes = [s.push for s in streams]
+    for row in rows:
+        x = row[0]
+        for push, y in zip(pushes, row[1:]):
+            push(x, float(y))
+    return {ch: [[round(x, 3), round(y, 2)] for x, y in s.finish()] for ch, s in zip(channels, streams)}
+
+
+def vitals_summaries(
+    db: sqlite3.Connection, pins: dict[str, int], buckets: int = 60, points: int = 240
+) -> dict[str, dict[str, Any]]:
+    # Constant-size history for any session length: bucket bands plus an LTTB line per channel.
+    by_session = vitals_buckets(db, pins, buckets)
+    out: dict[str, dict[str, Any]] = {}
+    for sid, upto in pins.items():
+        bands = by_session.get(sid)
+        if not bands:
+            continue
+        n = sum(b["n"] for b in bands)
+        cur = db.execute(
+            f"SELECT {EPOCH_SQL}, {', '.join(VITAL_CHANNELS)} FROM vitals WHERE session_id = ? AND id <= ? ORDER BY id",
+            (sid, upto),
+        )
+        out[sid] = {
+            "samples": n,
+            "start": bands[0]["start"],
+            "end": bands[-1]["end"],
+            "buckets": bands,
+            "series": lttb_channels(cur, n, points),
+        }
+    return out
+
+
+def parse_instant(raw: str | None) -> str | None:
+    # Epoch seconds or ISO 8601 -> the UTC isoformat() that rows are stamped with,
+    # so range bounds compare correctly as strings against the index.
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    try:
+        dt = datetime.fromtimestamp(float(raw), tz=timezone.utc)
+    except ValueError:
+        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return dt.isoformat()
+
+
+# Rows are stamped with the server clock at insert time; a range that ended longer
+# ago than this can no longer gain rows and its series never changes.
+_CLOSED_GRACE_S = 5.0
+_SERIES_LOCK = threading.Lock()
+_SERIES_CACHE: OrderedDict[tuple[Any, ...], dict[str, Any]] = OrderedDict()
+
+
+def _series_cache_entries() -> int:
+    try:
+        return max(0, int(os.environ.get("VITALS_SERIES_CACHE_ENTRIES", "256").strip() or 256))
+    except ValueError:
+        return 256
+
+
+def range_closed(end: str | None) -> bool:
+    return end is not None and epoch_s(end) < time.time() - _CLOSED_GRACE_S
+
+
+def vitals_series(
+    db: sqlite3.Connection,
+    session_id: str,
+    points: int,
+    start: str | None = None,
+    end: str | None = None,
+    channels: Sequence[str] = VITAL_CHANNELS,
+) -> dict[str, Any]:
+    closed = range_closed(end)
+    key = (session_id, start, end, int(points), tuple(channels))
+    if closed:
+        with _SERIES_LOCK:
+            hit = _SERIES_CACHE.get(key)
+            if hit is not None:
+                _SERIES_CACHE.move_to_end(key)
+        if hit is not None:
+            metrics.incr("vitals_series.cache_hits")
+            return hit
+    metrics.incr("vitals_series.cache_misses")
+
+    clauses, params = ["session_id = ?"], [session_id]
+    if start is not None:
+        clauses.append("created_at >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("created_at < ?")
+        params.append(end)
+    where = " AND ".join(clauses)
+    # Pin the row set with max(id) so the streaming pass sees exactly the rows counted,
+    # even if the live session inserts more in between. "+id" keeps the planner on the
+    # (session_id, created_at) index, which already yields rows in time order.
+    head = db.execute(f"SELECT COUNT(*) AS n, MAX(id) AS last_id FROM vitals WHERE {where}", params).fetchone()
+    n = int(head["n"])
+    series: dict[str, list[list[float]]] = {ch: [] for ch in channels}
+    if n:
+        cur = db.execute(
+            f"SELECT {EPOCH_SQL}, {', '.join(channels)} FROM vitals "
+            f"WHERE {where} AND +id <= ? ORDER BY created_at, id",
+            (*params, head["last_id"]),
+        )
+        series = lttb_channels(cur, n, points, channels)
+    out = {"samples": n, "points": int(points), "from": start, "to": end, "closed": closed, "series": series}
+
+    limit = _series_cache_entries()
+    if closed and limit:
+        with _SERIES_LOCK:
+            _SERIES_CACHE[key] = out
+            while len(_SERIES_CACHE) > limit:
+                _SERIES_CACHE.popitem(last=False)
+    return out
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Iterator
+
+from . import metrics
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, str(default)).strip() or default))
+    except ValueError:
+        return default
+
+
+_QUEUE_SIZE = _env_int("EVENT_QUEUE_SIZE", 256)
+_REPLAY_SIZE = _env_int("EVENT_REPLAY_SIZE", 256)
+# Each live stream holds a gunicorn worker thread for as long as it is open, so keep
+# this well below the thread count (see Procfile) or streams starve API requests.
+_MAX_SUBSCRIBERS = _env_int("EVENT_MAX_SUBSCRIBERS", 4)
+# Streams end after this long and the client reconnects with Last-Event-ID, so a
+# stream never pins a thread (or a stale proxy connection) indefinitely.
+_STREAM_MAX_S = _env_int("EVENT_STREAM_MAX_S", 300)
+_LAST_RISK_ENTRIES = _env_int("EVENT_RISK_SESSIONS", 10_000)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class _Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self) -> None:
+        self.queue: deque[dict[str, Any]] = deque(maxlen=_QUEUE_SIZE)
+        self.dropped = 0
+
+
+class EventBus:
+    # Fan-out of in-process events to live subscribers. Publishing never blocks a
+    # request: a subscriber that falls behind loses its oldest events and is told so.
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._subscribers: list[_Subscriber] = []
+        self._recent: deque[dict[str, Any]] = deque(maxlen=_REPLAY_SIZE)
+        self._seq = 0
+
+    def publish(self, kind: str, data: dict[str, Any]) -> None:
+        with self._cond:
+            self._seq += 1
+            event = {"id": self._seq, "event": kind, "data": data}
+            self._recent.append(event)
+            for sub in self._subscribers:
+                if len(sub.queue) == sub.queue.maxlen:
+                    sub.dropped += 1
+                sub.queue.append(event)
+            self._cond.notify_all()
+        metrics.incr(f"events.{kind}")
+
+    def subscribe(self, last_event_id: int | None = None) -> _Subscriber:
+        with self._cond:
+            if len(self._subscribers) >= _MAX_SUBSCRIBERS:
+                raise TooManySubscribers(f"{len(self._subscribers)} subscribers already connected")
+            sub = _Subscriber()
+            if last_event_id is not None:
+                # Reconnect: replay what the client missed if the ring still holds it,
+                # otherwise (gap too long, server restarted) tell it to resync.
+                oldest = self._recent[0]["id"] if self._recent else self._seq + 1
+                if last_event_id > self._seq or last_event_id < oldest - 1:
+                    sub.dropped = 1
+                else:
+                    sub.queue.extend(e for e in self._recent if e["id"] > last_event_id)
+            self._subscribers.append(sub)
+            return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        with self._cond:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def next_events(self, sub: _Subscriber, timeout: float) -> tuple[list[dict[str, Any]], int]:
+        with self._cond:
+            self._cond.wait_for(lambda: bool(sub.queue or sub.dropped), timeout=timeout)
+            events = list(sub.queue)
+            sub.queue.clear()
+            dropped, sub.dropped = sub.dropped, 0
+            return events, dropped
+
+
+BUS = EventBus()
+
+_RISK_LOCK = threading.Lock()
+_LAST_RISK: OrderedDict[str, str] = OrderedDict()
+
+
+def publish_session(session_id: str, created_at: str) -> None:
+    BUS.publish("session", {"session_id": session_id, "created_at": created_at, "delta": {"total_users": 1}})
+
+
+def publish_sos(session_id: str, trigger: str, hospital: dict[str, Any], created_at: str) -> None:
+    BUS.publish(
+        "sos",
+        {
+            "session_id": session_id,
+            "trigger": trigger,
+            "hospital_name": str(hospital.get("name", "")),
+            "distance_km": float(hospital.get("distance_km", 0.0)),
+            "eta_minutes": int(hospital.get("eta_minutes", 1)),
+            "created_at": created_at,
+            "delta": {"emergencies": 1},
+        },
+    )
+
+
+def publish_risk(session_id: str, risk_level: str, risk_score: int, created_at: str) -> None:
+    # Only transitions are interesting to a control room; the last level per session is
+    # remembered here so the insert path never has to read it back from SQLite.
+    with _RISK_LOCK:
+        previous = _LAST_RISK.pop(session_id, None)
+        _LAST_RISK[session_id] = risk_level
+        while len(_LAST_RISK) > _LAST_RISK_ENTRIES:
+            _LAST_RISK.popitem(last=False)
+    if previous == risk_level:
+        return
+    BUS.publish(
+        "risk",
+        {
+            "session_id": session_id,
+            "from": previous,
+            "to": risk_level,
+            "risk_score": int(risk_score),
+            "created_at": created_at,
+        },
+    )
+
+
+def _frame(event: str, data: Any, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_events(sub: _Subscriber, heartbeat_s: float = 15.0) -> Iterator[str]:
+    deadline = time.monotonic() + _STREAM_MAX_S
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events, dropped = BUS.next_events(sub, min(heartbeat_s, remaining))
+            if dropped:
+                # Deltas were lost; the client should reload totals before applying more.
+                yield _frame("resync", {"dropped": dropped, "at": time.time()})
+            for e in events:
+                yield _frame(e["event"], e["data"], e["id"])
+            if not events and not dropped:
+                yield ": keepalive\n\n"
+    finally:
+        BUS.unsubscribe(sub)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import heapq
+import json
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator
+
+from .db import connect
+from .reporting import filename_token
+
+
+_BATCH = 500
+_CHUNK_BYTES = 64 * 1024
+
+# kind -> (select, tie-break rank when two rows share a timestamp)
+_TABLES: dict[str, tuple[str, int]] = {
+    "message": ("SELECT id, role, content, created_at FROM messages", 0),
+    "symptom_event": (
+        "SELECT id, raw_message, matched_symptoms_json, risk_score, risk_level, recommendation, "
+        "hospital_needed, emergency_mode, created_at FROM symptom_events",
+        1,
+    ),
+    "sos_event": (
+        "SELECT id, trigger, lat, lng, hospital_id, hospital_name, hospital_phone, distance_km, eta_minutes, "
+        "created_at FROM sos_events",
+        2,
+    ),
+    "vitals": (
+        "SELECT id, pulse_bpm, temperature_c, oxygen_percent, air_quality_ppm, created_at FROM vitals",
+        3,
+    ),
+}
+
+
+def _rows(conn: sqlite3.Connection, kind: str, session_id: str) -> Iterator[tuple[str, int, int, dict[str, Any]]]:
+    # Keyset batches on the (session_id, id) index: no statement stays open between
+    # batches, so a long download never holds a read lock that blocks writers.
+    # Rows written after the export started are left out, so the file is a clean cut.
+    select, rank = _TABLES[kind]
+    table = select.rsplit(" ", 1)[-1]
+    upto = conn.execute(f"SELECT MAX(id) FROM {table} WHERE session_id = ?", (session_id,)).fetchone()[0]
+    if upto is None:
+        return
+    last_id = 0
+    while True:
+        batch = conn.execute(
+            f"{select} WHERE session_id = ? AND id > ? AND id <= ? ORDER BY id LIMIT ?",
+            (session_id, last_id, upto, _BATCH),
+        ).fetchall()
+        for r in batch:
+            yield r["created_at"], rank, r["id"], {"type": kind, **dict(r)}
+        if len(batch) < _BATCH:
+            return
+        last_id = batch[-1]["id"]
+
+
+def merged_records(conn: sqlite3.Connection, session_id: str) -> Iterator[dict[str, Any]]:
+    # Each table is already in time order, so a k-way merge yields the whole record
+    # in time order while holding one batch per table.
+    streams = [_rows(conn, kind, session_id) for kind in _TABLES]
+    for _, _, _, record in heapq.merge(*streams, key=lambda item: item[:3]):
+        if record["type"] == "symptom_event":
+            record["matched_symptoms"] = json.loads(record.pop("matched_symptoms_json") or "[]")
+            record["hospital_needed"] = bool(record["hospital_needed"])
+            record["emergency_mode"] = bool(record["emergency_mode"])
+        yield record
+
+
+def _ndjson(session: dict[str, Any], records: Iterator[dict[str, Any]]) -> Iterator[str]:
+    yield json.dumps({"type": "session", **session}, ensure_ascii=False) + "\n"
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+_VITAL_CODES = (
+    ("pulse_bpm", "http://loinc.org", "8867-4", "Heart rate", "/min"),
+    ("temperature_c", "http://loinc.org", "8310-5", "Body temperature", "Cel"),
+    ("oxygen_percent", "http://loinc.org", "59408-5", "Oxygen saturation by pulse oximetry", "%"),
+    ("air_quality_ppm", "urn:mindbot-vr", "air-quality", "Ambient air quality", "ppm"),
+)
+
+
+def _fhir_resource(record: dict[str, Any], patient: dict[str, str]) -> dict[str, Any]:
+    kind, rid, at = record["type"], record["id"], record["created_at"]
+    if kind == "message":
+        return {
+            "resourceType": "Communication",
+            "id": f"message-{rid}",
+            "status": "completed",
+            "subject": patient,
+            "sent": at,
+            "sender": {"display": record["role"]},
+            "payload": [{"contentString": record["content"]}],
+        }
+    if kind == "vitals":
+        return {
+            "resourceType": "Observation",
+            "id": f"vitals-{rid}",
+            "status": "final",
+            "category": [{"coding": [{"system": "http://terminology.hl7.org/CodeSystem/observation-category", "code": "vital-signs"}]}],
+            "code": {"text": "Vital signs panel"},
+            "subject": patient,
+            "effectiveDateTime": at,
+            "component": [
+                {
+                    "code": {"coding": [{"system": system, "code": code, "display": display}]},
+                    "valueQuantity": {"value": record[field], "unit": unit},
+                }
+                for field, system, code, display, unit in _VITAL_CODES
+            ],
+        }
+    if kind == "symptom_event":
+        return {
+            "resourceType": "RiskAssessment",
+            "id": f"symptom-{rid}",
+            "status": "final",
+            "subject": patient,
+            "occurrenceDateTime": at,
+            "prediction": [
+                {
+                    "qualitativeRisk": {"text": record["risk_level"]},
+                    "relativeRisk": record["risk_score"],
+                    "rationale": record["recommendation"],
+                }
+            ],
+            "basis": [{"display": s} for s in record["matched_symptoms"]],
+            "note": [{"text": record["raw_message"]}],
+            "extension": [
+                {"url": "urn:mindbot-vr:hospital-needed", "valueBoolean": record["hospital_needed"]},
+                {"url": "urn:mindbot-vr:emergency-mode", "valueBoolean": record["emergency_mode"]},
+            ],
+        }
+    return {
+        "resourceType": "Encounter",
+        "id": f"sos-{rid}",
+        "status": "planned",
+        "class": {"system": "http://terminology.hl7.org/CodeSystem/v3-ActCode", "code": "EMER"},
+        "subject": patient,
+        "period": {"start": at},
+        "reasonCode": [{"text": f"SOS ({record['trigger']})"}],
+        "serviceProvider": {"identifier": {"value": record["hospital_id"]}, "display": record["hospital_name"]},
+        "location": [{"location": {"display": f"{record['lat']},{record['lng']}"}}],
+        "extension": [
+            {"url": "urn:mindbot-vr:hospital-phone", "valueString": record["hospital_phone"]},
+            {"url": "urn:mindbot-vr:distance-km", "valueDecimal": record["distance_km"]},
+            {"url": "urn:mindbot-vr:eta-minutes", "valueInteger": record["eta_minutes"]},
+        ],
+    }
+
+
+def _fhir_bundle(session: dict[str, Any], records: Iterator[dict[str, Any]]) -> Iterator[str]:
+    # The Bundle is written incrementally: header, one entry at a time, closing brackets.
+    sid = session["session_id"]
+    patient = {"reference": f"Patient/{sid}"}
+    header = {
+        "resourceType": "Bundle",
+        "type": "collection",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "identifier": {"system": "urn:mindbot-vr:session", "value": sid},
+    }
+    yield json.dumps(header, ensure_ascii=False)[:-1] + ', "entry": ['
+    first = {
+        "resourceType": "Patient",
+        "id": sid,
+        "identifier": [{"system": "urn:mindbot-vr:session", "value": sid}],
+        "meta": {"lastUpdated": session["created_at"]},
+    }
+    yield json.dumps({"fullUrl": f"urn:mindbot-vr:Patient/{sid}", "resource": first}, ensure_ascii=False)
+    for record in records:
+        resource = _fhir_resource(record, patient)
+        entry = {"fullUrl": f"urn:mindbot-vr:{resource['resourceType']}/{resource['id']}", "resource": resource}
+        yield ",\n" + json.dumps(entry, ensure_ascii=False)
+    yield "]}\n"
+
+
+FORMATS: dict[str, tuple[Callable[[dict[str, Any], Iterator[dict[str, Any]]], Iterator[str]], str, str]] = {
+    "ndjson": (_ndjson, "application/x-ndjson", "ndjson"),
+    "fhir": (_fhir_bundle, "application/fhir+json", "json"),
+}
+
+
+def export_filename(session_id: str, fmt: str, compress: bool) -> str:
+    name = f"mindbot_vr_session_{filename_token(session_id)}.{FORMATS[fmt][2]}"
+    return name + ".gz" if compress else name
+
+
+def _chunks(parts: Iterator[str], compress: bool) -> Iterator[bytes]:
+    # Coalesce small records into ~64 KB writes; gzip is streamed, never buffered whole.
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buf: list[bytes] = []
+    size = 0
+    for part in parts:
+        data = part.encode("utf-8")
+        buf.append(data)
+        size += len(data)
+        if size >= _CHUNK_BYTES:
+            out = b"".join(buf)
+            buf, size = [], 0
+            out = gz.compress(out) if gz is not None else out
+            if out:
+                yield out
+    out = b"".join(buf)
+    if gz is not None:
+        out = gz.compress(out) + gz.flush()
+    if out:
+        yield out
+
+
+def iter_session_export(session: dict[str, Any], fmt: str, compress: bool) -> Iterator[bytes]:
+    # Own connection: the response body is produced after the request context is gone.
+    writer = FORMATS[fmt][0]
+    conn = connect()
+    try:
+        yield from _chunks(writer(session, merged_records(conn, session["session_id"])), compress)
+    finally:
+        conn.close()
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
+import heapq
 import math
-from typing import Any
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Sequence
 
-from .hospitals import HOSPITALS_BENI_SUEF
+from . import metrics
+from .hospitals import HOSPITALS_BENI_SUEF, load_hospitals
+from .routing import RoutingEngine, open_routing_engine
+from .spatial import KDTree3, unit_vector
 
 
 BENI_SUEF_CENTER = {"lat": 29.0661, "lng": 31.0994}
@@ -21,6 +29,12 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return r * c
 
 
+def valid_coordinates(lat: float, lng: float) -> bool:
+    # float() accepts "nan", "inf" and 1e308; none of them is a place, and the grid
+    # cell arithmetic below cannot take them.
+    return math.isfinite(lat) and math.isfinite(lng) and -90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0
+
+
 def estimate_travel_minutes(distance_km: float, avg_kmh: float = 40.0) -> int:
     if avg_kmh <= 0:
         avg_kmh = 40.0
@@ -28,15 +42,219 @@ def estimate_travel_minutes(distance_km: float, avg_kmh: float = 40.0) -> int:
     return int(max(1, round(minutes)))
 
 
+# Specialties are validated against the index, so this only bounds er/icu/specialty combinations.
+_MAX_SUBSETS = 256
+
+
+class HospitalIndex:
+    def __init__(self, hospitals: Sequence[dict[str, Any]]) -> None:
+        self.hospitals = [dict(h) for h in hospitals]
+        self.tree = KDTree3([unit_vector(float(h["lat"]), float(h["lng"])) for h in self.hospitals])
+        # The built-in Beni Suef list carries no er/icu/specialties fields; only a
+        # loaded HOSPITALS_DATA_PATH file can be filtered on them.
+        self.filterable = bool(self.hospitals) and all("er" in h for h in self.hospitals)
+        self.specialties = frozenset(s for h in self.hospitals for s in (h.get("specialties") or ()))
+        self._subsets: OrderedDict[tuple[bool, bool, str], tuple[array, array, array, array]] = OrderedDict()
+        self._subsets_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.hospitals)
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> list[tuple[float, dict[str, Any]]]:
+        # Over-fetch a little and re-rank with exact haversine on the candidates only.
+        candidates = self.tree.nearest(unit_vector(lat, lng), k=k + 2)
+        refined = [
+            (haversine_km(lat, lng, float(self.hospitals[i]["lat"]), float(self.hospitals[i]["lng"])), i)
+            for _, i in candidates
+        ]
+        refined.sort()
+        return [(d, self.hospitals[i]) for d, i in refined[:k]]
+
+    def _subset(self, er: bool, icu: bool, specialty: str) -> tuple[array, array, array, array]:
+        key = (er, icu, specialty)
+        with self._subsets_lock:
+            cached = self._subsets.get(key)
+            if cached is not None:
+                self._subsets.move_to_end(key)
+                return cached
+        ids = array(
+            "l",
+            (
+                i
+                for i, h in enumerate(self.hospitals)
+                if (not er or h.get("er"))
+                and (not icu or h.get("icu"))
+                and (not specialty or specialty in (h.get("specialties") or ()))
+            ),
+        )
+        tree = self.tree
+        subset = (
+            ids,
+            array("d", (tree.xs[i] for i in ids)),
+            array("d", (tree.ys[i] for i in ids)),
+            array("d", (tree.zs[i] for i in ids)),
+        )
+        with self._subsets_lock:
+            self._subsets[key] = subset
+            while len(self._subsets) > _MAX_SUBSETS:
+                self._subsets.popitem(last=False)
+        return subset
+
+    def rank(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 5,
+        er: bool = False,
+        icu: bool = False,
+        specialty: str = "",
+    ) -> list[tuple[float, dict[str, Any]]]:
+        specialty = (specialty or "").strip().lower()
+        if specialty and specialty not in self.specialties:
+            raise ValueError(f"unknown specialty: {specialty}")
+        if not (er or icu or specialty):
+            return self.nearest(lat, lng, k=k)
+        ids, xs, ys, zs = self._subset(er, icu, specialty)
+        if not ids:
+            return []
+        # One pass of dot products over the precomputed unit vectors of the
+        # filtered subset; a larger dot product is a shorter great-circle distance.
+        qx, qy, qz = unit_vector(lat, lng)
+        dots = [qx * x + qy * y + qz * z for x, y, z in zip(xs, ys, zs)]
+        top = heapq.nlargest(k, range(len(dots)), key=dots.__getitem__)
+        ranked = [
+            (haversine_km(lat, lng, float(self.hospitals[ids[j]]["lat"]), float(self.hospitals[ids[j]]["lng"])), ids[j])
+            for j in top
+        ]
+        ranked.sort()
+        return [(d, self.hospitals[i]) for d, i in ranked]
+
+
+def _with_eta(h: dict[str, Any], distance_km: float, lat: float, lng: float) -> dict[str, Any]:
+    out = dict(h)
+    out["distance_km"] = round(distance_km, 2)
+    eta = _ROUTING.eta_minutes(lat, lng, h) if _ROUTING is not None else None
+    if eta is None:
+        out["eta_minutes"] = estimate_travel_minutes(float(out["distance_km"]))
+        out["eta_source"] = "straight_line"
+    else:
+        out["eta_minutes"] = eta
+        out["eta_source"] = "road"
+    return out
+
+
+class _NearestCellCache:
+    # Patients in the same grid cell share a candidate set that is certified to
+    # contain their k nearest facilities: for a cell of half-diagonal r around
+    # centre c, any facility in some point's top-k is within D_k(c) + 2r of c.
+
+    def __init__(self, cell_deg: float, max_cells: int) -> None:
+        self.cell_deg = cell_deg
+        self.max_cells = max_cells
+        self._cells: OrderedDict[tuple[int, int, int], list[dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+
+    def candidates(self, index: HospitalIndex, lat: float, lng: float, k: int) -> list[dict[str, Any]]:
+        key = (k, math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+        with self._lock:
+            cached = self._cells.get(key)
+            if cached is not None:
+                self._cells.move_to_end(key)
+        if cached is not None:
+            metrics.incr("sos_cache.hits")
+            return cached
+
+        metrics.incr("sos_cache.misses")
+        c_lat = (key[1] + 0.5) * self.cell_deg
+        c_lng = (key[2] + 0.5) * self.cell_deg
+        r_km = haversine_km(c_lat, c_lng, key[1] * self.cell_deg, key[2] * self.cell_deg)
+        m = k + 4
+        while True:
+            found = index.nearest(c_lat, c_lng, k=m)
+            if len(found) < k:
+                break
+            bound = found[k - 1][0] + 2 * r_km
+            if len(found) < m or found[-1][0] > bound:
+                found = [(d, h) for d, h in found if d <= bound]
+                break
+            m *= 2
+        cands = [h for _, h in found]
+        with self._lock:
+            self._cells[key] = cands
+            while len(self._cells) > self.max_cells:
+                self._cells.popitem(last=False)
+        return cands
+
+
+_HOSPITAL_INDEX: HospitalIndex | None = None
+_ROUTING: RoutingEngine | None = None
+# With a road graph, this many straight-line nearest facilities are re-ranked by road ETA.
+_ROUTING_CANDIDATES = 5
+_CELL_CACHE = _NearestCellCache(
+    cell_deg=float(os.environ.get("SOS_CACHE_CELL_DEG", "0.01") or 0.01),
+    max_cells=int(os.environ.get("SOS_CACHE_MAX_CELLS", "50000") or 50000),
+)
+
+
+def load_hospital_index(path: str | None = None) -> HospitalIndex:
+    global _HOSPITAL_INDEX
+    path = path if path is not None else os.environ.get("HOSPITALS_DATA_PATH", "").strip()
+    hospitals = load_hospitals(path) if path else []
+    _HOSPITAL_INDEX = HospitalIndex(hospitals or HOSPITALS_BENI_SUEF)
+    _CELL_CACHE.clear()
+    return _HOSPITAL_INDEX
+
+
+def load_routing_engine(path: str | None = None) -> RoutingEngine | None:
+    global _ROUTING
+    path = path if path is not None else os.environ.get("ROAD_GRAPH_PATH", "").strip()
+    if _ROUTING is not None:
+        _ROUTING.graph.close()
+    _ROUTING = open_routing_engine(path) if path else None
+    _CELL_CACHE.clear()
+    if _ROUTING is not None:
+        # Read from the graph file (v2); a v1 file builds them here, not on the first SOS.
+        _ROUTING.graph.max_kmh
+        if os.environ.get("ROUTING_PRECOMPUTE", "").strip() == "1":
+            # Trees for up to ROUTING_TREE_CACHE facilities (n_nodes * 4 bytes each, per
+            # worker), built in the background so startup is not held up.
+            _ROUTING.precompute(get_hospital_index().hospitals)
+    return _ROUTING
+
+
+def get_hospital_index() -> HospitalIndex:
+    return _HOSPITAL_INDEX if _HOSPITAL_INDEX is not None else load_hospital_index()
+
+
 def nearest_hospital(lat: float, lng: float) -> dict[str, Any]:
-    best: dict[str, Any] | None = None
-    best_dist = 10**9
-    for h in HOSPITALS_BENI_SUEF:
-        d = haversine_km(lat, lng, float(h["lat"]), float(h["lng"]))
-        if d < best_dist:
-            best_dist = d
-            best = dict(h)
-            best["distance_km"] = round(d, 2)
-            best["eta_minutes"] = estimate_travel_minutes(float(best["distance_km"]))
-    return best or dict(HOSPITALS_BENI_SUEF[0])
+    if not valid_coordinates(lat, lng):
+        return dict(HOSPITALS_BENI_SUEF[0])
+    k = _ROUTING_CANDIDATES if _ROUTING is not None else 1
+    cands = _CELL_CACHE.candidates(get_hospital_index(), lat, lng, k)
+    if not cands:
+        return dict(HOSPITALS_BENI_SUEF[0])
+    scored = sorted((haversine_km(lat, lng, float(h["lat"]), float(h["lng"])), i) for i, h in enumerate(cands))
+    found = [(d, cands[i]) for d, i in scored[:k]]
+    ranked = [_with_eta(h, d, lat, lng) for d, h in found]
+    return min(ranked, key=lambda h: (h["eta_minutes"], h["distance_km"]))
+
 
+def nearby_hospitals(
+    lat: float,
+    lng: float,
+    k: int = 5,
+    er: bool = False,
+    icu: bool = False,
+    specialty: str = "",
+) -> list[dict[str, Any]]:
+    if not valid_coordinates(lat, lng):
+        raise ValueError("lat must be within [-90, 90] and lng within [-180, 180]")
+    ranked = get_hospital_index().rank(lat, lng, k=k, er=er, icu=icu, specialty=specialty)
+    out = [_with_eta(h, d, lat, lng) for d, h in ranked]
+    if _ROUTING is not None:
+        out.sort(key=lambda h: (h["eta_minutes"], h["distance_km"]))
+    return out
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from .analytics import record_message
+from .db import connect
+from .job_store import create_job, finish_job, get_job
+from .llm import llm_enabled, try_llm_guidance
+
+
+_WORKERS = int(os.environ.get("LLM_WORKERS", "2") or 2)
+_MAX_PENDING = int(os.environ.get("LLM_MAX_PENDING", "16") or 16)
+_JOB_TTL_S = 15 * 60
+_JOB_KIND = "guidance"
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, _WORKERS), thread_name_prefix="llm-guidance")
+_LOCK = threading.Lock()
+# Admission control is per process; job state is in SQLite so any worker can answer a poll.
+_PENDING = 0
+
+
+def _admit() -> bool:
+    global _PENDING
+    with _LOCK:
+        if _PENDING >= _MAX_PENDING:
+            # Shed load rather than queue behind a slow provider; the rule-based reply stands on its own.
+            return False
+        _PENDING += 1
+        return True
+
+
+def _release() -> None:
+    global _PENDING
+    with _LOCK:
+        _PENDING -= 1
+
+
+@contextmanager
+def guidance_slot() -> Iterator[bool]:
+    # Streamed guidance counts against the same LLM_MAX_PENDING as background jobs,
+    # so a burst of slow streams cannot pile up behind the provider either.
+    admitted = _admit()
+    try:
+        yield admitted
+    finally:
+        if admitted:
+            _release()
+
+
+def submit_guidance(session_id: str, message: str) -> str | None:
+    if not llm_enabled() or not _admit():
+        return None
+    try:
+        job_id = create_job(_JOB_KIND, session_id, _JOB_TTL_S)
+        _EXECUTOR.submit(_run, job_id, session_id, message)
+    except Exception:
+        _release()
+        raise
+    return job_id
+
+
+def _run(job_id: str, session_id: str, message: str) -> None:
+    status, text = "failed", None
+    try:
+        text = try_llm_guidance(message)
+        status = "done" if text else "empty"
+        if text:
+            store_guidance_message(session_id, text)
+    except Exception:
+        status, text = "failed", None
+    finally:
+        _release()
+        finish_job(job_id, status, text)
+
+
+def store_guidance_message(session_id: str, text: str) -> None:
+    conn = connect()
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        conn.execute(
+            "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+            (session_id, "assistant", f"Additional AI guidance:\n{text}", now),
+        )
+        record_message(conn, session_id, now)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_guidance_job(job_id: str) -> dict[str, Any] | None:
+    job = get_job(_JOB_KIND, job_id, _JOB_TTL_S)
+    if job is None:
+        return None
+    return {"job_id": job_id, "session_id": job["session_id"], "status": job["status"], "guidance": job["result"]}
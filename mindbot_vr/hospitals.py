@@ -1,3 +1,12 @@
+from __future__ import annotations
+
+import csv
+import json
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+
 HOSPITALS_BENI_SUEF = [
     {
         "id": "beni_suef_university_hospital",
@@ -33,3 +42,63 @@ HOSPITALS_BENI_SUEF = [
     },
 ]
 
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in {"1", "true", "yes", "y"}
+
+
+def _parse_specialties(value: Any) -> list[str]:
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = str(value or "").replace(";", ",").split(",")
+    return sorted({str(v).strip().lower() for v in items if str(v).strip()})
+
+
+def _normalize_hospital(raw: dict[str, Any]) -> dict[str, Any] | None:
+    try:
+        lat = float(raw["lat"])
+        lng = float(raw["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        return None
+    hospital_id = str(raw.get("id") or "").strip()
+    name = str(raw.get("name") or "").strip()
+    if not hospital_id or not name:
+        return None
+    out = dict(raw)
+    out.update(
+        {
+            "id": hospital_id,
+            "name": name,
+            "phone": str(raw.get("phone") or "").strip(),
+            "lat": lat,
+            "lng": lng,
+            "address": str(raw.get("address") or "").strip(),
+            "er": _parse_bool(raw.get("er")),
+            "icu": _parse_bool(raw.get("icu")),
+            "specialties": _parse_specialties(raw.get("specialties")),
+        }
+    )
+    return out
+
+
+def load_hospitals(path: str | Path) -> list[dict[str, Any]]:
+    p = Path(path)
+    text = p.read_text(encoding="utf-8-sig")
+    if p.suffix.lower() == ".json":
+        data = json.loads(text)
+        rows = data.get("hospitals", []) if isinstance(data, dict) else data
+    else:
+        rows = list(csv.DictReader(StringIO(text)))
+    hospitals: list[dict[str, Any]] = []
+    for row in rows or []:
+        if isinstance(row, dict):
+            h = _normalize_hospital(row)
+            if h is not None:
+                hospitals.append(h)
+    return hospitals
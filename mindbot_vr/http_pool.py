@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import http.client
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import urlsplit
+
+
+# Errors that mean a pooled keep-alive socket was closed by the peer while idle.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, http.client.BadStatusLine)
+
+
+class ProviderBusy(Exception):
+    pass
+
+
+class ProviderClient:
+    def __init__(
+        self,
+        base_url: str,
+        max_in_flight: int = 4,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 12.0,
+    ) -> None:
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        # The connect timeout only covers the handshake; reads get their own budget.
+        if conn.sock is not None:
+            conn.sock.settimeout(self.read_timeout)
+        with self._lock:
+            self.connections_opened += 1
+        return conn
+
+    def _checkout(self) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_in_flight:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _send(
+        self, method: str, path: str, body: bytes | None, headers: dict[str, str]
+    ) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        url = f"{self.base_path}{path}"
+        conn, reused = self._checkout()
+        try:
+            conn.request(method, url, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except _STALE_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+        # The idle socket had gone stale; retry once on a fresh connection.
+        conn = self._new_connection()
+        try:
+            conn.request(method, url, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(timeout=self.connect_timeout):
+            raise ProviderBusy(f"{self.host}: {self.max_in_flight} requests already in flight")
+
+    def request(
+        self, method: str, path: str, body: bytes | None = None, headers: dict[str, str] | None = None
+    ) -> tuple[int, bytes]:
+        self._acquire()
+        try:
+            conn, resp = self._send(method, path, body, dict(headers or {}))
+            try:
+                data = resp.read()
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            return resp.status, data
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def stream(
+        self, method: str, path: str, body: bytes | None = None, headers: dict[str, str] | None = None
+    ) -> Iterator[http.client.HTTPResponse]:
+        self._acquire()
+        try:
+            conn, resp = self._send(method, path, body, dict(headers or {}))
+            try:
+                yield resp
+            except BaseException:
+                conn.close()
+                raise
+            # Only a fully drained response leaves the socket reusable; after a
+            # provider's final event at most the chunked-encoding trailer remains.
+            try:
+                resp.read()
+            except Exception:
+                conn.close()
+                return
+            if resp.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+        finally:
+            self._slots.release()
+
+
+_CLIENTS: dict[str, ProviderClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+_CLIENTS_PID = os.getpid()
+
+
+def get_client(base_url: str) -> ProviderClient:
+    global _CLIENTS_PID
+    parts = urlsplit(base_url)
+    key = f"{parts.scheme}://{parts.netloc}{parts.path.rstrip('/')}"
+    with _CLIENTS_LOCK:
+        if os.getpid() != _CLIENTS_PID:
+            # Forked worker (e.g. gunicorn --preload): never share sockets with the parent.
+            _CLIENTS.clear()
+            _CLIENTS_PID = os.getpid()
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = ProviderClient(
+                key,
+                max_in_flight=int(os.environ.get("LLM_MAX_IN_FLIGHT", "4") or 4),
+                connect_timeout=float(os.environ.get("LLM_CONNECT_TIMEOUT", "3") or 3),
+                read_timeout=float(os.environ.get("LLM_READ_TIMEOUT", "12") or 12),
+            )
+        return client
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterator
+
+from flask import Response, current_app, jsonify, request
+
+from . import metrics
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)).strip() or default)
+    except ValueError:
+        return default
+
+
+_TTL_S = _env_float("IDEMPOTENCY_TTL_S", 600.0)
+_MAX_ENTRIES = max(1, int(_env_float("IDEMPOTENCY_MAX_ENTRIES", 10_000)))
+_WAIT_S = _env_float("IDEMPOTENCY_WAIT_S", 30.0)
+_MAX_KEY_LEN = 255
+
+# The store is per process. A retry that lands on a different gunicorn worker
+# process runs the request again; threads within one worker share the store.
+
+
+class _Stored:
+    __slots__ = ("expires", "fingerprint", "status", "headers", "body")
+
+    def __init__(self, fingerprint: str, resp: Response, body: bytes) -> None:
+        self.expires = time.monotonic() + _TTL_S
+        self.fingerprint = fingerprint
+        self.status = resp.status_code
+        self.headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in {"content-length", "set-cookie"}]
+        self.body = body
+
+
+class _Flight:
+    __slots__ = ("done", "fingerprint")
+
+    def __init__(self, fingerprint: str) -> None:
+        self.done = threading.Event()
+        self.fingerprint = fingerprint
+
+
+_LOCK = threading.Lock()
+_STORED: OrderedDict[str, _Stored] = OrderedDict()
+_FLIGHTS: dict[str, _Flight] = {}
+
+
+def _lookup(key: str, fingerprint: str) -> tuple[_Stored | None, _Flight | None, bool]:
+    # -> (stored response, flight to wait on, whether the caller now leads the flight)
+    with _LOCK:
+        now = time.monotonic()
+        while _STORED:
+            oldest = next(iter(_STORED.values()))
+            if oldest.expires > now:
+                break
+            _STORED.popitem(last=False)
+        stored = _STORED.get(key)
+        if stored is not None:
+            return stored, None, False
+        flight = _FLIGHTS.get(key)
+        if flight is not None:
+            return None, flight, False
+        flight = _FLIGHTS[key] = _Flight(fingerprint)
+        return None, flight, True
+
+
+def _land(key: str, flight: _Flight, stored: _Stored | None) -> None:
+    with _LOCK:
+        if stored is not None:
+            _STORED[key] = stored
+            while len(_STORED) > _MAX_ENTRIES:
+                _STORED.popitem(last=False)
+        if _FLIGHTS.get(key) is flight:
+            del _FLIGHTS[key]
+    flight.done.set()
+
+
+def _conflict() -> Any:
+    metrics.incr("idempotency.conflicts")
+    detail = "Idempotency-Key was already used with a different request body"
+    return jsonify({"error": "unprocessable", "detail": detail}), 422
+
+
+def _replay(stored: _Stored) -> Response:
+    metrics.incr("idempotency.replayed")
+    resp = Response(stored.body, status=stored.status, headers=stored.headers)
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def _stream_through(key: str, flight: _Flight, fingerprint: str, resp: Response) -> None:
+    # A streamed reply is kept once the server is done with it: in full, or as far as
+    # it got before the client went away, since the view's inserts have happened by
+    # then and a retry must replay them rather than run the turn again. Landing waits
+    # for close(), which the WSGI server calls even if iteration never started.
+    inner = resp.response
+    chunks = resp.iter_encoded()
+    sent: list[bytes] = []
+
+    def tee() -> Iterator[bytes]:
+        for chunk in chunks:
+            sent.append(chunk)
+            yield chunk
+
+    def land() -> None:
+        _land(key, flight, _Stored(fingerprint, resp, b"".join(sent)) if sent else None)
+
+    resp.response = tee()
+    close = getattr(inner, "close", None)
+    if close is not None:
+        resp.call_on_close(close)
+    resp.call_on_close(land)
+
+
+def idempotent(view: Callable[..., Any]) -> Callable[..., Any]:
+    # Honour an Idempotency-Key header: the first request with a key runs the view,
+    # duplicates that arrive meanwhile wait for it, and later retries get the stored
+    # response back without re-running triage, the LLM or any insert. Streamed
+    # responses (SSE) are replayed as the bytes that were sent.
+    @functools.wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        raw = request.headers.get("Idempotency-Key", "").strip()
+        if not raw:
+            return view(*args, **kwargs)
+        if len(raw) > _MAX_KEY_LEN:
+            detail = f"Idempotency-Key must be at most {_MAX_KEY_LEN} characters"
+            return jsonify({"error": "bad_request", "detail": detail}), 400
+        # Scoped per view so one key cannot replay another endpoint's response.
+        key = f"{view.__name__}:{raw}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        deadline = time.monotonic() + _WAIT_S
+        while True:
+            stored, flight, leader = _lookup(key, fingerprint)
+            if stored is not None:
+                return _replay(stored) if stored.fingerprint == fingerprint else _conflict()
+            assert flight is not None
+            if leader:
+                break
+            if flight.fingerprint != fingerprint:
+                return _conflict()
+            metrics.incr("idempotency.waited")
+            if not flight.done.wait(max(0.0, deadline - time.monotonic())):
+                resp = jsonify({"error": "in_progress", "detail": "a request with this Idempotency-Key is still running"})
+                resp.status_code = 409
+                resp.headers["Retry-After"] = "1"
+                return resp
+            # Landed: replay its response, or run it ourselves if it was not kept.
+
+        stored = None
+        streaming = False
+        try:
+            resp = current_app.make_response(view(*args, **kwargs))
+            # Server errors are not remembered, so a retry gets a real second attempt.
+            if resp.status_code < 500:
+                if resp.is_streamed:
+                    _stream_through(key, flight, fingerprint, resp)
+                    streaming = True
+                else:
+                    stored = _Stored(fingerprint, resp, resp.get_data())
+            return resp
+        finally:
+            if not streaming:
+                _land(key, flight, stored)
+
+    return wrapper
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import time
+import uuid
+from typing import Any
+
+from .db import connect
+
+
+# Background job state lives in SQLite rather than process memory: the job runs in
+# the worker that accepted it, but the poll can land on any gunicorn worker.
+
+
+def create_job(kind: str, session_id: str, ttl_s: float, status: str = "pending", cache_key: str | None = None) -> str:
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = connect()
+    try:
+        # Expired jobs of this kind go in the same transaction; polls ignore them already.
+        conn.execute("DELETE FROM background_jobs WHERE kind = ? AND created_at < ?", (kind, now - ttl_s))
+        conn.execute(
+            "INSERT INTO background_jobs (id, kind, session_id, cache_key, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, session_id, cache_key, status, now),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return job_id
+
+
+def finish_job(job_id: str, status: str, result: str | None = None) -> None:
+    conn = connect()
+    try:
+        conn.execute("UPDATE background_jobs SET status = ?, result = ? WHERE id = ?", (status, result, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_job(kind: str, job_id: str, ttl_s: float) -> dict[str, Any] | None:
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT id, session_id, cache_key, status, result FROM background_jobs "
+            "WHERE id = ? AND kind = ? AND created_at >= ?",
+            (job_id, kind, time.time() - ttl_s),
+        ).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row is not None else None
+
+
+def pending_job(kind: str, cache_key: str, ttl_s: float) -> str | None:
+    # A job left pending by a worker that died simply ages out after ttl_s.
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT id FROM background_jobs WHERE kind = ? AND cache_key = ? AND status = 'pending' AND created_at >= ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            (kind, cache_key, time.time() - ttl_s),
+        ).fetchone()
+    finally:
+        conn.close()
+    return row["id"] if row is not None else None
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+
+# Widths are kept in 1/1000 em, the unit of PDF font metrics; scaling by the
+# font size happens once per line instead of once per glyph.
+_UNITS = 1000.0
+
+
+class _GlyphWidths(dict):
+    def __init__(self, fontname: str) -> None:
+        super().__init__()
+        self.fontname = fontname
+
+    def __missing__(self, ch: str) -> float:
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        # Single-byte and TrueType fonts in reportlab have no kerning, so a string's
+        # width is exactly the sum of its glyph widths.
+        w = self[ch] = stringWidth(ch, self.fontname, _UNITS)
+        return w
+
+
+_TABLES: dict[str, _GlyphWidths] = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def glyph_widths(fontname: str) -> _GlyphWidths:
+    table = _TABLES.get(fontname)
+    if table is None:
+        with _TABLES_LOCK:
+            table = _TABLES.setdefault(fontname, _GlyphWidths(fontname))
+    return table
+
+
+def text_width(text: str, fontname: str, size: float) -> float:
+    table = glyph_widths(fontname)
+    return sum(map(table.__getitem__, text)) * size / _UNITS
+
+
+def _split_long_word(word: str, widths: _GlyphWidths, limit: float) -> list[tuple[str, float]]:
+    # A token wider than the line (URL, hash, pasted log) is broken at glyph boundaries.
+    pieces: list[tuple[str, float]] = []
+    start, acc = 0, 0.0
+    for i, ch in enumerate(word):
+        w = widths[ch]
+        if acc + w > limit and i > start:
+            pieces.append((word[start:i], acc))
+            start, acc = i, 0.0
+        acc += w
+    pieces.append((word[start:], acc))
+    return pieces
+
+
+def wrap_lines(text: str, fontname: str, size: float, max_width: float) -> list[str]:
+    # Empty fields take no vertical space, as in the original renderer.
+    if not str(text).strip():
+        return []
+    widths = glyph_widths(fontname)
+    limit = max_width * _UNITS / size
+    space = widths[" "]
+    lines: list[str] = []
+    for paragraph in str(text).replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        words = paragraph.split()
+        if not words:
+            lines.append("")
+            continue
+        line: list[str] = []
+        line_w = 0.0
+        for word in words:
+            word_w = sum(map(widths.__getitem__, word))
+            pieces = _split_long_word(word, widths, limit) if word_w > limit else [(word, word_w)]
+            for piece, piece_w in pieces:
+                if line and line_w + space + piece_w <= limit:
+                    line.append(piece)
+                    line_w += space + piece_w
+                    continue
+                if line:
+                    lines.append(" ".join(line))
+                line = [piece]
+                line_w = piece_w
+        lines.append(" ".join(line))
+    return lines
+
+
+def draw_wrapped(
+    c: Any,
+    x: float,
+    y: float,
+    max_width: float,
+    text: str,
+    leading: float = 12.0,
+    bottom: float | None = None,
+    top: float | None = None,
+) -> float:
+    # With a bottom margin, long blocks continue on a new page (at ``top``) instead of
+    # running off the sheet; the current font carries over.
+    fontname, size = c._fontname, c._fontsize
+    c.setFont(fontname, size)
+    for line in wrap_lines(text, fontname, size, max_width):
+        if bottom is not None and y < bottom:
+            c.showPage()
+            c.setFont(fontname, size)
+            y = top if top is not None else c._pagesize[1] - bottom
+        if line:
+            c.drawString(x, y, line)
+        y -= leading
+    return y
@@ -2,13 +2,154 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Generator, Iterable, Iterator
 
+from . import llm_cache, metrics
+from .http_pool import get_client
+from .llm_router import route, route_stream
 
-def try_llm_guidance(user_message: str) -> str | None:
-    provider = os.environ.get("LLM_PROVIDER", "").strip().lower()
-    if not provider:
-        return None
+
+_SYSTEM_PROMPT = (
+    "You are a hospital triage assistant. Provide brief, safe, non-diagnostic guidance. "
+    "Do not claim certainty. Encourage emergency care for red flags."
+)
+
+
+_KNOWN_PROVIDERS = ("ollama", "openai")
+
+
+def _providers() -> list[str]:
+    # LLM_PROVIDER may list fallbacks in order of preference, e.g. "ollama,openai".
+    out: list[str] = []
+    for part in os.environ.get("LLM_PROVIDER", "").split(","):
+        name = part.strip().lower()
+        if name in _KNOWN_PROVIDERS and name not in out:
+            out.append(name)
+    return out
+
+
+def llm_enabled() -> bool:
+    return bool(_providers())
+
+
+def _budget_s() -> float:
+    try:
+        return float(os.environ.get("LLM_BUDGET_S", "12").strip() or 12)
+    except ValueError:
+        return 12.0
+
+
+def _hedge_enabled() -> bool:
+    return os.environ.get("LLM_HEDGE", "").strip().lower() in {"1", "true", "yes"}
+
+
+def _provider_model(provider: str) -> str:
+    if provider == "ollama":
+        return os.environ.get("OLLAMA_MODEL", "llama3.1").strip()
+    if provider == "openai":
+        return os.environ.get("OPENAI_MODEL", "gpt-4o-mini").strip()
+    return ""
+
+
+def _prompt_key(providers: list[str], user_message: str) -> str:
+    models = ",".join(_provider_model(p) for p in providers)
+    return llm_cache.cache_key(",".join(providers), models, _SYSTEM_PROMPT, user_message)
+
+
+class _Flight:
+    __slots__ = ("cond", "done", "result", "chunks")
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        self.done = False
+        self.result: str | None = None
+        self.chunks: list[str] = []
+
+
+_FLIGHTS_LOCK = threading.Lock()
+_FLIGHTS: dict[str, _Flight] = {}
+
+
+def _coalesce_wait_s() -> float:
+    try:
+        return float(os.environ.get("LLM_COALESCE_WAIT_S", "15").strip() or 15)
+    except ValueError:
+        return 15.0
+
+
+def _join_flight(key: str) -> tuple[_Flight, bool]:
+    with _FLIGHTS_LOCK:
+        flight = _FLIGHTS.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _FLIGHTS[key] = _Flight()
+        return flight, True
+
+
+def _feed_flight(flight: _Flight, chunk: str) -> None:
+    with flight.cond:
+        flight.chunks.append(chunk)
+        flight.cond.notify_all()
+
+
+def _land_flight(key: str, flight: _Flight, result: str | None) -> None:
+    with _FLIGHTS_LOCK:
+        if _FLIGHTS.get(key) is flight:
+            del _FLIGHTS[key]
+    with flight.cond:
+        flight.result = result
+        flight.done = True
+        flight.cond.notify_all()
+
+
+def _tail_flight(flight: _Flight) -> Generator[str, None, bool]:
+    # Follow the leader: its chunks are passed on as they arrive, so a long stream keeps
+    # its followers busy rather than timing them out. Only a leader that goes quiet for
+    # LLM_COALESCE_WAIT_S gives up the wait; returns whether the leader finished.
+    seen = 0
+    while True:
+        with flight.cond:
+            if not flight.cond.wait_for(lambda: flight.done or len(flight.chunks) > seen, timeout=_coalesce_wait_s()):
+                metrics.incr("llm.coalesce_timeouts")
+                return False
+            fresh, done, result = flight.chunks[seen:], flight.done, flight.result
+        yield from fresh
+        seen += len(fresh)
+        if done:
+            if not seen and result:
+                # The leader was a non-streaming call: its answer arrives in one piece.
+                yield result
+            return True
+
+
+def _wait_flight(flight: _Flight) -> tuple[str | None, bool]:
+    metrics.incr("llm.coalesced")
+    tail = _tail_flight(flight)
+    while True:
+        try:
+            next(tail)
+        except StopIteration as stop:
+            return flight.result, stop.value
+
+
+def _singleflight(key: str, compute: Callable[[], str | None]) -> str | None:
+    # Identical prompts arriving together (an outbreak, a retrying client) share one
+    # upstream call; a follower whose leader stalls makes its own call instead.
+    flight, leader = _join_flight(key)
+    if not leader:
+        result, finished = _wait_flight(flight)
+        return result if finished else compute()
+    result = None
+    try:
+        result = compute()
+        return result
+    finally:
+        _land_flight(key, flight, result)
+
+
+def _call_provider(provider: str, user_message: str) -> str | None:
     if provider == "ollama":
         return _ollama_chat(user_message)
     if provider == "openai":
@@ -16,81 +157,196 @@ def try_llm_guidance(user_message: str) -> str | None:
     return None
 
 
-def _ollama_chat(user_message: str) -> str | None:
+def _stream_provider(provider: str, user_message: str) -> Iterator[str]:
+    if provider == "ollama":
+        return _ollama_chat_stream(user_message)
+    if provider == "openai":
+        return _openai_chat_stream(user_message)
+    return iter(())
+
+
+def try_llm_guidance(user_message: str) -> str | None:
+    providers = _providers()
+    if not providers:
+        return None
+    key = _prompt_key(providers, user_message)
+    compute = _computer(providers, key, user_message)
+    if not llm_cache.cache_enabled():
+        return compute()
+    return llm_cache.get_or_compute(key, compute)
+
+
+def _computer(providers: list[str], key: str, user_message: str) -> Callable[[], str | None]:
+    def upstream() -> str | None:
+        return route(providers, lambda p: _call_provider(p, user_message), _budget_s(), hedge=_hedge_enabled())
+
+    def compute() -> str | None:
+        return _singleflight(key, upstream)
+
+    return compute
+
+
+def stream_llm_guidance(user_message: str) -> Iterator[str]:
+    providers = _providers()
+    if not providers:
+        return
+    key = _prompt_key(providers, user_message)
+    cache = llm_cache.cache_enabled()
+    if cache:
+        # A stale entry is streamed as-is and refreshed with a non-streaming call.
+        cached = llm_cache.get_servable(key, _computer(providers, key, user_message))
+        if cached is not None:
+            yield cached
+            return
+    flight, leader = _join_flight(key)
+    if not leader:
+        # Someone is already asking the provider this; relay their chunks as they come.
+        metrics.incr("llm.coalesced")
+        relayed = False
+        tail = _tail_flight(flight)
+        while True:
+            try:
+                chunk = next(tail)
+            except StopIteration as stop:
+                finished = stop.value
+                break
+            relayed = True
+            yield chunk
+        if finished or relayed:
+            return
+        # The leader produced nothing within the wait: ask the provider ourselves.
+        yield from route_stream(providers, lambda p: _stream_provider(p, user_message), _budget_s())
+        return
+    chunks: list[str] = []
+    text = None
+    try:
+        for chunk in route_stream(providers, lambda p: _stream_provider(p, user_message), _budget_s()):
+            chunks.append(chunk)
+            _feed_flight(flight, chunk)
+            yield chunk
+        text = "".join(chunks).strip() or None
+    finally:
+        _land_flight(key, flight, text)
+    if cache and text:
+        llm_cache.store(key, text)
+
+
+def _messages(user_message: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
+
+
+def _ollama_call(user_message: str, stream: bool) -> tuple[str, str, dict[str, Any], dict[str, str]] | None:
     base = os.environ.get("OLLAMA_URL", "http://localhost:11434").strip()
     model = os.environ.get("OLLAMA_MODEL", "llama3.1").strip()
     if not base or not model:
         return None
-    url = f"{base.rstrip('/')}/api/chat"
     payload: dict[str, Any] = {
         "model": model,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are a hospital triage assistant. Provide brief, safe, non-diagnostic guidance. "
-                    "Do not claim certainty. Encourage emergency care for red flags."
-                ),
-            },
-            {"role": "user", "content": user_message},
-        ],
-        "stream": False,
+        "messages": _messages(user_message),
+        "stream": stream,
         "options": {"temperature": 0.2},
     }
-    try:
-        import urllib.request
-
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=12) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-        content = ((data or {}).get("message") or {}).get("content")
-        if isinstance(content, str) and content.strip():
-            return content.strip()
-    except Exception:
-        return None
-    return None
+    return base, "/api/chat", payload, {"Content-Type": "application/json"}
 
 
-def _openai_chat(user_message: str) -> str | None:
+def _openai_call(user_message: str, stream: bool) -> tuple[str, str, dict[str, Any], dict[str, str]] | None:
     api_key = os.environ.get("OPENAI_API_KEY", "").strip()
     model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini").strip()
     if not api_key or not model:
         return None
-    url = "https://api.openai.com/v1/chat/completions"
     payload: dict[str, Any] = {
         "model": model,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are a hospital triage assistant. Provide brief, safe, non-diagnostic guidance. "
-                    "Do not claim certainty. Encourage emergency care for red flags."
-                ),
-            },
-            {"role": "user", "content": user_message},
-        ],
+        "messages": _messages(user_message),
         "temperature": 0.2,
     }
-    try:
-        import urllib.request
-
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=12) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-        content = (((data or {}).get("choices") or [{}])[0].get("message") or {}).get("content")
-        if isinstance(content, str) and content.strip():
-            return content.strip()
-    except Exception:
+    if stream:
+        payload["stream"] = True
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+    return "https://api.openai.com", "/v1/chat/completions", payload, headers
+
+
+def _post_json(call: tuple[str, str, dict[str, Any], dict[str, str]]) -> Any:
+    base, path, payload, headers = call
+    status, body = get_client(base).request("POST", path, json.dumps(payload).encode("utf-8"), headers)
+    if status != 200:
+        raise RuntimeError(f"LLM provider returned HTTP {status}")
+    return json.loads(body.decode("utf-8"))
+
+
+@contextmanager
+def _post_stream(call: tuple[str, str, dict[str, Any], dict[str, str]]) -> Iterator[Any]:
+    base, path, payload, headers = call
+    with get_client(base).stream("POST", path, json.dumps(payload).encode("utf-8"), headers) as resp:
+        if resp.status != 200:
+            raise RuntimeError(f"LLM provider returned HTTP {resp.status}")
+        yield resp
+
+
+def _ollama_chat(user_message: str) -> str | None:
+    call = _ollama_call(user_message, stream=False)
+    if call is None:
         return None
+    data = _post_json(call)
+    content = ((data or {}).get("message") or {}).get("content")
+    if isinstance(content, str) and content.strip():
+        return content.strip()
     return None
 
+
+def _openai_chat(user_message: str) -> str | None:
+    call = _openai_call(user_message, stream=False)
+    if call is None:
+        return None
+    data = _post_json(call)
+    content = (((data or {}).get("choices") or [{}])[0].get("message") or {}).get("content")
+    if isinstance(content, str) and content.strip():
+        return content.strip()
+    return None
+
+
+def _iter_ollama_ndjson(lines: Iterable[bytes]) -> Iterator[str]:
+    # One JSON object per line: {"message": {"content": "..."}, "done": false}
+    for raw in lines:
+        raw = raw.strip()
+        if not raw:
+            continue
+        data = json.loads(raw.decode("utf-8"))
+        content = ((data or {}).get("message") or {}).get("content")
+        if isinstance(content, str) and content:
+            yield content
+        if data.get("done"):
+            return
+
+
+def _iter_openai_sse(lines: Iterable[bytes]) -> Iterator[str]:
+    # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]".
+    for raw in lines:
+        line = raw.strip()
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        chunk = json.loads(data.decode("utf-8"))
+        delta = (((chunk or {}).get("choices") or [{}])[0].get("delta") or {}).get("content")
+        if isinstance(delta, str) and delta:
+            yield delta
+
+
+def _ollama_chat_stream(user_message: str) -> Iterator[str]:
+    call = _ollama_call(user_message, stream=True)
+    if call is None:
+        return
+    with _post_stream(call) as resp:
+        yield from _iter_ollama_ndjson(resp)
+
+
+def _openai_chat_stream(user_message: str) -> Iterator[str]:
+    call = _openai_call(user_message, stream=True)
+    if call is None:
+        return
+    with _post_stream(call) as resp:
+        yield from _iter_openai_sse(resp)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from . import metrics
+from .db import connect
+from .triage import token_set
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)).strip() or default)
+    except ValueError:
+        return default
+
+
+_TTL_S = _env_float("LLM_CACHE_TTL_S", 24 * 3600)
+# Past the TTL an entry is still served for this long while it is refreshed in the background.
+_STALE_S = _env_float("LLM_CACHE_STALE_S", 3600)
+_MEMORY_ENTRIES = int(_env_float("LLM_CACHE_MEMORY_ENTRIES", 512))
+_DISK_ENTRIES = int(_env_float("LLM_CACHE_DISK_ENTRIES", 5000))
+
+_LOCK = threading.Lock()
+_MEMORY: OrderedDict[str, tuple[str, float]] = OrderedDict()
+_REFRESHING: set[str] = set()
+_REFRESHER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache")
+
+
+def cache_enabled() -> bool:
+    return _TTL_S > 0
+
+
+def cache_key(provider: str, model: str, system_prompt: str, message: str) -> str:
+    # Word order, case, punctuation and Arabic article prefixes do not change the key,
+    # so "Fever and cough" and "cough, fever" share an entry.
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+    profile = " ".join(sorted(token_set(message)))
+    raw = f"{provider}\x1f{model}\x1f{prompt_hash}\x1f{profile}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, text: str, stored_at: float) -> None:
+    with _LOCK:
+        _MEMORY[key] = (text, stored_at)
+        _MEMORY.move_to_end(key)
+        while len(_MEMORY) > _MEMORY_ENTRIES:
+            _MEMORY.popitem(last=False)
+            metrics.incr("llm_cache.memory_evictions")
+
+
+def _disk_get(key: str) -> tuple[str, float] | None:
+    try:
+        conn = connect()
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return str(row["response"]), float(row["created_at"])
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def _disk_put(key: str, text: str, stored_at: float) -> None:
+    try:
+        conn = connect()
+    except sqlite3.Error:
+        return
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, created_at, used_at) VALUES (?, ?, ?, ?)",
+            (key, text, stored_at, stored_at),
+        )
+        cur = conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (_DISK_ENTRIES,),
+        )
+        conn.commit()
+        if cur.rowcount > 0:
+            metrics.incr("llm_cache.disk_evictions", cur.rowcount)
+    except sqlite3.Error:
+        pass
+    finally:
+        conn.close()
+
+
+def _lookup(key: str) -> tuple[str, float, str] | None:
+    with _LOCK:
+        hit = _MEMORY.get(key)
+        if hit is not None:
+            _MEMORY.move_to_end(key)
+    if hit is not None:
+        return hit[0], hit[1], "memory"
+    hit = _disk_get(key)
+    if hit is None:
+        return None
+    _remember(key, *hit)
+    return hit[0], hit[1], "disk"
+
+
+def store(key: str, text: str) -> None:
+    now = time.time()
+    _remember(key, text, now)
+    _disk_put(key, text, now)
+
+
+def _refresh(key: str, compute: Callable[[], str | None]) -> None:
+    try:
+        text = compute()
+        if text:
+            store(key, text)
+            metrics.incr("llm_cache.revalidated")
+    except Exception:
+        pass
+    finally:
+        with _LOCK:
+            _REFRESHING.discard(key)
+
+
+def get_servable(key: str, compute: Callable[[], str | None]) -> str | None:
+    # Fresh entries and entries within the stale window are served; a stale one is
+    # refreshed in the background with compute(). None means a miss.
+    hit = _lookup(key)
+    if hit is not None:
+        text, stored_at, tier = hit
+        age = time.time() - stored_at
+        if age <= _TTL_S:
+            metrics.incr(f"llm_cache.{tier}_hits")
+            return text
+        if age <= _TTL_S + _STALE_S:
+            metrics.incr("llm_cache.stale_served")
+            with _LOCK:
+                start = key not in _REFRESHING
+                _REFRESHING.add(key)
+            if start:
+                _REFRESHER.submit(_refresh, key, compute)
+            return text
+    metrics.incr("llm_cache.misses")
+    return None
+
+
+def get_or_compute(key: str, compute: Callable[[], str | None]) -> str | None:
+    text = get_servable(key, compute)
+    if text is not None:
+        return text
+    text = compute()
+    if text:
+        store(key, text)
+    return text
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterator
+
+from . import metrics
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)).strip() or default)
+    except ValueError:
+        return default
+
+
+_BREAKER_FAILURES = int(_env_float("LLM_BREAKER_FAILURES", 3))
+_BREAKER_P95_S = _env_float("LLM_BREAKER_P95_S", 8.0)
+_BREAKER_COOLDOWN_S = _env_float("LLM_BREAKER_COOLDOWN_S", 30.0)
+_BREAKER_WINDOW = 20
+_HEDGE_DEFAULT_S = _env_float("LLM_HEDGE_DELAY_S", 2.0)
+
+_THREADS = max(2, int(_env_float("LLM_ROUTER_THREADS", 8)))
+_EXECUTOR = ThreadPoolExecutor(max_workers=_THREADS, thread_name_prefix="llm-router")
+# Attempts abandoned at the deadline keep running until their HTTP call returns; they
+# hold a slot until then, so slow providers can never pile work up behind the pool.
+_SLOTS = threading.BoundedSemaphore(_THREADS)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        max_failures: int = _BREAKER_FAILURES,
+        max_p95_s: float = _BREAKER_P95_S,
+        cooldown_s: float = _BREAKER_COOLDOWN_S,
+    ) -> None:
+        self.name = name
+        self.max_failures = max(1, max_failures)
+        self.max_p95_s = max_p95_s
+        self.cooldown_s = cooldown_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._latencies: deque[float] = deque(maxlen=_BREAKER_WINDOW)
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown_s:
+                    return False
+                self.state = "half_open"
+            # Half-open: exactly one probe request at a time decides whether to close again.
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        # The caller walked away before an outcome was known (e.g. a client disconnect).
+        with self._lock:
+            self._probing = False
+
+    def _open(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self._latencies.clear()
+        metrics.incr(f"llm.breaker.{self.name}.opened")
+
+    def _slow(self) -> bool:
+        if len(self._latencies) < self._latencies.maxlen:
+            return False
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))] > self.max_p95_s
+
+    def record(self, ok: bool, elapsed: float) -> None:
+        with self._lock:
+            probe = self.state == "half_open"
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self._latencies.append(elapsed)
+                if probe:
+                    if elapsed > self.max_p95_s:
+                        self._open()
+                    else:
+                        self.state = "closed"
+                elif self._slow():
+                    self._open()
+                return
+            self.failures += 1
+            if probe or self.failures >= self.max_failures:
+                self._open()
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker(provider: str) -> CircuitBreaker:
+    with _BREAKERS_LOCK:
+        b = _BREAKERS.get(provider)
+        if b is None:
+            b = _BREAKERS[provider] = CircuitBreaker(provider)
+        return b
+
+
+def _hedge_delay(provider: str) -> float:
+    p90 = metrics.quantile(f"llm.latency.{provider}", 0.9)
+    return p90 if p90 is not None else _HEDGE_DEFAULT_S
+
+
+def _attempt(provider: str, call: Callable[[str], str | None]) -> str | None:
+    t0 = time.monotonic()
+    try:
+        text = call(provider)
+    except Exception:
+        breaker(provider).record(False, time.monotonic() - t0)
+        metrics.incr(f"llm.provider.{provider}.failures")
+        return None
+    elapsed = time.monotonic() - t0
+    if not text:
+        # Not configured or an empty reply: no answer is not a healthy answer.
+        breaker(provider).record(False, elapsed)
+        metrics.incr(f"llm.provider.{provider}.empty")
+        return None
+    breaker(provider).record(True, elapsed)
+    metrics.observe(f"llm.latency.{provider}", elapsed)
+    return text
+
+
+def _submit(fn: Callable[..., Any], *args: Any) -> Future[Any] | None:
+    if not _SLOTS.acquire(blocking=False):
+        metrics.incr("llm.router.saturated")
+        return None
+    try:
+        future = _EXECUTOR.submit(fn, *args)
+    except Exception:
+        _SLOTS.release()
+        raise
+    future.add_done_callback(lambda _: _SLOTS.release())
+    return future
+
+
+def route(
+    providers: list[str],
+    call: Callable[[str], str | None],
+    budget_s: float,
+    hedge: bool = False,
+) -> str | None:
+    # Try providers in order within one overall deadline. A provider whose breaker is open
+    # is skipped outright; with hedging, the next provider is started as soon as the
+    # current one is slower than its own recent p90.
+    deadline = time.monotonic() + budget_s
+    queue = iter(providers)
+    pending: dict[Future[str | None], tuple[str, float]] = {}
+
+    def launch() -> bool:
+        for provider in queue:
+            if breaker(provider).allow():
+                future = _submit(_attempt, provider, call)
+                if future is None:
+                    breaker(provider).release()
+                    return False
+                pending[future] = (provider, time.monotonic())
+                return True
+            metrics.incr(f"llm.provider.{provider}.skipped_open")
+        return False
+
+    if not launch():
+        metrics.incr("llm.router.no_provider")
+        return None
+    hedged = not hedge
+    try:
+        while pending:
+            now = time.monotonic()
+            remaining = deadline - now
+            if remaining <= 0:
+                metrics.incr("llm.router.budget_exhausted")
+                return None
+            timeout = remaining
+            if not hedged:
+                provider, started = next(iter(pending.values()))
+                timeout = min(remaining, max(0.0, started + _hedge_delay(provider) - now))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if not hedged:
+                    hedged = True
+                    if launch():
+                        metrics.incr("llm.router.hedged")
+                continue
+            for future in done:
+                pending.pop(future)
+                text = future.result()
+                if text:
+                    return text
+            if not pending and not launch():
+                break
+        return None
+    finally:
+        for future in pending:
+            # Losers of a hedge and attempts past the deadline: drop any that have not
+            # started; a running one finishes in the background and frees its slot.
+            if not future.cancel():
+                metrics.incr("llm.router.abandoned")
+
+
+_END = object()
+
+
+def _first_chunk(chunks: Iterator[str], deadline: float) -> tuple[str, Any]:
+    # -> ("ok", first chunk or _END), ("timeout", _END) or ("saturated", _END). The first
+    # read runs on the router pool so the wait for it can be bounded; later chunks are
+    # read on the caller's thread.
+    future = _submit(next, chunks, _END)
+    if future is None:
+        return "saturated", _END
+    done, _ = wait([future], timeout=max(0.0, deadline - time.monotonic()))
+    if not done:
+
+        def close(_: Future[Any]) -> None:
+            close_fn = getattr(chunks, "close", None)
+            if close_fn is not None:
+                close_fn()
+
+        future.add_done_callback(close)
+        metrics.incr("llm.router.abandoned")
+        return "timeout", _END
+    return "ok", future.result()
+
+
+def route_stream(providers: list[str], stream: Callable[[str], Iterator[str]], budget_s: float) -> Iterator[str]:
+    # Fail over only while nothing has been sent; once tokens are out the reply belongs
+    # to that provider. The budget bounds the time to the first chunk across providers.
+    deadline = time.monotonic() + budget_s
+    for provider in providers:
+        b = breaker(provider)
+        if time.monotonic() >= deadline:
+            metrics.incr("llm.router.budget_exhausted")
+            return
+        if not b.allow():
+            metrics.incr(f"llm.provider.{provider}.skipped_open")
+            continue
+        t0 = time.monotonic()
+        chunks = iter(stream(provider))
+        try:
+            outcome, first = _first_chunk(chunks, deadline)
+        except Exception:
+            b.record(False, time.monotonic() - t0)
+            metrics.incr(f"llm.provider.{provider}.failures")
+            continue
+        if outcome == "saturated":
+            # Our own pool is full, which says nothing about the provider; as in route(),
+            # give back the breaker's slot and stop (every other provider needs the pool too).
+            b.release()
+            close_fn = getattr(chunks, "close", None)
+            if close_fn is not None:
+                close_fn()
+            return
+        if outcome == "timeout":
+            b.record(False, time.monotonic() - t0)
+            metrics.incr(f"llm.provider.{provider}.first_chunk_timeouts")
+            continue
+        if first is _END:
+            b.record(False, time.monotonic() - t0)
+            metrics.incr(f"llm.provider.{provider}.empty")
+            continue
+        # Judge the provider on its time to first chunk: the rest of the stream runs at
+        # the client's reading pace, and a long healthy answer is not a slow provider.
+        # Kept apart from llm.latency.*, which route() hedges on for whole replies.
+        first_s = time.monotonic() - t0
+        try:
+            yield first
+            for chunk in chunks:
+                yield chunk
+        except GeneratorExit:
+            b.release()
+            raise
+        except Exception:
+            b.record(False, time.monotonic() - t0)
+            metrics.incr(f"llm.provider.{provider}.failures")
+            return
+        b.record(True, first_s)
+        metrics.observe(f"llm.first_chunk.{provider}", first_s)
+        return
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from collections import deque
+from typing import Any
+
+
+# Latency bucket upper bounds in seconds, roughly x1.5 apart from 5 ms to ~2 min.
+_BUCKETS: tuple[float, ...] = tuple(round(0.005 * 1.5**i, 4) for i in range(26))
+_WINDOW = 512
+_MIN_SAMPLES = 20
+
+
+class _RollingHistogram:
+    __slots__ = ("counts", "recent", "total")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(_BUCKETS) + 1)
+        # Bucket index of each of the last _WINDOW samples, so old samples can be un-counted.
+        self.recent: deque[int] = deque()
+        self.total = 0
+
+    def observe(self, seconds: float) -> None:
+        idx = bisect.bisect_left(_BUCKETS, seconds)
+        self.counts[idx] += 1
+        self.recent.append(idx)
+        if len(self.recent) > _WINDOW:
+            self.counts[self.recent.popleft()] -= 1
+        self.total += 1
+
+    def quantile(self, q: float) -> float | None:
+        n = len(self.recent)
+        if n < _MIN_SAMPLES:
+            return None
+        rank = q * n
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return _BUCKETS[idx] if idx < len(_BUCKETS) else float("inf")
+        return float("inf")
+
+
+_LOCK = threading.Lock()
+_COUNTERS: dict[str, int] = {}
+_HISTOGRAMS: dict[str, _RollingHistogram] = {}
+
+
+def incr(name: str, n: int = 1) -> None:
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def observe(name: str, seconds: float) -> None:
+    with _LOCK:
+        hist = _HISTOGRAMS.get(name)
+        if hist is None:
+            hist = _HISTOGRAMS[name] = _RollingHistogram()
+        hist.observe(seconds)
+
+
+def quantile(name: str, q: float) -> float | None:
+    # Upper bound of the bucket holding the q-quantile of recent samples; None until warmed up.
+    with _LOCK:
+        hist = _HISTOGRAMS.get(name)
+        return hist.quantile(q) if hist is not None else None
+
+
+def snapshot() -> dict[str, Any]:
+    with _LOCK:
+        return {
+            "counters": dict(sorted(_COUNTERS.items())),
+            "histograms": {
+                name: {
+                    "count": hist.total,
+                    "window": len(hist.recent),
+                    "p50_s": hist.quantile(0.5),
+                    "p90_s": hist.quantile(0.9),
+                    "p95_s": hist.quantile(0.95),
+                    "p99_s": hist.quantile(0.99),
+                }
+                for name, hist in sorted(_HISTOGRAMS.items())
+            },
+        }
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from . import metrics
+from .job_store import create_job, finish_job, get_job, pending_job
+from .reporting import render_pdf_report, store_report
+
+
+_WORKERS = int(os.environ.get("REPORT_WORKERS", "2") or 2)
+_MAX_PENDING = int(os.environ.get("REPORT_MAX_PENDING", "8") or 8)
+_JOB_TTL_S = 30 * 60
+_JOB_KIND = "report"
+
+_LOCK = threading.Lock()
+# Admission control is per process; job state is in SQLite so any worker can answer a poll.
+_PENDING = 0
+_EXECUTOR: ProcessPoolExecutor | None = None
+
+
+class ReportQueueFull(Exception):
+    pass
+
+
+def _worker_init() -> None:
+    # Renderers yield the CPU to the processes serving vitals and chat.
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            # spawn: never fork a process that is already running request and LLM threads.
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=max(1, _WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_worker_init,
+            )
+        return _EXECUTOR
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is broken:
+            _EXECUTOR = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(payload: dict[str, Any]) -> Future[tuple[bytes, str]]:
+    executor = _executor()
+    try:
+        return executor.submit(render_pdf_report, payload)
+    except BrokenProcessPool:
+        # A renderer died (OOM, killed); start a fresh pool rather than fail every later job.
+        _reset_executor(executor)
+        return _executor().submit(render_pdf_report, payload)
+
+
+def finished_job(session_id: str, key: str) -> str:
+    return create_job(_JOB_KIND, session_id, _JOB_TTL_S, status="done", cache_key=key)
+
+
+def submit_report(session_id: str, key: str, payload: dict[str, Any]) -> str:
+    global _PENDING
+    with _LOCK:
+        # Lookup and insert under the lock, so one worker never starts the same render twice.
+        running = pending_job(_JOB_KIND, key, _JOB_TTL_S)
+        if running is not None:
+            # Same session, nothing new since: share the render already under way.
+            metrics.incr("reports.jobs_coalesced")
+            return running
+        if _PENDING >= _MAX_PENDING:
+            metrics.incr("reports.jobs_rejected")
+            raise ReportQueueFull(f"{_PENDING} reports already queued")
+        job_id = create_job(_JOB_KIND, session_id, _JOB_TTL_S, cache_key=key)
+        _PENDING += 1
+    metrics.incr("reports.jobs_submitted")
+    try:
+        future = _submit(payload)
+    except Exception:
+        _finish(job_id, False)
+        raise
+    future.add_done_callback(lambda f: _on_done(job_id, key, f))
+    return job_id
+
+
+def _on_done(job_id: str, key: str, future: Future[tuple[bytes, str]]) -> None:
+    try:
+        pdf_bytes, _ = future.result()
+    except Exception:
+        _finish(job_id, False)
+        return
+    _finish(job_id, store_report(key, pdf_bytes) is not None)
+
+
+def _finish(job_id: str, ok: bool) -> None:
+    global _PENDING
+    with _LOCK:
+        _PENDING -= 1
+    finish_job(job_id, "done" if ok else "failed")
+
+
+def get_report_job(job_id: str) -> dict[str, Any] | None:
+    job = get_job(_JOB_KIND, job_id, _JOB_TTL_S)
+    if job is None:
+        return None
+    return {
+        "job_id": job_id,
+        "session_id": job["session_id"],
+        "key": job["cache_key"],
+        "status": job["status"],
+    }
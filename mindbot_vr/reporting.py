@@ -1,9 +1,23 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
-from typing import Any
+from typing import Any, Sequence
+
+from .downsample import VITAL_CHANNELS, epoch_s, vitals_summaries
+from .layout import draw_wrapped
+
+
+# Bump when the PDF layout or payload changes so stale cached reports are never served.
+REPORT_VERSION = 3
+_CACHE_PREFIX = "report-"
 
 
 def _base_dir() -> Path:
@@ -16,6 +30,228 @@ def _reports_dir() -> Path:
     return d
 
 
+def _cache_max_bytes() -> int:
+    try:
+        return int(float(os.environ.get("REPORT_CACHE_MAX_MB", "200").strip() or 200) * 1024 * 1024)
+    except ValueError:
+        return 200 * 1024 * 1024
+
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def filename_token(session_id: str) -> str:
+    # Session ids come from clients, so they never go into a file name as-is ("../x"
+    # in a zip path, a quote in Content-Disposition). A rewritten id gets a ".<hash>"
+    # suffix, which no untouched id can carry, so two ids never share a name.
+    safe = _UNSAFE_NAME.sub("_", session_id)[:64]
+    if safe != session_id or not safe:
+        safe = f"{safe}.{hashlib.sha256(session_id.encode('utf-8')).hexdigest()[:12]}"
+    return safe
+
+
+def report_filename(session_id: str) -> str:
+    return f"mindbot_vr_hospital_report_{session_id or 'session'}.pdf"
+
+
+def report_vitals_pins(db: sqlite3.Connection, session_ids: Sequence[str]) -> dict[str, int]:
+    # Reports render vitals up to the newest row at request time: a handoff document
+    # must not leave out the last readings. The pin is part of the cache key, and the
+    # single-session and bulk paths read the same rows for it.
+    rows = db.execute(
+        """
+        SELECT p.value AS session_id, (SELECT MAX(id) FROM vitals WHERE session_id = p.value) AS pin
+        FROM json_each(?) AS p
+        """,
+        (json.dumps(list(session_ids)),),
+    ).fetchall()
+    return {r["session_id"]: r["pin"] for r in rows if r["pin"] is not None}
+
+
+def report_cache_key(db: sqlite3.Connection, session_id: str, vitals_pin: int | None) -> str:
+    # Rows are append-only with AUTOINCREMENT ids, so the newest id per table pins
+    # everything the report reads; vitals are pinned by report_vitals_pins.
+    row = db.execute(
+        """
+        SELECT
+          (SELECT MAX(id) FROM symptom_events WHERE session_id = ?),
+          (SELECT MAX(id) FROM sos_events WHERE session_id = ?),
+          (SELECT MAX(id) FROM messages WHERE session_id = ? AND role = 'assistant')
+        """,
+        (session_id,) * 3,
+    ).fetchone()
+    return report_digest(session_id, (vitals_pin, *row))
+
+
+def report_digest(session_id: str, max_ids: tuple[Any, ...]) -> str:
+    # max_ids: vitals pin, newest symptom_events, sos_events and assistant message id (or None).
+    raw = json.dumps([REPORT_VERSION, session_id, *max_ids])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def build_report_payload(db: sqlite3.Connection, session_id: str, vitals_pin: int | None) -> dict[str, Any]:
+    vitals_rows = db.execute(
+        """
+        SELECT pulse_bpm, temperature_c, oxygen_percent, air_quality_ppm, created_at
+        FROM vitals
+        WHERE session_id = ? AND id <= ?
+        ORDER BY id DESC
+        LIMIT 20
+        """,
+        (session_id, vitals_pin or 0),
+    ).fetchall()
+    symptom_rows = db.execute(
+        """
+        SELECT matched_symptoms_json, risk_score, risk_level, created_at
+        FROM symptom_events
+        WHERE session_id = ?
+        ORDER BY id DESC
+        LIMIT 20
+        """,
+        (session_id,),
+    ).fetchall()
+    sos_rows = db.execute(
+        """
+        SELECT trigger, hospital_name, distance_km, eta_minutes, created_at
+        FROM sos_events
+        WHERE session_id = ?
+        ORDER BY id DESC
+        LIMIT 20
+        """,
+        (session_id,),
+    ).fetchall()
+    analysis_rows = db.execute(
+        """
+        SELECT content, created_at
+        FROM messages
+        WHERE session_id = ? AND role = 'assistant'
+        ORDER BY id DESC
+        LIMIT 10
+        """,
+        (session_id,),
+    ).fetchall()
+    last_symptom = db.execute(
+        """
+        SELECT risk_score, risk_level, recommendation
+        FROM symptom_events
+        WHERE session_id = ?
+        ORDER BY id DESC
+        LIMIT 1
+        """,
+        (session_id,),
+    ).fetchone()
+    return assemble_report_payload(
+        session_id,
+        vitals_rows,
+        symptom_rows,
+        sos_rows,
+        analysis_rows,
+        last_symptom,
+        vitals_summaries(db, {session_id: vitals_pin} if vitals_pin else {}).get(session_id),
+    )
+
+
+def assemble_report_payload(
+    session_id: str,
+    vitals_rows: list[Any],
+    symptom_rows: list[Any],
+    sos_rows: list[Any],
+    analysis_rows: list[Any],
+    last_symptom: Any,
+    vitals_summary: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    risk = {
+        "risk_score": int(last_symptom["risk_score"]) if last_symptom else 0,
+        "risk_level": str(last_symptom["risk_level"]) if last_symptom else "Low",
+        "recommendation": str(last_symptom["recommendation"]) if last_symptom else "",
+    }
+
+    return {
+        "session_id": session_id,
+        "risk": risk,
+        "vitals": [_pick(r, _VITALS_COLUMNS) for r in vitals_rows],
+        "symptoms": [
+            {
+                "matched_symptoms": (json.loads(r["matched_symptoms_json"]) if r["matched_symptoms_json"] else []),
+                "risk_score": int(r["risk_score"]),
+                "risk_level": str(r["risk_level"]),
+                "created_at": str(r["created_at"]),
+            }
+            for r in symptom_rows
+        ],
+        "sos_events": [_pick(r, _SOS_COLUMNS) for r in sos_rows],
+        "analysis": [_pick(r, _ANALYSIS_COLUMNS) for r in analysis_rows],
+        "vitals_summary": vitals_summary,
+    }
+
+
+_VITALS_COLUMNS = ("pulse_bpm", "temperature_c", "oxygen_percent", "air_quality_ppm", "created_at")
+_SOS_COLUMNS = ("trigger", "hospital_name", "distance_km", "eta_minutes", "created_at")
+_ANALYSIS_COLUMNS = ("content", "created_at")
+
+
+def _pick(row: Any, columns: tuple[str, ...]) -> dict[str, Any]:
+    # Bulk prefetch rows carry extra columns (id, session_id, rank); keep the payload shape fixed.
+    return {col: row[col] for col in columns}
+
+
+def _cache_path(key: str) -> Path:
+    return _reports_dir() / f"{_CACHE_PREFIX}{key}.pdf"
+
+
+def cached_report(key: str) -> Path | None:
+    path = _cache_path(key)
+    try:
+        # mtime doubles as the LRU clock.
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def store_report(key: str, pdf_bytes: bytes) -> Path | None:
+    d = _reports_dir()
+    path = _cache_path(key)
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".pdf", dir=d)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        return None
+    _evict(d, keep=path)
+    return path
+
+
+def _evict(d: Path, keep: Path) -> None:
+    # Only our own content-addressed files are candidates; anything else in reports/ is left alone.
+    entries: list[tuple[float, int, Path]] = []
+    total = 0
+    for p in d.glob(f"{_CACHE_PREFIX}*.pdf"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+        total += st.st_size
+    limit = _cache_max_bytes()
+    entries.sort()
+    for _, size, p in entries:
+        if total <= limit:
+            break
+        if p == keep:
+            continue
+        try:
+            p.unlink()
+        except OSError:
+            continue
+        total -= size
+
+
 def render_pdf_report(payload: dict[str, Any]) -> tuple[bytes, str]:
     from reportlab.lib.pagesizes import A4
     from reportlab.lib.units import mm
@@ -52,6 +288,22 @@ def render_pdf_report(payload: dict[str, Any]) -> tuple[bytes, str]:
     y = _draw_wrapped(c, x, y, width - 2 * x, f"Recommendation: {risk.get('recommendation','')}")
     y -= 8 * mm
 
+    summary = payload.get("vitals_summary")
+    if summary:
+        if y < 40 * mm + len(VITAL_CHANNELS) * _SPARK_ROW_H:
+            c.showPage()
+            y = height - 18 * mm
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(x, y, f"Vitals Over Session ({summary.get('samples', 0)} samples)")
+        y -= 5 * mm
+        c.setFont("Helvetica", 8)
+        c.drawString(x, y, f"{summary.get('start', '')}  to  {summary.get('end', '')}")
+        y -= 3 * mm
+        for ch in VITAL_CHANNELS:
+            _draw_sparkline(c, x, y, width - 2 * x, summary, ch)
+            y -= _SPARK_ROW_H
+        y -= 4 * mm
+
     c.setFont("Helvetica-Bold", 12)
     c.drawString(x, y, "Vital Readings (latest 20)")
     y -= 6 * mm
@@ -134,32 +386,75 @@ def render_pdf_report(payload: dict[str, Any]) -> tuple[bytes, str]:
     c.save()
     buf.seek(0)
     pdf_bytes = buf.read()
+    return pdf_bytes, report_filename(str(payload.get("session_id") or ""))
 
-    session_id = str(payload.get("session_id") or "session")
-    filename = f"mindbot_vr_hospital_report_{session_id}.pdf"
-    try:
-        (_reports_dir() / filename).write_bytes(pdf_bytes)
-    except Exception:
-        pass
-    return pdf_bytes, filename
+
+_PT_PER_MM = 72 / 25.4
+_SPARK_ROW_H = 17 * _PT_PER_MM
+_SPARK_LABELS = {
+    "pulse_bpm": "Pulse (BPM)",
+    "temperature_c": "Temperature (°C)",
+    "oxygen_percent": "O₂ saturation (%)",
+    "air_quality_ppm": "Air quality (ppm)",
+}
+
+
+def _draw_sparkline(c: Any, x: float, y_top: float, width: float, summary: dict[str, Any], channel: str) -> None:
+    # Vector chart: grey band = per-bucket min..max, line = LTTB series.
+    buckets = summary.get("buckets") or []
+    series = (summary.get("series") or {}).get(channel) or []
+    if not buckets or not series:
+        return
+    label_w = 42 * _PT_PER_MM
+    h = _SPARK_ROW_H - 5
+    cx, cy, cw = x + label_w, y_top - h, width - label_w
+
+    lo = min(b[channel]["min"] for b in buckets)
+    hi = max(b[channel]["max"] for b in buckets)
+    mean = sum(b[channel]["mean"] * b["n"] for b in buckets) / max(1, sum(b["n"] for b in buckets))
+    t0, t1 = series[0][0], series[-1][0]
+    t_span = (t1 - t0) or 1.0
+    v_span = (hi - lo) or 1.0
+
+    def px(t: float) -> float:
+        return cx + (t - t0) / t_span * cw
+
+    def py(v: float) -> float:
+        return cy + (v - lo) / v_span * h
+
+    c.setFont("Helvetica-Bold", 8)
+    c.drawString(x, y_top - 8, _SPARK_LABELS.get(channel, channel))
+    c.setFont("Helvetica", 7)
+    c.drawString(x, y_top - 17, f"min {lo:g}  mean {mean:.1f}  max {hi:g}")
+
+    c.saveState()
+    c.setLineWidth(0.3)
+    c.setStrokeColorRGB(0.75, 0.75, 0.75)
+    c.rect(cx, cy, cw, h, stroke=1, fill=0)
+
+    mids = [(epoch_s(b["start"]) + epoch_s(b["end"])) / 2 for b in buckets]
+    band = c.beginPath()
+    band.moveTo(px(mids[0]), py(buckets[0][channel]["max"]))
+    for t, b in zip(mids[1:], buckets[1:]):
+        band.lineTo(px(t), py(b[channel]["max"]))
+    for t, b in zip(reversed(mids), reversed(buckets)):
+        band.lineTo(px(t), py(b[channel]["min"]))
+    band.close()
+    c.setFillColorRGB(0.85, 0.88, 0.93)
+    c.drawPath(band, stroke=0, fill=1)
+
+    line = c.beginPath()
+    line.moveTo(px(series[0][0]), py(series[0][1]))
+    for t, v in series[1:]:
+        line.lineTo(px(t), py(v))
+    c.setLineWidth(0.7)
+    c.setStrokeColorRGB(0.10, 0.35, 0.70)
+    c.drawPath(line, stroke=1, fill=0)
+    c.restoreState()
 
 
 def _draw_wrapped(c: Any, x: float, y: float, max_width: float, text: str) -> float:
-    from reportlab.pdfbase.pdfmetrics import stringWidth
-
-    words = str(text).replace("\n", " ").split(" ")
-    line = ""
-    c.setFont(c._fontname, c._fontsize)
-    for w in words:
-        proposed = (line + " " + w).strip()
-        if stringWidth(proposed, c._fontname, c._fontsize) <= max_width:
-            line = proposed
-            continue
-        c.drawString(x, y, line)
-        y -= 12
-        line = w
-    if line:
-        c.drawString(x, y, line)
-        y -= 12
-    return y
+    from reportlab.lib.units import mm
 
+    margin = 18 * mm
+    return draw_wrapped(c, x, y, max_width, text, leading=12, bottom=margin, top=c._pagesize[1] - margin)
@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import csv
+import heapq
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+
+from .spatial import EARTH_RADIUS_KM, KDTree3, chord2_to_km, unit_vector
+
+
+# Binary road graph, little-endian, every section aligned to its item size:
+#   header   : magic "MBRG", u32 version, u32 n_nodes, u32 n_edges,
+#              f64 max_kmh, i32 kd_root, 4 pad bytes                       (v2)
+#   x, y, z  : f64[n_nodes] each   unit vectors of the nodes               (v2)
+#   lat, lng : f32[n_nodes] each
+#   offsets  : u32[n_nodes + 1]   CSR over *incoming* edges (reverse graph)
+#   sources  : u32[n_edges]       tail node of each incoming edge
+#   seconds  : f32[n_edges]       traversal time
+#   kd tree  : u32 point, i32 axis, i32 left, i32 right, [n_nodes] each    (v2)
+# Storing the reverse graph lets a single Dijkstra rooted at a hospital give
+# the travel time *to* that hospital from every node. The snapping index and
+# the A* speed bound are computed once by build-road-graph, so every worker maps
+# them instead of rebuilding them at startup. v1 files still load; they build both
+# in memory.
+_MAGIC = b"MBRG"
+_VERSION = 2
+_HEADER_V1 = struct.Struct("<4sIII")
+_HEADER = struct.Struct("<4sIIIdi4x")
+
+# Patients and hospitals are rarely exactly on a graph node; the leg between
+# the point and its snapped node is costed at this speed.
+_APPROACH_KMH = 20.0
+_SNAP_CANDIDATES = 3
+
+
+class RoadGraph:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, m = _HEADER_V1.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version not in (1, _VERSION):
+            raise ValueError(f"{self.path} is not a MindBot road graph (v1 or v{_VERSION})")
+        self.n_nodes = int(n)
+        self.n_edges = int(m)
+        self._node_tree: KDTree3 | None = None
+        self._max_kmh: float | None = None
+
+        if version == 1:
+            off = _HEADER_V1.size
+        else:
+            _, _, _, _, max_kmh, kd_root = _HEADER.unpack_from(self._mm, 0)
+            self._max_kmh = float(max_kmh)
+            off = _HEADER.size
+            xs, off = self._section(off, "d", n)
+            ys, off = self._section(off, "d", n)
+            zs, off = self._section(off, "d", n)
+        self.lat, off = self._section(off, "f", n)
+        self.lng, off = self._section(off, "f", n)
+        self.offsets, off = self._section(off, "I", n + 1)
+        self.sources, off = self._section(off, "I", m)
+        self.seconds, off = self._section(off, "f", m)
+        if version != 1:
+            point, off = self._section(off, "I", n)
+            axis, off = self._section(off, "i", n)
+            left, off = self._section(off, "i", n)
+            right, off = self._section(off, "i", n)
+            self._kd = (xs, ys, zs, point, axis, left, right)
+            self._node_tree = KDTree3.from_state(self._kd, int(kd_root))
+
+    def _section(self, off: int, fmt: str, count: int) -> tuple[Any, int]:
+        size = struct.calcsize(fmt) * count
+        view = memoryview(self._mm)[off : off + size]
+        if sys.byteorder == "little":
+            # Zero-copy: pages are shared through the OS page cache by every worker.
+            return view.cast(fmt), off + size
+        arr = array(fmt)
+        arr.frombytes(view)
+        arr.byteswap()
+        return arr, off + size
+
+    @property
+    def node_tree(self) -> KDTree3:
+        if self._node_tree is None:
+            self._node_tree = KDTree3([unit_vector(self.lat[i], self.lng[i]) for i in range(self.n_nodes)])
+        return self._node_tree
+
+    @property
+    def max_kmh(self) -> float:
+        if self._max_kmh is None:
+            tree = self.node_tree
+            self._max_kmh = _max_kmh(tree.xs, tree.ys, tree.zs, self.offsets, self.sources, self.seconds)
+        return self._max_kmh
+
+    def snap(self, lat: float, lng: float, k: int = _SNAP_CANDIDATES) -> list[tuple[float, int]]:
+        return [(chord2_to_km(d2), i) for d2, i in self.node_tree.nearest(unit_vector(lat, lng), k=k)]
+
+    def tree_to(self, root: int, max_seconds: float = math.inf) -> array:
+        # Dijkstra over the reverse graph: dist[v] = travel time from v to root.
+        # Search in float64, keep the cached tree as float32 to halve its footprint.
+        dist = array("d", [math.inf]) * self.n_nodes
+        dist[root] = 0.0
+        offsets, sources, seconds = self.offsets, self.sources, self.seconds
+        heap: list[tuple[float, int]] = [(0.0, root)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > dist[v] or d > max_seconds:
+                continue
+            for e in range(offsets[v], offsets[v + 1]):
+                u = sources[e]
+                nd = d + seconds[e]
+                if nd < dist[u]:
+                    dist[u] = nd
+                    heapq.heappush(heap, (nd, u))
+        return array("f", dist)
+
+    def seconds_to(
+        self, root: int, targets: dict[int, float], lat: float, lng: float, slack_km: float, max_seconds: float = math.inf
+    ) -> float:
+        # A* over the reverse graph from root back towards a point at (lat, lng): the
+        # least (travel time from a target node to root) + that target's extra seconds.
+        # Targets lie within slack_km of the point, which the heuristic allows for.
+        tree = self.node_tree
+        xs, ys, zs = tree.xs, tree.ys, tree.zs
+        px, py, pz = unit_vector(lat, lng)
+        kmh = self.max_kmh
+        scale = EARTH_RADIUS_KM * 3600.0 / kmh if 0.0 < kmh < math.inf else 0.0
+        slack = slack_km * 3600.0 / kmh if 0.0 < kmh < math.inf else 0.0
+        offsets, sources, seconds = self.offsets, self.sources, self.seconds
+
+        def h(v: int) -> float:
+            c = math.sqrt((xs[v] - px) ** 2 + (ys[v] - py) ** 2 + (zs[v] - pz) ** 2)
+            return max(0.0, c * scale - slack)
+
+        dist: dict[int, float] = {root: 0.0}
+        heap: list[tuple[float, float, int]] = [(h(root), 0.0, root)]
+        best = math.inf
+        while heap:
+            f, d, v = heapq.heappop(heap)
+            if f >= best or d > max_seconds:
+                break
+            if d > dist[v]:
+                continue
+            extra = targets.get(v)
+            if extra is not None:
+                best = min(best, d + extra)
+            for e in range(offsets[v], offsets[v + 1]):
+                u = sources[e]
+                nd = d + seconds[e]
+                if nd < dist.get(u, math.inf):
+                    dist[u] = nd
+                    heapq.heappush(heap, (nd + h(u), nd, u))
+        return best if best <= max_seconds else math.inf
+
+    def close(self) -> None:
+        self._node_tree = None
+        views = [getattr(self, attr, None) for attr in ("lat", "lng", "offsets", "sources", "seconds")]
+        for view in [*views, *getattr(self, "_kd", ())]:
+            if isinstance(view, memoryview):
+                view.release()
+        self._mm.close()
+        self._file.close()
+
+
+class RoutingEngine:
+    def __init__(self, graph: RoadGraph, max_trees: int = 64, max_minutes: float = 180.0) -> None:
+        self.graph = graph
+        self.max_trees = max(1, int(max_trees))
+        self.max_seconds = float(max_minutes) * 60.0
+        self._trees: OrderedDict[str, array] = OrderedDict()
+        self._anchors: dict[str, tuple[int, float]] = {}
+        self._building: set[str] = set()
+        self._builder: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _anchor(self, hospital: dict[str, Any]) -> tuple[int, float]:
+        hid = str(hospital["id"])
+        anchor = self._anchors.get(hid)
+        if anchor is None:
+            km, node = self.graph.snap(float(hospital["lat"]), float(hospital["lng"]), k=1)[0]
+            anchor = self._anchors[hid] = (node, _approach_seconds(km))
+        return anchor
+
+    def _cached_tree(self, hid: str) -> array | None:
+        with self._lock:
+            tree = self._trees.get(hid)
+            if tree is not None:
+                self._trees.move_to_end(hid)
+            return tree
+
+    def _build_tree(self, hospital: dict[str, Any]) -> array:
+        hid = str(hospital["id"])
+        try:
+            node, _ = self._anchor(hospital)
+            tree = self.graph.tree_to(node, max_seconds=self.max_seconds)
+            with self._lock:
+                self._trees[hid] = tree
+                while len(self._trees) > self.max_trees:
+                    self._trees.popitem(last=False)
+            return tree
+        finally:
+            with self._lock:
+                self._building.discard(hid)
+
+    def _warm(self, hospital: dict[str, Any]) -> None:
+        # The full tree is built off the request path; until it lands, queries for this
+        # hospital use a bounded A* search instead.
+        hid = str(hospital["id"])
+        with self._lock:
+            if hid in self._building or hid in self._trees:
+                return
+            self._building.add(hid)
+            if self._builder is None:
+                self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="routing-tree")
+            builder = self._builder
+        builder.submit(self._build_tree, hospital)
+
+    def precompute(self, hospitals: Iterable[dict[str, Any]]) -> None:
+        # Queue trees for the first max_trees facilities on the background builder;
+        # more would only evict each other. Until each lands, its queries use A*.
+        for i, h in enumerate(hospitals):
+            if i >= self.max_trees:
+                break
+            self._warm(h)
+
+    def eta_minutes(self, lat: float, lng: float, hospital: dict[str, Any]) -> int | None:
+        node, hospital_leg = self._anchor(hospital)
+        snapped = self.graph.snap(lat, lng)
+        tree = self._cached_tree(str(hospital["id"]))
+        best = math.inf
+        if tree is not None:
+            for km, v in snapped:
+                t = tree[v]
+                if t != math.inf:
+                    best = min(best, _approach_seconds(km) + t)
+        elif snapped:
+            self._warm(hospital)
+            targets: dict[int, float] = {}
+            for km, v in snapped:
+                targets[v] = min(targets.get(v, math.inf), _approach_seconds(km))
+            slack_km = max(km for km, _ in snapped)
+            best = self.graph.seconds_to(node, targets, lat, lng, slack_km, max_seconds=self.max_seconds)
+        if best == math.inf:
+            return None
+        return int(max(1, round((best + hospital_leg) / 60.0)))
+
+
+def _max_kmh(xs: Any, ys: Any, zs: Any, offsets: Any, sources: Any, seconds: Any) -> float:
+    # Fastest straight-line (chord) speed over any edge. Chord distance at this speed
+    # never overestimates a travel time, so it is a consistent A* heuristic.
+    best = 0.0
+    for v in range(len(offsets) - 1):
+        x, y, z = xs[v], ys[v], zs[v]
+        for e in range(offsets[v], offsets[v + 1]):
+            u = sources[e]
+            s = seconds[e]
+            c = math.sqrt((xs[u] - x) ** 2 + (ys[u] - y) ** 2 + (zs[u] - z) ** 2)
+            if s <= 0.0:
+                if c > 0.0:
+                    best = math.inf
+                continue
+            best = max(best, c * EARTH_RADIUS_KM * 3600.0 / s)
+    return best
+
+
+def _approach_seconds(km: float) -> float:
+    return km / _APPROACH_KMH * 3600.0
+
+
+def open_routing_engine(path: str | Path) -> RoutingEngine:
+    max_trees = int(os.environ.get("ROUTING_TREE_CACHE", "64") or 64)
+    max_minutes = float(os.environ.get("ROUTING_MAX_MINUTES", "180") or 180)
+    return RoutingEngine(RoadGraph(path), max_trees=max_trees, max_minutes=max_minutes)
+
+
+def write_graph(
+    path: str | Path,
+    nodes: Sequence[tuple[float, float]],
+    edges: Iterable[tuple[int, int, float]],
+) -> None:
+    n = len(nodes)
+    incoming: list[list[tuple[int, float]]] = [[] for _ in range(n)]
+    m = 0
+    for src, dst, seconds in edges:
+        incoming[dst].append((src, float(seconds)))
+        m += 1
+
+    offsets = array("I", [0]) * (n + 1)
+    sources = array("I")
+    secs = array("f")
+    for v in range(n):
+        for src, s in incoming[v]:
+            sources.append(src)
+            secs.append(s)
+        offsets[v + 1] = len(sources)
+
+    lat = array("f", (p[0] for p in nodes))
+    lng = array("f", (p[1] for p in nodes))
+    # Index the coordinates as stored (float32), exactly as a v1 load would.
+    tree = KDTree3([unit_vector(lat[i], lng[i]) for i in range(n)])
+    (xs, ys, zs, point, axis, left, right), root = tree.state()
+    max_kmh = _max_kmh(xs, ys, zs, offsets, sources, secs)
+    sections = [
+        xs,
+        ys,
+        zs,
+        lat,
+        lng,
+        offsets,
+        sources,
+        secs,
+        array("I", point),
+        array("i", axis),
+        array("i", left),
+        array("i", right),
+    ]
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, n, m, max_kmh, root))
+        for arr in sections:
+            if sys.byteorder != "little":
+                arr = array(arr.typecode, arr)
+                arr.byteswap()
+            f.write(arr.tobytes())
+    os.replace(tmp, path)
+
+
+def build_from_csv(csv_path: str | Path, out_path: str | Path) -> tuple[int, int]:
+    # Edge list with columns from_lat, from_lng, to_lat, to_lng, length_m,
+    # speed_kmh and optional oneway (1/0); endpoints are merged at ~10 cm.
+    node_ids: dict[tuple[int, int], int] = {}
+    nodes: list[tuple[float, float]] = []
+    edges: list[tuple[int, int, float]] = []
+
+    def node(lat: float, lng: float) -> int:
+        key = (round(lat * 1e6), round(lng * 1e6))
+        nid = node_ids.get(key)
+        if nid is None:
+            nid = node_ids[key] = len(nodes)
+            nodes.append((lat, lng))
+        return nid
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                a = node(float(row["from_lat"]), float(row["from_lng"]))
+                b = node(float(row["to_lat"]), float(row["to_lng"]))
+                length_m = float(row["length_m"])
+                speed = float(row.get("speed_kmh") or 40.0)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if speed <= 0 or a == b:
+                continue
+            seconds = length_m / 1000.0 / speed * 3600.0
+            edges.append((a, b, seconds))
+            if str(row.get("oneway", "0")).strip() not in {"1", "true", "yes"}:
+                edges.append((b, a, seconds))
+
+    write_graph(out_path, nodes, edges)
+    return len(nodes), len(edges)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import html
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from . import metrics
+from .db import connect
+
+
+# source name -> (fts table, content table, text column, tie-break rank)
+_SOURCES: dict[str, tuple[str, str, str, int]] = {
+    "message": ("messages_fts", "messages", "content", 0),
+    "symptom_event": ("symptom_events_fts", "symptom_events", "raw_message", 1),
+}
+_EXTRA_COLUMNS = {"message": ", role", "symptom_event": ", risk_level"}
+
+_TOKEN = re.compile(r"\w+\*?", re.UNICODE)
+# Snippet markers that cannot appear in sanitised user text; swapped for <mark>
+# after the rest of the snippet has been HTML-escaped.
+_OPEN, _CLOSE = "\x01", "\x02"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)).strip() or default)
+    except ValueError:
+        return default
+
+
+def match_query(raw: str) -> str | None:
+    # Free text -> an FTS5 query of quoted terms (implicit AND), so user input can
+    # never be parsed as FTS5 syntax. A trailing "*" keeps its prefix meaning.
+    terms = []
+    for token in _TOKEN.findall(raw or ""):
+        word = token.rstrip("*")
+        if word:
+            terms.append(f'"{word}"*' if token.endswith("*") else f'"{word}"')
+    return " ".join(terms) or None
+
+
+def _backfill_step(conn: sqlite3.Connection, source: str, batch: int) -> int:
+    fts, table, column, _ = _SOURCES[source]
+    # IMMEDIATE: another process running the same backfill waits here instead of
+    # indexing the same batch twice.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT next_id, upto FROM search_backfill WHERE source = ?", (table,)).fetchone()
+        if row is None or row["next_id"] > row["upto"]:
+            conn.commit()
+            return 0
+        end = min(row["upto"], row["next_id"] + batch - 1)
+        cur = conn.execute(
+            f"INSERT INTO {fts} (rowid, {column}) SELECT id, {column} FROM {table} WHERE id BETWEEN ? AND ?",
+            (row["next_id"], end),
+        )
+        conn.execute("UPDATE search_backfill SET next_id = ? WHERE source = ?", (end + 1, table))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    metrics.incr("search.backfilled", max(cur.rowcount, 0))
+    # Ids can have gaps, so report the span covered; 0 means this source is done.
+    return end - row["next_id"] + 1
+
+
+def backfill_pending(conn: sqlite3.Connection) -> dict[str, int]:
+    rows = conn.execute("SELECT source, next_id, upto FROM search_backfill").fetchall()
+    return {r["source"]: max(0, r["upto"] - r["next_id"] + 1) for r in rows}
+
+
+def backfill_search(conn: sqlite3.Connection, batch: int = 2000, pause_s: float = 0.0) -> int:
+    # Small transactions with a pause between them: live inserts keep getting the
+    # write lock while months of history are indexed.
+    done = 0
+    for source in _SOURCES:
+        while True:
+            n = _backfill_step(conn, source, batch)
+            if not n:
+                break
+            done += n
+            if pause_s:
+                time.sleep(pause_s)
+    return done
+
+
+_BACKFILL_STARTED = False
+_BACKFILL_LOCK = threading.Lock()
+
+
+def _run_backfill() -> None:
+    batch = int(_env_float("SEARCH_BACKFILL_BATCH", 2000))
+    pause_s = _env_float("SEARCH_BACKFILL_PAUSE_S", 0.05)
+    conn = connect()
+    try:
+        while True:
+            try:
+                backfill_search(conn, batch=max(1, batch), pause_s=pause_s)
+                return
+            except sqlite3.OperationalError:
+                # Database busy; the step rolled back, so just try again shortly.
+                time.sleep(1.0)
+    finally:
+        conn.close()
+
+
+def start_search_backfill() -> None:
+    global _BACKFILL_STARTED
+    with _BACKFILL_LOCK:
+        if _BACKFILL_STARTED:
+            return
+        _BACKFILL_STARTED = True
+    conn = connect()
+    try:
+        pending = any(backfill_pending(conn).values())
+    finally:
+        conn.close()
+    if pending:
+        threading.Thread(target=_run_backfill, name="search-backfill", daemon=True).start()
+
+
+def parse_cursor(raw: str | None) -> tuple[float, int, int] | None:
+    if not raw:
+        return None
+    score, src, row_id = raw.split(":")
+    return float(score), int(src), int(row_id)
+
+
+def _format_cursor(key: tuple[float, int, int]) -> str:
+    return f"{key[0]!r}:{key[1]}:{key[2]}"
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _ranked(
+    db: sqlite3.Connection, source: str, query: str, after: tuple[float, int, int] | None, limit: int
+) -> list[tuple[float, int, int]]:
+    fts, _, _, src = _SOURCES[source]
+    # bm25() is lower-is-better; (score, source, id) is a total order, which is what
+    # keyset pagination needs. Snippets are made later, only for the rows kept.
+    keyset = "WHERE (score, ?, id) > (?, ?, ?)" if after is not None else ""
+    params: list[Any] = [query]
+    if after is not None:
+        params += [src, *after]
+    rows = db.execute(
+        f"""
+        SELECT score, id FROM (SELECT rowid AS id, bm25({fts}) AS score FROM {fts} WHERE {fts} MATCH ?)
+        {keyset}
+        ORDER BY score, id
+        LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+    return [(float(r["score"]), src, int(r["id"])) for r in rows]
+
+
+def _details(db: sqlite3.Connection, source: str, query: str, ids: list[int]) -> dict[int, dict[str, Any]]:
+    fts, table, _, _ = _SOURCES[source]
+    marks = ",".join("?" * len(ids))
+    out: dict[int, dict[str, Any]] = {}
+    for r in db.execute(
+        f"SELECT id, session_id, created_at{_EXTRA_COLUMNS[source]} FROM {table} WHERE id IN ({marks})", ids
+    ):
+        out[int(r["id"])] = dict(r)
+    for r in db.execute(
+        f"""
+        SELECT rowid AS id, snippet({fts}, 0, char(1), char(2), '…', 16) AS snip
+        FROM {fts} WHERE {fts} MATCH ? AND rowid IN ({marks})
+        """,
+        (query, *ids),
+    ):
+        if int(r["id"]) in out:
+            out[int(r["id"])]["snippet"] = _highlight(r["snip"])
+    return out
+
+
+def search(
+    db: sqlite3.Connection,
+    query: str,
+    limit: int = 20,
+    cursor: tuple[float, int, int] | None = None,
+    sources: list[str] | None = None,
+) -> dict[str, Any]:
+    keys: list[tuple[float, int, int]] = []
+    names = {spec[3]: name for name, spec in _SOURCES.items()}
+    for source in sources or list(_SOURCES):
+        # One extra row per source tells us whether another page exists.
+        keys.extend(_ranked(db, source, query, cursor, limit + 1))
+    keys.sort()
+    page, more = keys[:limit], len(keys) > limit
+
+    details: dict[tuple[int, int], dict[str, Any]] = {}
+    for src, name in names.items():
+        ids = [k[2] for k in page if k[1] == src]
+        if ids:
+            for row_id, d in _details(db, name, query, ids).items():
+                details[(src, row_id)] = d
+
+    results = []
+    for score, src, row_id in page:
+        d = details.get((src, row_id))
+        if d is None:
+            # Deleted between ranking and lookup.
+            continue
+        results.append({"source": names[src], "score": round(-score, 4), **d})
+    return {
+        "results": results,
+        "next_cursor": _format_cursor(page[-1]) if more and page else None,
+        "index_pending": sum(backfill_pending(db).values()),
+    }
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import heapq
+import math
+from array import array
+from typing import Any, Sequence
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def unit_vector(lat: float, lng: float) -> tuple[float, float, float]:
+    phi = math.radians(lat)
+    lam = math.radians(lng)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+
+def chord2_to_km(chord2: float) -> float:
+    # Squared chord between unit vectors -> great-circle distance.
+    half = min(1.0, math.sqrt(max(chord2, 0.0)) / 2.0)
+    return 2.0 * EARTH_RADIUS_KM * math.asin(half)
+
+
+def km_to_chord2(km: float) -> float:
+    angle = min(km / EARTH_RADIUS_KM, math.pi)
+    chord = 2.0 * math.sin(angle / 2.0)
+    return chord * chord
+
+
+class KDTree3:
+    # Static 3-d tree over unit vectors. Euclidean (chord) order on the unit
+    # sphere is the same as great-circle order, so nearest-by-chord is exact.
+
+    def __init__(self, points: Sequence[tuple[float, float, float]]) -> None:
+        n = len(points)
+        self.xs = array("d", (p[0] for p in points))
+        self.ys = array("d", (p[1] for p in points))
+        self.zs = array("d", (p[2] for p in points))
+        self._coords = (self.xs, self.ys, self.zs)
+        self._point = array("l", [0]) * n
+        self._axis = array("b", [0]) * n
+        self._left = array("l", [-1]) * n
+        self._right = array("l", [-1]) * n
+        self._root = -1
+        self._next = 0
+        if n:
+            self._root = self._build(list(range(n)), 0)
+
+    @classmethod
+    def from_state(cls, state: Sequence[Any], root: int) -> KDTree3:
+        # A tree saved with state(); the arrays may be zero-copy views of a mapped file.
+        tree = cls.__new__(cls)
+        tree.xs, tree.ys, tree.zs, tree._point, tree._axis, tree._left, tree._right = state
+        tree._coords = (tree.xs, tree.ys, tree.zs)
+        tree._root = root
+        tree._next = len(tree.xs)
+        return tree
+
+    def state(self) -> tuple[tuple[Any, ...], int]:
+        # -> ((xs, ys, zs, point, axis, left, right), root)
+        return (self.xs, self.ys, self.zs, self._point, self._axis, self._left, self._right), self._root
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def _build(self, ids: list[int], depth: int) -> int:
+        if not ids:
+            return -1
+        coords = self._coords
+        # Split on the axis with the largest spread; points on a small patch of
+        # the sphere are far from isotropic in 3-d.
+        best_axis, best_spread = 0, -1.0
+        for axis in range(3):
+            c = coords[axis]
+            vals = [c[i] for i in ids]
+            spread = max(vals) - min(vals)
+            if spread > best_spread:
+                best_axis, best_spread = axis, spread
+        c = coords[best_axis]
+        ids.sort(key=c.__getitem__)
+        mid = len(ids) // 2
+        node = self._next
+        self._next += 1
+        self._point[node] = ids[mid]
+        self._axis[node] = best_axis
+        self._left[node] = self._build(ids[:mid], depth + 1)
+        self._right[node] = self._build(ids[mid + 1 :], depth + 1)
+        return node
+
+    def nearest(self, q: tuple[float, float, float], k: int = 1) -> list[tuple[float, int]]:
+        if self._root < 0 or k <= 0:
+            return []
+        xs, ys, zs = self.xs, self.ys, self.zs
+        qx, qy, qz = q
+        qc = (qx, qy, qz)
+        coords = self._coords
+        point, axis_of, left, right = self._point, self._axis, self._left, self._right
+        heap: list[tuple[float, int]] = []  # max-heap of (-chord2, point id)
+        worst = math.inf
+
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if node < 0 or bound >= worst:
+                continue
+            i = point[node]
+            dx = xs[i] - qx
+            dy = ys[i] - qy
+            dz = zs[i] - qz
+            d2 = dx * dx + dy * dy + dz * dz
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, i))
+                if len(heap) == k:
+                    worst = -heap[0][0]
+            elif d2 < worst:
+                heapq.heapreplace(heap, (-d2, i))
+                worst = -heap[0][0]
+            axis = axis_of[node]
+            diff = qc[axis] - coords[axis][i]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            # Push the far side first so the near side is explored first.
+            stack.append((far, diff * diff))
+            stack.append((near, 0.0))
+        return sorted((-d, i) for d, i in heap)
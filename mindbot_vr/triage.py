@@ -4,18 +4,54 @@ import math
 import re
 from dataclasses import asdict, dataclass
 from difflib import SequenceMatcher
+from typing import Any
 
 
-def _normalize_text(text: str) -> str:
+def _build_fold_table() -> dict[int, str | None]:
+    table: dict[int, str | None] = {0x0640: None, 0x0670: None}  # tatweel, superscript alef
+    for cp in range(0x064B, 0x0660):  # harakat / tanwin / shadda / sukun
+        table[cp] = None
+    for ch in "أإآٱ":
+        table[ord(ch)] = "ا"
+    table[ord("ى")] = "ي"
+    table[ord("ة")] = "ه"
+    for i in range(10):
+        table[0x0660 + i] = str(i)  # Arabic-Indic digits
+        table[0x06F0 + i] = str(i)  # Extended Arabic-Indic (Persian/Urdu) digits
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_ARABIC_PREFIXES = ("وال", "بال", "فال", "كال", "ال")
+
+
+def _tokenize(text: str) -> list[str]:
     text = (text or "").lower()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    if not text.isascii():
+        text = text.translate(_FOLD_TABLE)
+    return _TOKEN_RE.findall(text)
+
 
+def _normalize_text(text: str) -> str:
+    return " ".join(_tokenize(text))
+
+
+def _strip_arabic_prefix(token: str) -> str:
+    if len(token) < 5 or token.isascii():
+        return token
+    for prefix in _ARABIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 3:
+            return token[len(prefix) :]
+    return token
 
-def _token_set(text: str) -> set[str]:
-    n = _normalize_text(text)
-    return set(n.split()) if n else set()
+
+def token_set(text: str) -> set[str]:
+    text = text or ""
+    tokens = set(_tokenize(text))
+    if not text.isascii():
+        tokens |= {_strip_arabic_prefix(t) for t in tokens}
+    return tokens
 
 
 def _similarity(a: str, b: str) -> float:
@@ -35,30 +71,53 @@ def _contains_phrase(tokens: set[str], phrase: str) -> bool:
     return all(w in tokens or _fuzzy_any(tokens, w) for w in words)
 
 
+# Arabic variants are stored in folded form (see _FOLD_TABLE): ة→ه, ى→ي, أ/إ/آ→ا, no harakat.
 SYMPTOM_SYNONYMS: dict[str, set[str]] = {
-    "fever": {"fever", "temperature", "hot", "chills"},
-    "cough": {"cough", "coughing"},
-    "fatigue": {"fatigue", "tired", "exhausted", "weak"},
-    "headache": {"headache", "migraine"},
-    "breathing_difficulty": {"breathless", "wheeze", "wheezing", "dyspnea", "dyspnoea"},
-    "chest_pain": {"chestpain", "angina", "tightness"},
+    "fever": {"fever", "temperature", "hot", "chills", "حمي", "سخونه", "حراره", "رعشه"},
+    "cough": {"cough", "coughing", "كحه", "سعال"},
+    "fatigue": {"fatigue", "tired", "exhausted", "weak", "تعب", "تعبان", "ارهاق", "مرهق", "هبوط"},
+    "headache": {"headache", "migraine", "صداع", "شقيقه"},
+    "breathing_difficulty": {
+        "breathless",
+        "wheeze",
+        "wheezing",
+        "dyspnea",
+        "dyspnoea",
+        "نهجان",
+        "اختناق",
+        "كتمه",
+    },
+    "chest_pain": {"chestpain", "angina", "tightness", "ذبحه"},
 }
 
 
+# Fuzzy matching is split by script: an ASCII token can never come close to an
+# Arabic variant, so English messages only pay for the English half.
+_LATIN_VARIANTS = {k: [v for v in vs if v.isascii()] for k, vs in SYMPTOM_SYNONYMS.items()}
+_NATIVE_VARIANTS = {k: [v for v in vs if not v.isascii()] for k, vs in SYMPTOM_SYNONYMS.items()}
+
+
 def extract_symptoms(message: str) -> set[str]:
-    tokens = _token_set(message)
+    tokens = token_set(message)
+    native = {t for t in tokens if not t.isascii()}
     matched: set[str] = set()
     for canonical, variants in SYMPTOM_SYNONYMS.items():
         if any(v in tokens for v in variants):
             matched.add(canonical)
             continue
-        if any(_fuzzy_any(tokens, v) for v in variants):
+        if any(_fuzzy_any(tokens, v) for v in _LATIN_VARIANTS[canonical]):
+            matched.add(canonical)
+        elif native and any(_fuzzy_any(native, v) for v in _NATIVE_VARIANTS[canonical]):
             matched.add(canonical)
 
     if _contains_phrase(tokens, "shortness of breath") or _contains_phrase(tokens, "trouble breathing"):
         matched.add("breathing_difficulty")
+    elif native and (_contains_phrase(native, "ضيق تنفس") or _contains_phrase(native, "صعوبه تنفس")):
+        matched.add("breathing_difficulty")
     if _contains_phrase(tokens, "chest pain") or _contains_phrase(tokens, "chest tightness"):
         matched.add("chest_pain")
+    elif native and (_contains_phrase(native, "الم صدر") or _contains_phrase(native, "وجع صدر")):
+        matched.add("chest_pain")
     if "fever" not in matched and ("fever" in tokens or ("high" in tokens and "temperature" in tokens)):
         matched.add("fever")
     return matched
@@ -88,7 +147,41 @@ class TriageResult:
         return d
 
 
-def score_risk(vitals: dict[str, float], matched_symptoms: set[str]) -> tuple[int, list[str]]:
+# A reading only counts as "high" from trends once it has persisted this long
+# (or the EWMA has crossed the threshold), so a single noisy sample can't flip the score.
+_SUSTAINED_S = 10.0
+_SUSTAINED_FEVER_S = 300.0
+_PULSE_RISE_PER_MIN = 6.0
+
+
+def _trend(trends: dict[str, Any] | None, channel: str) -> dict[str, Any] | None:
+    if not trends:
+        return None
+    t = trends.get(channel)
+    return t if isinstance(t, dict) and t.get("ewma") is not None else None
+
+
+def _above(value: float, limit: float, trend: dict[str, Any] | None) -> bool:
+    if trend is None:
+        return value > limit
+    return float(trend["ewma"]) > limit or float(trend.get("current_streak_s") or 0.0) >= _SUSTAINED_S
+
+
+def _rising(trend: dict[str, Any] | None, per_min: float) -> bool:
+    if trend is None or float(trend.get("slope_per_min") or 0.0) < per_min:
+        return False
+    # Require the whole short window to sit above the long-window mean so one spike can't fake a trend.
+    windows = sorted((trend.get("windows") or {}).items(), key=lambda kv: int(kv[0]))
+    if len(windows) < 2:
+        return True
+    return float(windows[0][1]["min"]) > float(windows[-1][1]["mean"])
+
+
+def score_risk(
+    vitals: dict[str, float],
+    matched_symptoms: set[str],
+    trends: dict[str, Any] | None = None,
+) -> tuple[int, list[str]]:
     score = 0
     red_flags: list[str] = []
 
@@ -97,14 +190,25 @@ def score_risk(vitals: dict[str, float], matched_symptoms: set[str]) -> tuple[in
     # - Temp > 38 → +2
     # - Chest pain → +4
     # - Breathing difficulty → +5
+    # With per-session trends, pulse/temp use the smoothed reading and two extra rules apply:
+    # - Pulse rising ≥ 6 BPM/min over the long window → +1
+    # - Fever sustained ≥ 5 minutes → +1
     pulse = float(vitals.get("pulse_bpm", 0))
     temp = float(vitals.get("temperature_c", 0))
-    if pulse > 110:
+    pulse_trend = _trend(trends, "pulse_bpm")
+    temp_trend = _trend(trends, "temperature_c")
+    if _above(pulse, 110, pulse_trend):
         score += 2
         red_flags.append("High pulse detected (>110 BPM).")
-    if temp > 38:
+    if _above(temp, 38, temp_trend):
         score += 2
         red_flags.append("Fever detected (>38°C).")
+    if _rising(pulse_trend, _PULSE_RISE_PER_MIN):
+        score += 1
+        red_flags.append("Pulse rising steadily.")
+    if temp_trend is not None and float(temp_trend.get("seconds_beyond_threshold") or 0.0) >= _SUSTAINED_FEVER_S:
+        score += 1
+        red_flags.append("Fever sustained for over 5 minutes.")
     if "chest_pain" in matched_symptoms:
         score += 4
         red_flags.append("Chest pain reported.")
@@ -143,9 +247,9 @@ def build_recommendation(risk_level: str, matched_symptoms: set[str]) -> str:
     return "Monitor symptoms, rest, hydrate, and seek care if symptoms worsen."
 
 
-def triage_assess(message: str, vitals: dict[str, float]) -> TriageResult:
+def triage_assess(message: str, vitals: dict[str, float], trends: dict[str, Any] | None = None) -> TriageResult:
     matched = extract_symptoms(message)
-    score, red_flags = score_risk(vitals, matched)
+    score, red_flags = score_risk(vitals, matched, trends)
     level = _risk_level(score)
     emergency_mode = score >= 6
     hospital_needed = level in {"Medium", "Critical"}
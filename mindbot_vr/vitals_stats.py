@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import os
+import time
+from array import array
+from collections import deque
+from typing import Any
+
+
+# Channel -> (threshold, direction). "above" accumulates time spent over the
+# threshold, "below" time spent under it.
+CHANNEL_THRESHOLDS: dict[str, tuple[float, str] | None] = {
+    "pulse_bpm": (110.0, "above"),
+    "temperature_c": (38.0, "above"),
+    "oxygen_percent": (92.0, "below"),
+    "air_quality_ppm": None,
+}
+
+# Gaps longer than this (tab in background, network stall) are not counted
+# as time spent above/below a threshold.
+_MAX_SAMPLE_GAP_S = 5.0
+# Bursts of samples (e.g. several chat turns within a second) give a meaningless slope.
+_MIN_SLOPE_SPAN_S = 5.0
+
+
+def _env_windows() -> tuple[int, ...]:
+    raw = os.environ.get("VITALS_WINDOWS", "10,60").strip()
+    out: list[int] = []
+    for part in raw.split(","):
+        try:
+            n = int(part.strip())
+        except ValueError:
+            continue
+        if n > 1:
+            out.append(n)
+    return tuple(sorted(set(out))) or (10, 60)
+
+
+class _RollingWindow:
+    __slots__ = ("size", "_values", "_times", "_seq", "_sum", "_t0", "_st", "_stt", "_sty", "_min", "_max")
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._values = array("d", bytes(8 * size))
+        self._times = array("d", bytes(8 * size))
+        self._seq = 0
+        self._sum = 0.0
+        self._t0: float | None = None
+        self._st = 0.0
+        self._stt = 0.0
+        self._sty = 0.0
+        # Monotonic deques of (seq, value) give amortised O(1) rolling min/max.
+        self._min: deque[tuple[int, float]] = deque()
+        self._max: deque[tuple[int, float]] = deque()
+
+    def push(self, value: float, ts: float) -> None:
+        if self._t0 is None:
+            self._t0 = ts
+        t = ts - self._t0
+        slot = self._seq % self.size
+        if self._seq >= self.size:
+            old_v = self._values[slot]
+            old_t = self._times[slot]
+            self._sum -= old_v
+            self._st -= old_t
+            self._stt -= old_t * old_t
+            self._sty -= old_t * old_v
+        self._values[slot] = value
+        self._times[slot] = t
+        self._sum += value
+        self._st += t
+        self._stt += t * t
+        self._sty += t * value
+
+        expire = self._seq - self.size
+        while self._min and self._min[0][0] <= expire:
+            self._min.popleft()
+        while self._max and self._max[0][0] <= expire:
+            self._max.popleft()
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._min.append((self._seq, value))
+        self._max.append((self._seq, value))
+        self._seq += 1
+
+    @property
+    def count(self) -> int:
+        return min(self._seq, self.size)
+
+    def mean(self) -> float:
+        n = self.count
+        return self._sum / n if n else 0.0
+
+    def span_s(self) -> float:
+        n = self.count
+        if n < 2:
+            return 0.0
+        newest = self._times[(self._seq - 1) % self.size]
+        oldest = self._times[self._seq % self.size] if self._seq >= self.size else self._times[0]
+        return newest - oldest
+
+    def slope_per_s(self) -> float:
+        n = self.count
+        if n < 2 or self.span_s() < _MIN_SLOPE_SPAN_S:
+            return 0.0
+        denom = n * self._stt - self._st * self._st
+        if abs(denom) < 1e-9:
+            return 0.0
+        return (n * self._sty - self._st * self._sum) / denom
+
+    def snapshot(self) -> dict[str, float]:
+        if not self.count:
+            return {"min": 0.0, "max": 0.0, "mean": 0.0}
+        return {
+            "min": round(self._min[0][1], 2),
+            "max": round(self._max[0][1], 2),
+            "mean": round(self.mean(), 2),
+        }
+
+
+class _ChannelStats:
+    __slots__ = ("windows", "alpha", "threshold", "ewma", "last", "last_ts", "seconds_beyond", "streak_s")
+
+    def __init__(self, windows: tuple[int, ...], alpha: float, threshold: tuple[float, str] | None) -> None:
+        self.windows = [_RollingWindow(w) for w in windows]
+        self.alpha = alpha
+        self.threshold = threshold
+        self.ewma: float | None = None
+        self.last: float | None = None
+        self.last_ts: float | None = None
+        self.seconds_beyond = 0.0
+        self.streak_s = 0.0
+
+    def _beyond(self, value: float) -> bool:
+        if self.threshold is None:
+            return False
+        limit, direction = self.threshold
+        return value > limit if direction == "above" else value < limit
+
+    def push(self, value: float, ts: float) -> None:
+        beyond = self._beyond(value)
+        if self.last is not None and self.last_ts is not None:
+            dt = min(max(ts - self.last_ts, 0.0), _MAX_SAMPLE_GAP_S)
+            prev_beyond = self._beyond(self.last)
+            # Crossing intervals count half: the crossing happened somewhere in between.
+            share = dt if (prev_beyond and beyond) else (dt / 2 if (prev_beyond or beyond) else 0.0)
+            self.seconds_beyond += share
+            self.streak_s = self.streak_s + share if beyond else 0.0
+
+        self.ewma = value if self.ewma is None else self.ewma + self.alpha * (value - self.ewma)
+        self.last = value
+        self.last_ts = ts
+        for w in self.windows:
+            w.push(value, ts)
+
+    def snapshot(self) -> dict[str, Any]:
+        longest = self.windows[-1]
+        return {
+            "last": self.last,
+            "ewma": round(self.ewma, 2) if self.ewma is not None else None,
+            "windows": {str(w.size): w.snapshot() for w in self.windows},
+            "slope_per_min": round(longest.slope_per_s() * 60.0, 3),
+            "seconds_beyond_threshold": round(self.seconds_beyond, 1),
+            "current_streak_s": round(self.streak_s, 1),
+        }
+
+
+class VitalsAnalytics:
+    def __init__(self, windows: tuple[int, ...] | None = None, alpha: float = 0.2) -> None:
+        self.windows = tuple(windows) if windows else _env_windows()
+        self.samples = 0
+        self._channels = {
+            name: _ChannelStats(self.windows, alpha, threshold) for name, threshold in CHANNEL_THRESHOLDS.items()
+        }
+
+    def update(self, vitals: dict[str, float], ts: float | None = None) -> None:
+        ts = time.monotonic() if ts is None else ts
+        for name, channel in self._channels.items():
+            if name in vitals:
+                channel.push(float(vitals[name]), ts)
+        self.samples += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        out: dict[str, Any] = {name: ch.snapshot() for name, ch in self._channels.items()}
+        out["samples"] = self.samples
+        return out
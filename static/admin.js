@@ -2,6 +2,13 @@
   const elToken = document.getElementById("adminToken");
   const btnLoad = document.getElementById("btnLoadStats");
   const btnExport = document.getElementById("btnExport");
+  const btnLive = document.getElementById("btnLive");
+  const liveFeed = document.getElementById("liveFeed");
+  const btnSessions = document.getElementById("btnSessions");
+  const btnMoreSessions = document.getElementById("btnMoreSessions");
+  const sessionRisk = document.getElementById("sessionRisk");
+  const sessionSos = document.getElementById("sessionSos");
+  const sessionRows = document.getElementById("sessionRows");
   const toast = document.getElementById("adminToast");
   const statUsers = document.getElementById("statUsers");
   const statEmergencies = document.getElementById("statEmergencies");
@@ -24,19 +31,195 @@
     return res;
   }
 
+  const totals = { total_users: null, emergencies: null };
+
+  async function loadStats() {
+    const res = await api("/api/admin/stats");
+    const data = await res.json();
+    totals.total_users = data.total_users;
+    totals.emergencies = data.emergencies;
+    statUsers.textContent = String(data.total_users);
+    statEmergencies.textContent = String(data.emergencies);
+    statAvg.textContent = String(data.average_risk_score);
+  }
+
   btnLoad.addEventListener("click", async () => {
     setToast("");
     try {
-      const res = await api("/api/admin/stats");
-      const data = await res.json();
-      statUsers.textContent = String(data.total_users);
-      statEmergencies.textContent = String(data.emergencies);
-      statAvg.textContent = String(data.average_risk_score);
+      await loadStats();
     } catch (e) {
       setToast(`Admin error: ${e.message}`);
     }
   });
 
+  function applyDelta(delta) {
+    if (!delta) return;
+    if (delta.total_users && totals.total_users !== null) {
+      totals.total_users += delta.total_users;
+      statUsers.textContent = String(totals.total_users);
+    }
+    if (delta.emergencies && totals.emergencies !== null) {
+      totals.emergencies += delta.emergencies;
+      statEmergencies.textContent = String(totals.emergencies);
+    }
+  }
+
+  function describe(event, data) {
+    const sid = String(data.session_id || "").slice(0, 8);
+    if (event === "session") return `New session ${sid}`;
+    if (event === "sos") {
+      return `SOS (${data.trigger}) ${sid} → ${data.hospital_name}, ${data.distance_km} km, ETA ${data.eta_minutes} min`;
+    }
+    if (event === "risk") return `Risk ${data.from || "—"} → ${data.to} (score ${data.risk_score}) ${sid}`;
+    return event;
+  }
+
+  function addFeedItem(event, data) {
+    const li = document.createElement("li");
+    const time = document.createElement("span");
+    time.className = "live-time";
+    time.textContent = new Date(data.created_at || Date.now()).toLocaleTimeString();
+    li.appendChild(time);
+    li.appendChild(document.createTextNode(describe(event, data)));
+    liveFeed.prepend(li);
+    while (liveFeed.children.length > 200) liveFeed.lastChild.remove();
+  }
+
+  // EventSource cannot send headers, so the stream is read with fetch and the
+  // token stays in X-Admin-Token instead of the URL.
+  let live = null;
+  let lastEventId = "";
+
+  function handleFrame(frame) {
+    let event = "message";
+    const data = [];
+    for (const line of frame.split("\n")) {
+      if (line.startsWith("id:")) lastEventId = line.slice(3).trim();
+      else if (line.startsWith("event:")) event = line.slice(6).trim();
+      else if (line.startsWith("data:")) data.push(line.slice(5).trim());
+    }
+    if (!data.length) return;
+    const payload = JSON.parse(data.join("\n"));
+    if (event === "resync") {
+      loadStats().catch(() => {});
+      return;
+    }
+    applyDelta(payload.delta);
+    addFeedItem(event, payload);
+  }
+
+  async function readStream(controller) {
+    const token = (elToken.value || "").trim();
+    const headers = { "X-Admin-Token": token };
+    const resuming = Boolean(lastEventId);
+    if (resuming) headers["Last-Event-ID"] = lastEventId;
+    const res = await fetch("/api/admin/stream", { headers, signal: controller.signal });
+    if (res.status === 401 && live === controller) {
+      live = null;
+      setLive(false);
+    }
+    if (!res.ok) throw new Error(await res.text());
+    // Subscribed as of the response: a baseline read now cannot miss an event, and
+    // deltas that arrive before it lands are dropped (the baseline already has them).
+    if (!resuming) loadStats().catch((e) => setToast(`Admin error: ${e.message}`));
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buf = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) return true;
+      buf += value;
+      let cut;
+      while ((cut = buf.indexOf("\n\n")) >= 0) {
+        handleFrame(buf.slice(0, cut));
+        buf = buf.slice(cut + 2);
+      }
+    }
+  }
+
+  async function runLive(controller) {
+    while (live === controller) {
+      try {
+        // The server ends streams after a while; pick up straight from the last event.
+        if (await readStream(controller)) continue;
+      } catch (e) {
+        if (controller.signal.aborted) return;
+        setToast(`Live stream error: ${e.message}`);
+      }
+      if (live !== controller) return;
+      await new Promise((r) => setTimeout(r, 3000));
+    }
+  }
+
+  function setLive(on) {
+    btnLive.textContent = on ? "Stop Live" : "Go Live";
+    btnLive.setAttribute("aria-pressed", on ? "true" : "false");
+    liveFeed.classList.toggle("hidden", !on && !liveFeed.children.length);
+  }
+
+  btnLive.addEventListener("click", async () => {
+    setToast("");
+    if (live) {
+      live.abort();
+      live = null;
+      setLive(false);
+      return;
+    }
+    const controller = new AbortController();
+    live = controller;
+    lastEventId = "";
+    totals.total_users = null;
+    totals.emergencies = null;
+    setLive(true);
+    runLive(controller);
+  });
+
+  let sessionCursor = null;
+
+  function sessionRow(s) {
+    const tr = document.createElement("tr");
+    const v = s.last_vitals;
+    const cells = [
+      new Date(s.created_at).toLocaleString(),
+      s.session_id.slice(0, 12),
+      String(s.message_count),
+      s.last_risk ? `${s.last_risk.risk_level} (${s.last_risk.risk_score})` : "—",
+      s.max_risk_level || "—",
+      String(s.sos_count),
+      v ? `${v.pulse_bpm} BPM · ${v.temperature_c} °C · ${v.oxygen_percent}% O₂` : "—",
+    ];
+    for (const text of cells) {
+      const td = document.createElement("td");
+      td.textContent = text;
+      tr.appendChild(td);
+    }
+    return tr;
+  }
+
+  async function loadSessions(reset) {
+    if (reset) {
+      sessionCursor = null;
+      sessionRows.replaceChildren();
+    }
+    const qs = new URLSearchParams({ limit: "50" });
+    if (sessionRisk.value) qs.set("max_risk", sessionRisk.value);
+    if (sessionSos.value) qs.set("has_sos", sessionSos.value);
+    if (sessionCursor) qs.set("cursor", sessionCursor);
+    const res = await api(`/api/admin/sessions?${qs}`);
+    const data = await res.json();
+    for (const s of data.sessions) sessionRows.appendChild(sessionRow(s));
+    sessionCursor = data.next_cursor;
+    btnMoreSessions.classList.toggle("hidden", !sessionCursor);
+  }
+
+  btnSessions.addEventListener("click", () => {
+    setToast("");
+    loadSessions(true).catch((e) => setToast(`Admin error: ${e.message}`));
+  });
+  btnMoreSessions.addEventListener("click", () => {
+    setToast("");
+    loadSessions(false).catch((e) => setToast(`Admin error: ${e.message}`));
+  });
+
   btnExport.addEventListener("click", async () => {
     setToast("");
     try {
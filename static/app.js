@@ -223,8 +223,44 @@
     return res.json();
   }
 
+  function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  }
+
+  // POST that is safe to retry: every attempt carries the same Idempotency-Key, so the
+  // server replays its first response instead of running triage or SOS again.
+  async function postIdempotent(path, body, attempts = 3) {
+    const key = newIdempotencyKey();
+    for (let attempt = 1; ; attempt += 1) {
+      let res;
+      try {
+        res = await fetch(path, {
+          method: "POST",
+          headers: { "Content-Type": "application/json", "Idempotency-Key": key },
+          body,
+        });
+      } catch (e) {
+        if (attempt >= attempts) throw e;
+        await new Promise((r) => setTimeout(r, 500 * attempt));
+        continue;
+      }
+      if ((res.status === 409 || res.status >= 500) && attempt < attempts) {
+        const wait = Number(res.headers.get("Retry-After")) * 1000 || 500 * attempt;
+        await new Promise((r) => setTimeout(r, wait));
+        continue;
+      }
+      if (!res.ok) {
+        const text = await res.text();
+        throw new Error(text || `HTTP ${res.status}`);
+      }
+      return res.json();
+    }
+  }
+
   async function loadHospitals() {
-    const data = await apiJson("/api/hospitals");
+    const { lat, lng } = lastKnownLocation;
+    const data = await apiJson(`/api/hospitals/nearby?lat=${encodeURIComponent(lat)}&lng=${encodeURIComponent(lng)}&k=8`);
     els.hospitalList.replaceChildren();
     for (const h of data.hospitals) {
       const item = document.createElement("div");
@@ -236,7 +272,7 @@
       name.textContent = h.name;
       const meta = document.createElement("div");
       meta.className = "hospital-meta";
-      meta.textContent = `${h.address} • ${h.phone}`;
+      meta.textContent = `${h.distance_km} km • ETA ${h.eta_minutes} min • ${h.phone}`;
       left.appendChild(name);
       left.appendChild(meta);
 
@@ -286,18 +322,28 @@
     });
   }
 
-  function pushPulse(pulse) {
-    const t = new Date();
+  const pulseMaxPoints = 60;
+
+  function pushPulse(pulse, t = new Date(), redraw = true) {
     const label = `${String(t.getHours()).padStart(2, "0")}:${String(t.getMinutes()).padStart(2, "0")}:${String(
       t.getSeconds()
     ).padStart(2, "0")}`;
     pulseLabels.push(label);
     pulseSeries.push(pulse);
-    const maxPoints = 60;
-    while (pulseSeries.length > maxPoints) {
+    while (pulseSeries.length > pulseMaxPoints) {
       pulseSeries.shift();
       pulseLabels.shift();
     }
+    if (chart && redraw) chart.update("none");
+  }
+
+  async function loadPulseHistory() {
+    // Seed the chart after a reload with a server-side downsampled view of the whole session.
+    if (!sessionId) return;
+    const qs = `?points=${pulseMaxPoints}&channels=pulse_bpm`;
+    const data = await apiJson(`/api/sessions/${encodeURIComponent(sessionId)}/vitals/series${qs}`);
+    const points = (data.series && data.series.pulse_bpm) || [];
+    for (const [ts, pulse] of points) pushPulse(pulse, new Date(ts * 1000), false);
     if (chart) chart.update("none");
   }
 
@@ -394,6 +440,97 @@
     });
   }
 
+  function applyTurn(data) {
+    sessionId = data.session_id;
+    localStorage.setItem(sessionKey, sessionId);
+
+    if (data.vitals) {
+      const v = data.vitals;
+      animateNumber(els.pulse, v.pulse_bpm, 1);
+      animateNumber(els.temp, v.temperature_c, 1);
+      animateNumber(els.oxygen, v.oxygen_percent, 1);
+      animateNumber(els.air, v.air_quality_ppm, 0);
+      applyAlerts(v);
+      pushPulse(v.pulse_bpm);
+    }
+    if (data.risk) setRiskUI(data.risk);
+
+    if (data.auto_emergency && data.auto_emergency.enabled && data.auto_emergency.nearest_hospital) {
+      const h = data.auto_emergency.nearest_hospital;
+      els.sosResult.textContent = `AUTO EMERGENCY: ${h.name} • ${h.distance_km} km • ETA ${h.eta_minutes} min • ${h.phone}`;
+      playIcuAlert("critical");
+    }
+  }
+
+  async function* readSse(res) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buf += decoder.decode(value, { stream: true });
+      let idx;
+      while ((idx = buf.indexOf("\n\n")) >= 0) {
+        const block = buf.slice(0, idx);
+        buf = buf.slice(idx + 2);
+        let event = "message";
+        const data = [];
+        for (const line of block.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data.push(line.slice(5).trimStart());
+        }
+        if (data.length) yield { event, data: JSON.parse(data.join("\n")) };
+      }
+    }
+  }
+
+  async function streamChat(body, typing, attempts = 3) {
+    // One key for every attempt: a retry gets the turn the server already ran, replayed,
+    // and the events shown before the connection dropped are skipped.
+    const key = newIdempotencyKey();
+    let seen = 0;
+    let guidanceEl = null;
+    for (let attempt = 1; ; attempt += 1) {
+      let res;
+      try {
+        res = await fetch("/api/ask_ai/stream", {
+          method: "POST",
+          headers: { "Content-Type": "application/json", "Idempotency-Key": key },
+          body,
+        });
+        if (res.ok && res.body) {
+          let n = 0;
+          for await (const { event, data } of readSse(res)) {
+            n += 1;
+            if (n <= seen) continue;
+            seen = n;
+            if (event === "triage") {
+              typing.remove();
+              addMessage("assistant", data.reply);
+              applyTurn(data);
+            } else if (event === "token") {
+              if (!guidanceEl) guidanceEl = addMessage("assistant", "Additional AI guidance:\n");
+              guidanceEl.textContent += data.text;
+              els.chatMessages.scrollTop = els.chatMessages.scrollHeight;
+            }
+          }
+          return;
+        }
+      } catch (e) {
+        if (attempt >= attempts) throw e;
+        await new Promise((r) => setTimeout(r, 500 * attempt));
+        continue;
+      }
+      if ((res.status === 409 || res.status >= 500) && attempt < attempts) {
+        const wait = Number(res.headers.get("Retry-After")) * 1000 || 500 * attempt;
+        await new Promise((r) => setTimeout(r, wait));
+        continue;
+      }
+      throw new Error(`HTTP ${res.status}`);
+    }
+  }
+
   async function sendChat(text) {
     const trimmed = String(text || "").trim();
     if (!trimmed) return;
@@ -407,34 +544,18 @@
     els.aiLoading.classList.remove("hidden");
 
     const typing = addTypingIndicator();
+    const body = JSON.stringify({ message: trimmed, session_id: sessionId, lat: lastKnownLocation.lat, lng: lastKnownLocation.lng });
 
     try {
-      const data = await apiJson("/api/ask_ai", {
-        method: "POST",
-        body: JSON.stringify({ message: trimmed, session_id: sessionId, lat: lastKnownLocation.lat, lng: lastKnownLocation.lng }),
-      });
-      sessionId = data.session_id;
-      localStorage.setItem(sessionKey, sessionId);
-
-      typing.remove();
-      const msgEl = addMessage("assistant", "");
-      await typewriterInto(msgEl, data.reply, 70);
-
-      if (data.vitals) {
-        const v = data.vitals;
-        animateNumber(els.pulse, v.pulse_bpm, 1);
-        animateNumber(els.temp, v.temperature_c, 1);
-        animateNumber(els.oxygen, v.oxygen_percent, 1);
-        animateNumber(els.air, v.air_quality_ppm, 0);
-        applyAlerts(v);
-        pushPulse(v.pulse_bpm);
-      }
-      if (data.risk) setRiskUI(data.risk);
-
-      if (data.auto_emergency && data.auto_emergency.enabled && data.auto_emergency.nearest_hospital) {
-        const h = data.auto_emergency.nearest_hospital;
-        els.sosResult.textContent = `AUTO EMERGENCY: ${h.name} • ${h.distance_km} km • ETA ${h.eta_minutes} min • ${h.phone}`;
-        playIcuAlert("critical");
+      if (window.ReadableStream && window.TextDecoder) {
+        await streamChat(body, typing);
+      } else {
+        const data = await postIdempotent("/api/ask_ai", body);
+        typing.remove();
+        const msgEl = addMessage("assistant", "");
+        await typewriterInto(msgEl, data.reply, 70);
+        applyTurn(data);
+        if (data.guidance_job) pollGuidance(data.guidance_job);
       }
     } catch (e) {
       typing.remove();
@@ -455,10 +576,7 @@
     lastKnownLocation = { lat, lng };
 
     try {
-      const data = await apiJson("/api/sos", {
-        method: "POST",
-        body: JSON.stringify({ lat, lng, session_id: sessionId }),
-      });
+      const data = await postIdempotent("/api/sos", JSON.stringify({ lat, lng, session_id: sessionId }));
       sessionId = data.session_id;
       localStorage.setItem(sessionKey, sessionId);
 
@@ -489,9 +607,70 @@
     }
   }
 
-  function openReport() {
-    const qs = sessionId ? `?session_id=${encodeURIComponent(sessionId)}` : "";
-    window.open(`/api/report${qs}`, "_blank", "noopener");
+  async function pollGuidance(jobId) {
+    const deadline = Date.now() + 45000;
+    while (Date.now() < deadline) {
+      await new Promise((r) => setTimeout(r, 1500));
+      let job;
+      try {
+        job = await apiJson(`/api/ask_ai/${encodeURIComponent(jobId)}`);
+      } catch (_) {
+        return;
+      }
+      if (job.status === "pending") continue;
+      if (job.status === "done" && job.guidance) {
+        const msgEl = addMessage("assistant", "");
+        await typewriterInto(msgEl, `Additional AI guidance:\n${job.guidance}`, 90);
+      }
+      return;
+    }
+  }
+
+  function saveBlob(blob, filename) {
+    const url = URL.createObjectURL(blob);
+    const a = document.createElement("a");
+    a.href = url;
+    a.download = filename;
+    document.body.appendChild(a);
+    a.click();
+    a.remove();
+    setTimeout(() => URL.revokeObjectURL(url), 10000);
+  }
+
+  async function openReport() {
+    setToast("Preparing report…");
+    const submit = await fetch("/api/reports", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ session_id: sessionId }),
+    });
+    if (submit.status === 429) {
+      setToast("Report queue is busy. Please try again in a few seconds.");
+      return;
+    }
+    if (!submit.ok) {
+      setToast(`Report failed: HTTP ${submit.status}`);
+      return;
+    }
+    const job = await submit.json();
+    sessionId = job.session_id || sessionId;
+
+    const deadline = Date.now() + 120000;
+    while (Date.now() < deadline) {
+      const res = await fetch(`/api/reports/${encodeURIComponent(job.job_id)}`);
+      if (res.status === 202) {
+        await new Promise((r) => setTimeout(r, 1000));
+        continue;
+      }
+      if (!res.ok) {
+        setToast(`Report failed: HTTP ${res.status}`);
+        return;
+      }
+      saveBlob(await res.blob(), `mindbot_vr_hospital_report_${job.session_id}.pdf`);
+      setToast("");
+      return;
+    }
+    setToast("Report is taking too long. Please try again.");
   }
 
   async function boot() {
@@ -509,7 +688,9 @@
 
     const position = await getGeo();
     lastKnownLocation = { lat: position.coords.latitude, lng: position.coords.longitude };
+    loadHospitals().catch(() => {});
 
+    await loadPulseHistory().catch(() => {});
     await refreshVitals();
     setInterval(() => refreshVitals().catch(() => {}), 1000);
 
@@ -518,7 +699,7 @@
       sendChat(els.chatInput.value);
     });
     els.btnSOS.addEventListener("click", () => sos());
-    els.btnReport.addEventListener("click", () => openReport());
+    els.btnReport.addEventListener("click", () => openReport().catch((e) => setToast(`Report failed: ${e.message}`)));
   }
 
   boot().catch((e) => setToast(`Boot error: ${e.message}`));